@@ -203,8 +203,9 @@ class Download(object):
         ))
 
     def download_with_resume(self, url: str, filepath: Path, desc: str) -> bool:
-        """支持断点续传的下载方法"""
-        file_size = filepath.stat().st_size if filepath.exists() else 0
+        """支持断点续传的下载方法，先写入 .part 文件，校验完成后再重命名"""
+        part_path = filepath.with_name(filepath.name + '.part')
+        file_size = part_path.stat().st_size if part_path.exists() else 0
         headers = {'Range': f'bytes={file_size}-'} if file_size > 0 else {}
 
         for attempt in range(self.retry_times):
@@ -215,6 +216,10 @@ class Download(object):
                 if response.status_code not in (200, 206):
                     raise Exception(f"HTTP {response.status_code}")
 
+                # 服务器忽略 Range 返回 200 时是完整内容，必须从头写，不能追加
+                if response.status_code == 200:
+                    file_size = 0
+
                 total_size = int(response.headers.get('content-length', 0)) + file_size
                 mode = 'ab' if file_size > 0 else 'wb'
 
@@ -222,7 +227,7 @@ class Download(object):
                     task = self.progress.add_task(f"[cyan]⬇️  {desc}", total=total_size)
                     self.progress.update(task, completed=file_size)  # 更新断点续传的进度
 
-                    with open(filepath, mode) as f:
+                    with open(part_path, mode) as f:
                         try:
                             for chunk in response.iter_content(chunk_size=self.chunk_size):
                                 if chunk:
@@ -232,10 +237,16 @@ class Download(object):
                                requests.exceptions.ChunkedEncodingError,
                                Exception) as chunk_error:
                             # 网络中断，记录当前文件大小，下次从这里继续
-                            current_size = filepath.stat().st_size if filepath.exists() else 0
+                            current_size = part_path.stat().st_size if part_path.exists() else 0
                             logger.warning(f"下载中断，已下载 {current_size} 字节: {str(chunk_error)}")
                             raise chunk_error
 
+                written = part_path.stat().st_size
+                if response.headers.get('content-length') and written != total_size:
+                    part_path.unlink()
+                    raise Exception(f"文件大小不一致: {written}/{total_size}")
+
+                os.replace(part_path, filepath)
                 return True
 
             except Exception as e:
@@ -250,7 +261,7 @@ class Download(object):
                     logger.info(f"等待 {wait_time} 秒后重试...")
                     time.sleep(wait_time)
                     # 重新计算文件大小，准备断点续传
-                    file_size = filepath.stat().st_size if filepath.exists() else 0
+                    file_size = part_path.stat().st_size if part_path.exists() else 0
                     headers = {'Range': f'bytes={file_size}-'} if file_size > 0 else {}
 
         return False
@@ -269,7 +280,8 @@ class DownloadManager:
         response = requests.get(url, headers=headers, stream=True)
         total_size = int(response.headers.get('content-length', 0))
         
-        mode = 'ab' if file_size > 0 else 'wb'
+        # 只有 206 才是续传内容，200 表示服务器返回了完整文件
+        mode = 'ab' if file_size > 0 and response.status_code == 206 else 'wb'
         
         with open(filepath, mode) as f:
             for chunk in response.iter_content(chunk_size=8192):
@@ -163,7 +163,32 @@ class UnifiedDownloader:
         # 保存路径
         self.save_path = Path(self.config.get('path', './Downloaded'))
         self.save_path.mkdir(parents=True, exist_ok=True)
+
+        # 长连接池：API 与 CDN 分开，整个运行期间复用 keep-alive 与 TLS 会话
+        self._sessions: Dict[str, aiohttp.ClientSession] = {}
         
+    async def _get_session(self, kind: str = 'api') -> aiohttp.ClientSession:
+        """获取共享会话，kind 为 'api' 或 'cdn'"""
+        session = self._sessions.get(kind)
+        if session is None or session.closed:
+            limit, limit_per_host = (16, 16) if kind == 'api' else (64, 16)
+            connector = aiohttp.TCPConnector(
+                limit=limit,
+                limit_per_host=limit_per_host,
+                ttl_dns_cache=600,
+                keepalive_timeout=60,
+            )
+            session = aiohttp.ClientSession(connector=connector)
+            self._sessions[kind] = session
+        return session
+
+    async def close(self):
+        """关闭共享会话"""
+        for session in self._sessions.values():
+            if not session.closed:
+                await session.close()
+        self._sessions.clear()
+
     def _load_config(self, config_path: str) -> Dict:
         """加载配置文件"""
         if not os.path.exists(config_path):
@@ -510,36 +535,36 @@ class UnifiedDownloader:
                 'Connection': 'keep-alive'
             }
             
-            async with aiohttp.ClientSession() as session:
-                async with session.get(fallback_url, headers=headers, timeout=15) as response:
-                    logger.info(f"备用接口响应状态: {response.status}")
-                    if response.status != 200:
-                        logger.error(f"备用接口请求失败，状态码: {response.status}")
-                        return None
+            session = await self._get_session('api')
+            async with session.get(fallback_url, headers=headers, timeout=15) as response:
+                logger.info(f"备用接口响应状态: {response.status}")
+                if response.status != 200:
+                    logger.error(f"备用接口请求失败，状态码: {response.status}")
+                    return None
                     
-                    text = await response.text()
-                    logger.info(f"备用接口响应内容长度: {len(text)}")
+                text = await response.text()
+                logger.info(f"备用接口响应内容长度: {len(text)}")
                     
-                    if not text:
-                        logger.error("备用接口响应为空")
-                        return None
+                if not text:
+                    logger.error("备用接口响应为空")
+                    return None
                     
-                    try:
-                        data = json.loads(text)
-                        logger.info(f"备用接口返回数据: {data}")
+                try:
+                    data = json.loads(text)
+                    logger.info(f"备用接口返回数据: {data}")
                         
-                        item_list = (data or {}).get('item_list') or []
-                        if item_list:
-                            aweme_detail = item_list[0]
-                            logger.info("备用接口成功获取视频信息")
-                            return aweme_detail
-                        else:
-                            logger.error("备用接口返回的数据中没有 item_list")
+                    item_list = (data or {}).get('item_list') or []
+                    if item_list:
+                        aweme_detail = item_list[0]
+                        logger.info("备用接口成功获取视频信息")
+                        return aweme_detail
+                    else:
+                        logger.error("备用接口返回的数据中没有 item_list")
                             
-                    except json.JSONDecodeError as e:
-                        logger.error(f"备用接口JSON解析失败: {e}")
-                        logger.error(f"原始响应内容: {text}")
-                        return None
+                except json.JSONDecodeError as e:
+                    logger.error(f"备用接口JSON解析失败: {e}")
+                    logger.error(f"原始响应内容: {text}")
+                    return None
                         
         except Exception as e:
             logger.error(f"备用接口获取视频信息失败: {e}")
@@ -702,16 +727,16 @@ class UnifiedDownloader:
                 logger.info(f"文件已存在，跳过: {save_path.name}")
                 return True
             
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, headers=self.headers) as response:
-                    if response.status == 200:
-                        content = await response.read()
-                        with open(save_path, 'wb') as f:
-                            f.write(content)
-                        return True
-                    else:
-                        logger.error(f"下载失败，状态码: {response.status}")
-                        return False
+            session = await self._get_session('cdn')
+            async with session.get(url, headers=self.headers) as response:
+                if response.status == 200:
+                    content = await response.read()
+                    with open(save_path, 'wb') as f:
+                        f.write(content)
+                    return True
+                else:
+                    logger.error(f"下载失败，状态码: {response.status}")
+                    return False
                         
         except Exception as e:
             logger.error(f"下载文件失败 {url}: {e}")
@@ -971,23 +996,23 @@ class UnifiedDownloader:
 
             logger.info(f"请求用户喜欢列表: {full_url[:100]}...")
 
-            async with aiohttp.ClientSession() as session:
-                async with session.get(full_url, headers=self.headers, timeout=10) as response:
-                    if response.status != 200:
-                        logger.error(f"请求失败，状态码: {response.status}")
-                        return None
+            session = await self._get_session('api')
+            async with session.get(full_url, headers=self.headers, timeout=10) as response:
+                if response.status != 200:
+                    logger.error(f"请求失败，状态码: {response.status}")
+                    return None
 
-                    text = await response.text()
-                    if not text:
-                        logger.error("响应内容为空")
-                        return None
+                text = await response.text()
+                if not text:
+                    logger.error("响应内容为空")
+                    return None
 
-                    data = json.loads(text)
-                    if data.get('status_code') == 0:
-                        return data
-                    else:
-                        logger.error(f"API返回错误: {data.get('status_msg', '未知错误')}")
-                        return None
+                data = json.loads(text)
+                if data.get('status_code') == 0:
+                    return data
+                else:
+                    logger.error(f"API返回错误: {data.get('status_msg', '未知错误')}")
+                    return None
         except Exception as e:
             logger.error(f"获取用户喜欢列表失败: {e}")
         return None
@@ -1065,21 +1090,21 @@ class UnifiedDownloader:
                 full_url = f"{api_url}{params}"
 
             logger.info(f"请求用户合集列表: {full_url[:100]}...")
-            async with aiohttp.ClientSession() as session:
-                async with session.get(full_url, headers=self.headers, timeout=10) as response:
-                    if response.status != 200:
-                        logger.error(f"请求失败，状态码: {response.status}")
-                        return None
-                    text = await response.text()
-                    if not text:
-                        logger.error("响应内容为空")
-                        return None
-                    data = json.loads(text)
-                    if data.get('status_code') == 0:
-                        return data
-                    else:
-                        logger.error(f"API返回错误: {data.get('status_msg', '未知错误')}")
-                        return None
+            session = await self._get_session('api')
+            async with session.get(full_url, headers=self.headers, timeout=10) as response:
+                if response.status != 200:
+                    logger.error(f"请求失败，状态码: {response.status}")
+                    return None
+                text = await response.text()
+                if not text:
+                    logger.error("响应内容为空")
+                    return None
+                data = json.loads(text)
+                if data.get('status_code') == 0:
+                    return data
+                else:
+                    logger.error(f"API返回错误: {data.get('status_msg', '未知错误')}")
+                    return None
         except Exception as e:
             logger.error(f"获取用户合集列表失败: {e}")
         return None
@@ -1163,18 +1188,18 @@ class UnifiedDownloader:
                 full_url = f"{api_url}{params}"
 
             logger.info(f"请求合集作品列表: {full_url[:100]}...")
-            async with aiohttp.ClientSession() as session:
-                async with session.get(full_url, headers=self.headers, timeout=10) as response:
-                    if response.status != 200:
-                        logger.error(f"请求失败，状态码: {response.status}")
-                        return None
-                    text = await response.text()
-                    if not text:
-                        logger.error("响应内容为空")
-                        return None
-                    data = json.loads(text)
-                    # USER_MIX 返回没有统一的 status_code，这里直接返回
-                    return data
+            session = await self._get_session('api')
+            async with session.get(full_url, headers=self.headers, timeout=10) as response:
+                if response.status != 200:
+                    logger.error(f"请求失败，状态码: {response.status}")
+                    return None
+                text = await response.text()
+                if not text:
+                    logger.error("响应内容为空")
+                    return None
+                data = json.loads(text)
+                # USER_MIX 返回没有统一的 status_code，这里直接返回
+                return data
         except Exception as e:
             logger.error(f"获取合集作品失败: {e}")
         return None
@@ -1264,17 +1289,17 @@ class UnifiedDownloader:
                 full_url = f"{api_url}{params}"
 
             logger.info(f"请求音乐作品列表: {full_url[:100]}...")
-            async with aiohttp.ClientSession() as session:
-                async with session.get(full_url, headers=self.headers, timeout=10) as response:
-                    if response.status != 200:
-                        logger.error(f"请求失败，状态码: {response.status}")
-                        return None
-                    text = await response.text()
-                    if not text:
-                        logger.error("响应内容为空")
-                        return None
-                    data = json.loads(text)
-                    return data
+            session = await self._get_session('api')
+            async with session.get(full_url, headers=self.headers, timeout=10) as response:
+                if response.status != 200:
+                    logger.error(f"请求失败，状态码: {response.status}")
+                    return None
+                text = await response.text()
+                if not text:
+                    logger.error("响应内容为空")
+                    return None
+                data = json.loads(text)
+                return data
         except Exception as e:
             logger.error(f"获取音乐作品失败: {e}")
         return None
@@ -1322,6 +1347,12 @@ class UnifiedDownloader:
     
     async def run(self):
         """运行下载器"""
+        try:
+            await self._run()
+        finally:
+            await self.close()
+
+    async def _run(self):
         # 显示启动信息
         console.print(Panel.fit(
             "[bold cyan]抖音下载器 v3.0 - 统一增强版[/bold cyan]\n"
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""Memory per million ids and lookups/sec: AwemeIndex vs. a plain set of str.
+
+Usage: python benchmarks/bench_aweme_index.py [--ids 1000000]
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from storage.aweme_index import AwemeIndex  # noqa: E402
+from utils.helpers import format_size  # noqa: E402
+
+
+def _set_bytes(values) -> int:
+    return sys.getsizeof(values) + sum(sys.getsizeof(value) for value in values)
+
+
+def _report(label: str, container, memory: int, probes):
+    started = time.perf_counter()
+    hits = sum(1 for probe in probes if probe in container)
+    rate = len(probes) / (time.perf_counter() - started)
+    per_million = memory * 1_000_000 // len(container)
+    print(f"{label:>10}: {format_size(per_million):>10} per million ids  {rate:12.0f} lookups/s  ({hits} hits)")
+
+
+def main(args):
+    rng = random.Random(0)
+    ids = [str(rng.randrange(7 * 10 ** 18, 76 * 10 ** 17)) for _ in range(args.ids)]
+    probes = rng.sample(ids, 50000) + [str(rng.randrange(7 * 10 ** 18, 76 * 10 ** 17)) for _ in range(50000)]
+
+    plain = set(ids)
+    _report('set[str]', plain, _set_bytes(plain), probes)
+
+    index = AwemeIndex()
+    started = time.perf_counter()
+    index.update(ids)
+    print(f"AwemeIndex built in {time.perf_counter() - started:.2f}s")
+    _report('AwemeIndex', index, index.memory_bytes(), probes)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--ids', type=int, default=1_000_000)
+    main(parser.parse_args())
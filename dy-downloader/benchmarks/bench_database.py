@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""Inserts/sec of connect-per-insert writes vs. the group-commit Database.
+
+Usage: python benchmarks/bench_database.py [--rows 10000] [--writers 20]
+"""
+import argparse
+import asyncio
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import aiosqlite  # noqa: E402
+
+from storage.database import INSERT_AWEME_SQL, Database  # noqa: E402
+
+
+def _row(i: int):
+    return {
+        'aweme_id': str(i),
+        'aweme_type': 'video',
+        'title': f'title {i}',
+        'author_id': f'author_{i % 50}',
+        'author_name': 'Author',
+        'create_time': 1700000000 + i,
+        'file_path': f'/tmp/{i}',
+        'metadata': '{}',
+    }
+
+
+async def _connect_per_insert(db_path: str, aweme_data):
+    async with aiosqlite.connect(db_path) as db:
+        await db.execute(INSERT_AWEME_SQL, (
+            aweme_data['aweme_id'], aweme_data['aweme_type'], aweme_data['title'],
+            aweme_data['author_id'], aweme_data['author_name'], aweme_data['create_time'],
+            int(time.time()), aweme_data['file_path'], aweme_data['metadata'],
+        ))
+        await db.commit()
+
+
+async def _drive(insert, rows: int, writers: int) -> float:
+    counter = iter(range(rows))
+
+    async def _writer():
+        for i in counter:
+            await insert(_row(i))
+
+    started = time.perf_counter()
+    await asyncio.gather(*[_writer() for _ in range(writers)])
+    return rows / (time.perf_counter() - started)
+
+
+async def main_async(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = str(Path(tmp) / 'legacy.db')
+        async with aiosqlite.connect(legacy_path) as db:
+            await Database._create_schema(db)
+        rate = await _drive(lambda row: _connect_per_insert(legacy_path, row), args.rows, args.writers)
+        print(f"connect-per-insert: {rate:10.0f} inserts/s")
+
+        database = Database(str(Path(tmp) / 'grouped.db'))
+        await database.initialize()
+        rate = await _drive(database.add_aweme, args.rows, args.writers)
+        await database.close()
+        print(f"      group-commit: {rate:10.0f} inserts/s")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--writers', type=int, default=20)
+    asyncio.run(main_async(parser.parse_args()))
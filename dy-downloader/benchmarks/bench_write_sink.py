@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""CPU cost per GB of per-chunk aiofiles writes vs. the write-behind sink.
+
+Usage: python benchmarks/bench_write_sink.py [--size-mb 512] [--files 20]
+"""
+import argparse
+import asyncio
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import aiofiles  # noqa: E402
+
+from storage.write_sink import WriteSink  # noqa: E402
+
+CHUNK = b'\0' * 8192
+
+
+async def _aiofiles_file(path: Path, chunks: int):
+    async with aiofiles.open(path, 'wb') as f:
+        for _ in range(chunks):
+            await f.write(CHUNK)
+
+
+async def _sink_file(sink: WriteSink, path: Path, chunks: int):
+    async with sink.open(path, truncate=True) as writer:
+        for _ in range(chunks):
+            await writer.write(CHUNK)
+
+
+async def _run(label: str, factory, workdir: Path, files: int, size_mb: int):
+    chunks = size_mb * 1024 * 1024 // len(CHUNK) // files
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    await asyncio.gather(*[factory(workdir / f'{label}_{i}.bin', chunks) for i in range(files)])
+    cpu, wall = time.process_time() - cpu_start, time.perf_counter() - wall_start
+    gigabytes = chunks * files * len(CHUNK) / 1024 ** 3
+    print(f"{label:>10}: {cpu / gigabytes:6.2f} CPU-s/GB  {wall / gigabytes:6.2f} wall-s/GB")
+
+
+async def main_async(args):
+    sink = WriteSink()
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        await _run('aiofiles', _aiofiles_file, workdir, args.files, args.size_mb)
+        await _run('sink', lambda p, n: _sink_file(sink, p, n), workdir, args.files, args.size_mb)
+    sink.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size-mb', type=int, default=512)
+    parser.add_argument('--files', type=int, default=20)
+    asyncio.run(main_async(parser.parse_args()))
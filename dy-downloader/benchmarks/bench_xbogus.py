@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""X-Bogus signatures/sec for a typical API URL.
+
+Usage: python benchmarks/bench_xbogus.py [--calls 20000] [--signer xbogus-legacy]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.xbogus import DEFAULT_USER_AGENT, get_signer  # noqa: E402
+
+URL = (
+    "https://www.douyin.com/aweme/v1/web/aweme/post/?device_platform=webapp&aid=6383"
+    "&channel=channel_pc_web&sec_user_id=MS4wLjABAAAA&max_cursor=0&count=20&msToken="
+)
+
+
+def main(args):
+    signer = get_signer(args.signer)
+    signer.sign(URL, DEFAULT_USER_AGENT)
+
+    started = time.perf_counter()
+    for _ in range(args.calls):
+        signer.sign(URL, DEFAULT_USER_AGENT)
+    elapsed = time.perf_counter() - started
+    print(f"{args.calls} signatures in {elapsed:.3f}s: {args.calls / elapsed:,.0f} calls/s "
+          f"({elapsed / args.calls * 1e6:.1f} us/call)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--calls', type=int, default=20000)
+    parser.add_argument('--signer', default='xbogus')
+    main(parser.parse_args())
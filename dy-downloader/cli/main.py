@@ -3,71 +3,91 @@ import argparse
 import json
 import sys
 from pathlib import Path
+from typing import List, Optional, Tuple
 
 from config import ConfigLoader
 from auth import CookieManager
 from storage import Database, FileManager
-from control import QueueManager, RateLimiter, RetryHandler
+from control import AdaptiveController, AwemeRegistry, CircuitBreakers, MirrorSelector, QueueManager, RateLimiter, RetryHandler
 from core import DouyinAPIClient, URLParser, DownloaderFactory
+from core.downloader_base import DownloadResult
 from cli.progress_display import ProgressDisplay
+from utils.helpers import format_size
 from utils.logger import setup_logger
 
 logger = setup_logger('CLI')
 display = ProgressDisplay()
 
 
-async def download_url(url: str, config: ConfigLoader, cookie_manager: CookieManager, database: Database = None):
-    file_manager = FileManager(config.get('path'))
-    rate_limiter = RateLimiter(max_per_second=2)
-    retry_handler = RetryHandler(max_retries=config.get('retry_times', 3))
-    queue_manager = QueueManager(max_workers=int(config.get('thread', 5) or 5))
+async def download_url(
+    url: str,
+    config: ConfigLoader,
+    cookie_manager: CookieManager,
+    api_client: DouyinAPIClient,
+    file_manager: FileManager,
+    mirror_selector: MirrorSelector,
+    database: Database = None,
+    rate_limiter: RateLimiter = None,
+    retry_handler: RetryHandler = None,
+    queue_manager: QueueManager = None,
+    aweme_registry: AwemeRegistry = None,
+    circuit_breakers: CircuitBreakers = None,
+):
+    rate_limiter = rate_limiter or RateLimiter.from_config(config.get('rate_limit'))
+    retry_handler = retry_handler or RetryHandler(
+        max_retries=config.get('retry_times', 3),
+        budget_ratio=float(config.get('retry_budget', 0.1)),
+    )
+    queue_manager = queue_manager or QueueManager(max_workers=int(config.get('thread', 5) or 5))
 
     original_url = url
 
-    async with DouyinAPIClient(cookie_manager.get_cookies()) as api_client:
-        if url.startswith('https://v.douyin.com'):
-            resolved_url = await api_client.resolve_short_url(url)
-            if resolved_url:
-                url = resolved_url
-            else:
-                display.print_error(f"Failed to resolve short URL: {url}")
-                return None
-
-        parsed = URLParser.parse(url)
-        if not parsed:
-            display.print_error(f"Failed to parse URL: {url}")
-            return None
-
-        display.print_info(f"URL type: {parsed['type']}")
-
-        downloader = DownloaderFactory.create(
-            parsed['type'],
-            config,
-            api_client,
-            file_manager,
-            cookie_manager,
-            database,
-            rate_limiter,
-            retry_handler,
-            queue_manager
-        )
-
-        if not downloader:
-            display.print_error(f"No downloader found for type: {parsed['type']}")
+    if url.startswith('https://v.douyin.com'):
+        resolved_url = await api_client.resolve_short_url(url)
+        if resolved_url:
+            url = resolved_url
+        else:
+            display.print_error(f"Failed to resolve short URL: {url}")
             return None
 
-        result = await downloader.download(parsed)
-
-        if result and database:
-            await database.add_history({
-                'url': original_url,
-                'url_type': parsed['type'],
-                'total_count': result.total,
-                'success_count': result.success,
-                'config': json.dumps(config.config, ensure_ascii=False),
-            })
-
-        return result
+    parsed = URLParser.parse(url)
+    if not parsed:
+        display.print_error(f"Failed to parse URL: {url}")
+        return None
+
+    display.print_info(f"URL type: {parsed['type']}")
+
+    downloader = DownloaderFactory.create(
+        parsed['type'],
+        config,
+        api_client,
+        file_manager,
+        cookie_manager,
+        database,
+        rate_limiter,
+        retry_handler,
+        queue_manager,
+        mirror_selector,
+        aweme_registry,
+        circuit_breakers or api_client.circuit_breakers,
+    )
+
+    if not downloader:
+        display.print_error(f"No downloader found for type: {parsed['type']}")
+        return None
+
+    result = await downloader.download(parsed)
+
+    if result and database:
+        await database.add_history({
+            'url': original_url,
+            'url_type': parsed['type'],
+            'total_count': result.total,
+            'success_count': result.success,
+            'config': json.dumps(config.config, ensure_ascii=False),
+        })
+
+    return result
 
 
 async def main_async(args):
@@ -96,6 +116,9 @@ async def main_async(args):
     if args.thread:
         config.update(thread=args.thread)
 
+    if args.full_refresh:
+        config.update(full_refresh=True)
+
     if not config.validate():
         display.print_error("Invalid configuration: missing required fields")
         return
@@ -109,35 +132,116 @@ async def main_async(args):
 
     database = None
     if config.get('database'):
-        database = Database()
+        database = Database(id_index=config.get('id_index', 'off'))
         await database.initialize()
         display.print_success("Database initialized")
 
     urls = config.get_links()
     display.print_info(f"Found {len(urls)} URL(s) to process")
 
-    all_results = []
-
-    for i, url in enumerate(urls, 1):
-        display.print_info(f"Processing [{i}/{len(urls)}]: {url}")
+    file_manager = FileManager(config.get('path'))
+    mirror_selector = MirrorSelector()
+
+    # Run-wide budgets: every link draws API calls and download slots from the same pool,
+    # so concurrent links overlap one creator's listing with another's downloads
+    # without multiplying the request rate.
+    rate_limit = config.get('rate_limit') or {}
+    rate_limiter = RateLimiter.from_config(rate_limit)
+    adaptive = rate_limit.get('adaptive') or {}
+    controller = None
+    if adaptive.get('enabled', True):
+        controller = AdaptiveController.from_config(rate_limiter, adaptive)
+    retry_handler = RetryHandler(
+        max_retries=config.get('retry_times', 3),
+        budget_ratio=float(config.get('retry_budget', 0.1)),
+    )
+    queue_manager = QueueManager(max_workers=int(config.get('thread', 5) or 5))
+    aweme_registry = AwemeRegistry()
+    circuit_breakers = CircuitBreakers.from_config(config.get('circuit_breaker'))
+    link_manager = QueueManager(max_workers=max(1, int(config.get('concurrent_links', 1) or 1)))
+    link_results: List[Tuple[str, Optional[DownloadResult]]] = [(url, None) for url in urls]
 
-        result = await download_url(url, config, cookie_manager, database)
-        if result:
-            all_results.append(result)
-            display.show_result(result)
+    try:
+        async with DouyinAPIClient(
+            cookie_manager.get_cookies(), controller=controller, circuit_breakers=circuit_breakers
+        ) as api_client:
+            async def _run_link(entry):
+                index, url = entry
+                display.print_info(f"Processing [{index + 1}/{len(urls)}]: {url}")
+                result = await download_url(
+                    url, config, cookie_manager, api_client, file_manager, mirror_selector, database,
+                    rate_limiter, retry_handler, queue_manager, aweme_registry, circuit_breakers,
+                )
+                link_results[index] = (url, result)
+                if result and result.incomplete:
+                    display.print_warning(f"Finished with gaps [{index + 1}/{len(urls)}]: {url} - {result}")
+                elif result:
+                    display.print_success(f"Finished [{index + 1}/{len(urls)}]: {url} - {result}")
+                return result
+
+            await link_manager.run_stream(_run_link, enumerate(urls))
+    finally:
+        if database:
+            # Flushes the group-commit queue before the loop goes away.
+            await database.close()
+
+    all_results = [result for _, result in link_results if result]
+    if len(link_results) > 1:
+        display.show_link_results(link_results)
 
     if all_results:
-        from core.downloader_base import DownloadResult
         total_result = DownloadResult()
         for r in all_results:
             total_result.total += r.total
             total_result.success += r.success
             total_result.failed += r.failed
             total_result.skipped += r.skipped
+            total_result.incomplete += r.incomplete
 
         display.print_success("\n=== Overall Summary ===")
         display.show_result(total_result)
 
+    if file_manager.skipped_files:
+        message = (
+            f"Skipped {file_manager.skipped_files} complete file(s) without downloading, "
+            f"avoided {file_manager.skipped_files} GET(s) and {format_size(file_manager.skipped_bytes)}"
+        )
+        # verify_existing trades each avoided GET for a HEAD; say so rather than claim a free skip.
+        if file_manager.head_checks:
+            message += f"; sent {file_manager.head_checks} HEAD request(s) to verify sizes"
+        display.print_info(message)
+
+    media_store = file_manager.media_store
+    if media_store.hits:
+        display.print_info(
+            f"Reused {media_store.hits} cached asset(s), saved {format_size(media_store.bytes_saved)}"
+        )
+
+    if retry_handler.retries or any(retry_handler.failures.values()):
+        failures = ', '.join(f"{kind}={count}" for kind, count in retry_handler.failures.items())
+        message = f"Retried {retry_handler.retries} time(s) across {retry_handler.calls} download(s); failures: {failures}"
+        if retry_handler.budget_denied:
+            message += f"; {retry_handler.budget_denied} retry(ies) refused by the retry budget"
+        display.print_info(message)
+
+    breaker_states = circuit_breakers.snapshot()
+    if breaker_states:
+        display.print_warning("Circuit breakers tripped this run:")
+        for key, info in sorted(breaker_states.items()):
+            display.print_warning(
+                f"  {key}: opened {info['opened']}x, skipped {info['rejected']} request(s), now {info['state']}"
+            )
+
+    if controller and controller.backoffs:
+        feedback = ', '.join(f"{kind}={count}" for kind, count in sorted(controller.counts.items()))
+        display.print_warning(
+            f"Backed off {controller.backoffs} time(s) on risk control, "
+            f"final rate scale {controller.scale:.2f} ({feedback})"
+        )
+
+    if aweme_registry.reused:
+        display.print_info(f"Reused {aweme_registry.reused} duplicate aweme(s) across links")
+
 
 def main():
     parser = argparse.ArgumentParser(description='Douyin Downloader - 抖音批量下载工具')
@@ -145,6 +249,7 @@ def main():
     parser.add_argument('-c', '--config', help='Config file path (default: config.yml)')
     parser.add_argument('-p', '--path', help='Save path')
     parser.add_argument('-t', '--thread', type=int, help='Thread count')
+    parser.add_argument('--full-refresh', action='store_true', help='Ignore saved pagination checkpoints')
     parser.add_argument('--version', action='version', version='1.0.0')
 
     args = parser.parse_args()
@@ -38,6 +38,8 @@ class ProgressDisplay:
         table.add_row("Success", str(result.success))
         table.add_row("Failed", str(result.failed))
         table.add_row("Skipped", str(result.skipped))
+        if result.incomplete:
+            table.add_row("Incomplete listings", str(result.incomplete))
 
         if result.total > 0:
             success_rate = (result.success / result.total) * 100
@@ -45,6 +47,26 @@ class ProgressDisplay:
 
         self.console.print(table)
 
+    def show_link_results(self, link_results):
+        table = Table(title="Per-Link Summary", show_header=True, header_style="bold magenta")
+        table.add_column("#", justify="right", style="cyan")
+        table.add_column("Link", style="cyan", overflow="fold")
+        table.add_column("Total", justify="right")
+        table.add_column("Success", justify="right", style="green")
+        table.add_column("Failed", justify="right", style="red")
+        table.add_column("Skipped", justify="right", style="yellow")
+
+        for index, (url, result) in enumerate(link_results, 1):
+            if result is None:
+                table.add_row(str(index), url, "-", "-", "error", "-")
+            else:
+                failed = str(result.failed)
+                if result.incomplete:
+                    failed += f" +{result.incomplete} listing"
+                table.add_row(str(index), url, str(result.total), str(result.success), failed, str(result.skipped))
+
+        self.console.print(table)
+
     def print_info(self, message: str):
         self.console.print(f"[blue]ℹ[/blue] {message}")
 
@@ -1,3 +1,4 @@
+import copy
 import os
 import yaml
 from pathlib import Path
@@ -11,7 +12,7 @@ class ConfigLoader:
         self.config = self._load_config()
 
     def _load_config(self) -> Dict[str, Any]:
-        config = DEFAULT_CONFIG.copy()
+        config = copy.deepcopy(DEFAULT_CONFIG)
 
         if self.config_path and os.path.exists(self.config_path):
             with open(self.config_path, 'r', encoding='utf-8') as f:
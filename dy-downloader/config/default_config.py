@@ -25,7 +25,34 @@ DEFAULT_CONFIG: Dict[str, Any] = {
         'music': False,
     },
     'thread': 5,
+    'concurrent_links': 3,
+    'segments': 4,
+    'dedupe': True,
+    'verify_existing': True,
     'retry_times': 3,
+    'retry_budget': 0.1,
+    'circuit_breaker': {
+        'failure_threshold': 5,
+        'reset_timeout': 30,
+    },
     'database': True,
+    'id_index': 'lazy',
+    'full_refresh': False,
+    'listing_windows': 4,
+    'rate_limit': {
+        'rate': 2,
+        'burst': 1,
+        'endpoints': {
+            'cdn': {'rate': 20, 'burst': 40},
+        },
+        'adaptive': {
+            'enabled': True,
+            'min_scale': 0.1,
+            'max_scale': 1.0,
+            'increase': 0.05,
+            'decrease': 0.5,
+            'cooldown': 30,
+        },
+    },
     'auto_cookie': False,
 }
@@ -1,5 +1,9 @@
 from .rate_limiter import RateLimiter
 from .retry_handler import RetryHandler
 from .queue_manager import QueueManager
+from .mirror_selector import MirrorSelector
+from .aweme_registry import AwemeRegistry
+from .adaptive_controller import AdaptiveController
+from .circuit_breaker import CircuitBreakers
 
-__all__ = ['RateLimiter', 'RetryHandler', 'QueueManager']
+__all__ = ['RateLimiter', 'RetryHandler', 'QueueManager', 'MirrorSelector', 'AwemeRegistry', 'AdaptiveController', 'CircuitBreakers']
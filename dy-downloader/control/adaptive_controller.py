@@ -0,0 +1,80 @@
+import time
+from typing import Any, Dict, Optional
+
+from control.rate_limiter import RateLimiter
+from utils.logger import setup_logger
+
+logger = setup_logger('AdaptiveController')
+
+# Response classes reported by DouyinAPIClient.
+OK = 'ok'
+THROTTLED = 'throttled'  # HTTP 429
+FORBIDDEN = 'forbidden'  # HTTP 403
+CAPTCHA = 'captcha'      # verify/captcha page instead of JSON
+EMPTY = 'empty'          # 200 with an empty body, Douyin's quiet block
+API_ERROR = 'api_error'  # JSON with a non-zero status_code
+HTTP_ERROR = 'http_error'
+NETWORK_ERROR = 'network_error'
+
+RISK_KINDS = frozenset({THROTTLED, FORBIDDEN, CAPTCHA, EMPTY})
+
+
+class AdaptiveController:
+    # AIMD over the rate limiter's API buckets: every clean response adds a little to the scale,
+    # any risk-control signal halves it and pauses all API endpoints for a cooldown. CDN
+    # transfers are not behind API risk control and are left to their circuit breakers.
+    def __init__(
+        self,
+        rate_limiter: RateLimiter,
+        min_scale: float = 0.1,
+        max_scale: float = 1.0,
+        increase: float = 0.05,
+        decrease: float = 0.5,
+        cooldown: float = 30.0,
+    ):
+        self.rate_limiter = rate_limiter
+        self.min_scale = min_scale
+        self.max_scale = max_scale
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.cooldown_until = 0.0
+        self.backoffs = 0
+        self.counts: Dict[str, int] = {}
+
+    @classmethod
+    def from_config(cls, rate_limiter: RateLimiter, settings: Optional[Dict[str, Any]]) -> 'AdaptiveController':
+        settings = settings or {}
+        return cls(
+            rate_limiter,
+            min_scale=float(settings.get('min_scale', 0.1)),
+            max_scale=float(settings.get('max_scale', 1.0)),
+            increase=float(settings.get('increase', 0.05)),
+            decrease=float(settings.get('decrease', 0.5)),
+            cooldown=float(settings.get('cooldown', 30)),
+        )
+
+    @property
+    def scale(self) -> float:
+        return self.rate_limiter.scale
+
+    def record(self, endpoint: str, kind: str):
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+        now = time.monotonic()
+
+        if kind in RISK_KINDS:
+            # Requests already in flight report the same block; only the first one in a
+            # cooldown window cuts the rate.
+            if now < self.cooldown_until:
+                return
+            self.cooldown_until = now + self.cooldown
+            self.backoffs += 1
+            scale = max(self.min_scale, self.scale * self.decrease)
+            self.rate_limiter.set_scale(scale)
+            self.rate_limiter.pause(self.cooldown)
+            logger.warning(
+                f"Risk control on {endpoint} ({kind}): pausing {self.cooldown:.0f}s, "
+                f"rate scale now {scale:.2f}"
+            )
+        elif kind == OK and now >= self.cooldown_until and self.scale < self.max_scale:
+            self.rate_limiter.set_scale(min(self.max_scale, self.scale + self.increase))
@@ -0,0 +1,44 @@
+import asyncio
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+class AwemeOutputs:
+    # Kept for the whole run, so only what a duplicate needs to place the files: never the
+    # aweme JSON itself.
+    __slots__ = ('aweme_id', 'desc', 'author_name', 'save_dir', 'files')
+
+    def __init__(self, aweme_id: str, desc: str, author_name: str, save_dir: Path, files: List[Path]):
+        self.aweme_id = aweme_id
+        self.desc = desc
+        self.author_name = author_name
+        self.save_dir = save_dir
+        self.files = files
+
+
+class AwemeRegistry:
+    def __init__(self):
+        self._entries: Dict[str, asyncio.Future] = {}
+        self.reused = 0
+
+    def __contains__(self, aweme_id: str) -> bool:
+        return aweme_id in self._entries
+
+    def claim(self, aweme_id: str) -> Optional[asyncio.Future]:
+        # None means the caller owns the download and must call finish(); otherwise the
+        # returned future resolves to the owner's outputs (None if it failed).
+        pending = self._entries.get(aweme_id)
+        if pending is not None:
+            return pending
+        self._entries[aweme_id] = asyncio.get_running_loop().create_future()
+        return None
+
+    def finish(self, aweme_id: str, outputs: Optional[AwemeOutputs]):
+        future = self._entries.get(aweme_id)
+        if future is None:
+            return
+        if outputs is None:
+            # Forget failures so a later duplicate gets its own attempt.
+            del self._entries[aweme_id]
+        if not future.done():
+            future.set_result(outputs)
@@ -0,0 +1,104 @@
+import time
+from typing import Any, Dict, Optional
+
+from utils.logger import setup_logger
+
+logger = setup_logger('CircuitBreaker')
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Error class for work refused because every target's breaker is open.
+CIRCUIT_OPEN = 'circuit_open'
+
+# How soon to look again while another request is probing a half-open target.
+HALF_OPEN_POLL = 1.0
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.probe_started = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        if self.state == CLOSED:
+            return True
+        now = time.monotonic()
+        if self.state == OPEN and now - self.opened_at >= self.reset_timeout:
+            self.state = HALF_OPEN
+            self.probing = False
+            logger.info(f"Circuit {self.name} half-open, sending a probe")
+        # Exactly one request tests the target; everyone else keeps skipping it. A probe
+        # that never reported back (cancelled) is replaced after another reset_timeout.
+        if self.state == HALF_OPEN and (not self.probing or now - self.probe_started >= self.reset_timeout):
+            self.probing = True
+            self.probe_started = now
+            return True
+        self.rejected += 1
+        return False
+
+    def retry_after(self) -> float:
+        # Seconds until allow() could let a request through again.
+        if self.state == OPEN:
+            return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+        if self.state == HALF_OPEN and self.probing:
+            return HALF_OPEN_POLL
+        return 0.0
+
+    def record_success(self):
+        if self.state != CLOSED:
+            logger.info(f"Circuit {self.name} closed after a successful probe")
+        self.state = CLOSED
+        self.failures = 0
+        self.probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+            self.probing = False
+            self.times_opened += 1
+            logger.warning(
+                f"Circuit {self.name} open after {self.failures} consecutive failure(s), "
+                f"skipping it for {self.reset_timeout:.0f}s"
+            )
+
+
+class CircuitBreakers:
+    # Keyed by 'api:<endpoint>' and 'cdn:<host>'; shared by every link in the run.
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    @classmethod
+    def from_config(cls, settings: Optional[Dict[str, Any]]) -> 'CircuitBreakers':
+        settings = settings or {}
+        return cls(
+            failure_threshold=int(settings.get('failure_threshold', 5)),
+            reset_timeout=float(settings.get('reset_timeout', 30)),
+        )
+
+    def get(self, key: str) -> CircuitBreaker:
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            breaker = CircuitBreaker(key, self.failure_threshold, self.reset_timeout)
+            self._breakers[key] = breaker
+        return breaker
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            key: {'state': breaker.state, 'opened': breaker.times_opened, 'rejected': breaker.rejected}
+            for key, breaker in self._breakers.items()
+            if breaker.times_opened or breaker.state != CLOSED
+        }
@@ -0,0 +1,159 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import aiohttp
+
+from utils.logger import setup_logger
+
+logger = setup_logger('MirrorSelector')
+
+Candidate = Tuple[str, Dict[str, str]]
+
+# Size used to turn throughput into seconds so latency and bandwidth share one score.
+SCORE_REFERENCE_BYTES = 1024 * 1024
+
+
+class HostStats:
+    def __init__(self):
+        self.ttfb: Optional[float] = None
+        self.throughput: Optional[float] = None
+        self.failures = 0
+        self.penalized_until = 0.0
+
+    def score(self) -> Optional[float]:
+        if self.ttfb is None and self.throughput is None:
+            return None
+        score = self.ttfb or 0.0
+        if self.throughput:
+            score += SCORE_REFERENCE_BYTES / self.throughput
+        return score
+
+
+class MirrorSelector:
+    def __init__(
+        self,
+        hedge_delay: float = 0.3,
+        probe_timeout: float = 10.0,
+        smoothing: float = 0.3,
+        penalty_seconds: float = 30.0,
+    ):
+        self.hedge_delay = hedge_delay
+        self.probe_timeout = probe_timeout
+        self.smoothing = smoothing
+        self.penalty_seconds = penalty_seconds
+        self.hosts: Dict[str, HostStats] = {}
+
+    @staticmethod
+    def _host(url: str) -> str:
+        return urlparse(url).netloc
+
+    def _stats(self, url: str) -> HostStats:
+        host = self._host(url)
+        if host not in self.hosts:
+            self.hosts[host] = HostStats()
+        return self.hosts[host]
+
+    def _smooth(self, previous: Optional[float], sample: float) -> float:
+        if previous is None:
+            return sample
+        return previous + self.smoothing * (sample - previous)
+
+    def rank(self, candidates: List[Candidate]) -> List[Candidate]:
+        now = time.monotonic()
+
+        def _key(candidate: Candidate):
+            stats = self.hosts.get(self._host(candidate[0]))
+            if stats is None:
+                return (False, float('inf'))
+            score = stats.score()
+            return (stats.penalized_until > now, score if score is not None else float('inf'))
+
+        # Stable sort: unknown hosts keep the order the API returned them in.
+        return sorted(candidates, key=_key)
+
+    def record_success(
+        self,
+        url: str,
+        ttfb: Optional[float] = None,
+        size: Optional[int] = None,
+        elapsed: Optional[float] = None,
+    ):
+        stats = self._stats(url)
+        stats.failures = 0
+        stats.penalized_until = 0.0
+        if ttfb is not None:
+            stats.ttfb = self._smooth(stats.ttfb, ttfb)
+        if size and elapsed and elapsed > 0:
+            stats.throughput = self._smooth(stats.throughput, size / elapsed)
+
+    def record_failure(self, url: str):
+        stats = self._stats(url)
+        stats.failures += 1
+        stats.penalized_until = time.monotonic() + self.penalty_seconds * min(stats.failures, 8)
+        logger.debug(f"Mirror {self._host(url)} failed {stats.failures} time(s) in a row")
+
+    async def race(
+        self,
+        candidates: List[Candidate],
+        session: aiohttp.ClientSession,
+        acquire: Optional[Callable[[], Awaitable[Any]]] = None,
+    ) -> List[Candidate]:
+        if len(candidates) < 2:
+            return candidates
+
+        async def _start(candidate: Candidate) -> float:
+            # Probes are real CDN requests: let the caller meter them like any other.
+            if acquire is not None:
+                await acquire()
+            return await self._probe(*candidate, session)
+
+        contenders = candidates[:2]
+        tasks: Dict[asyncio.Task, Candidate] = {
+            asyncio.ensure_future(_start(contenders[0])): contenders[0],
+        }
+        winner: Optional[Candidate] = None
+        hedged = False
+
+        try:
+            while tasks and winner is None:
+                timeout = None if hedged else self.hedge_delay
+                done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done or (not hedged and all(task.exception() for task in done)):
+                    # Primary is slow or already failed: hedge with the second mirror.
+                    if not hedged:
+                        hedged = True
+                        tasks[asyncio.ensure_future(_start(contenders[1]))] = contenders[1]
+                for task in done:
+                    candidate = tasks.pop(task)
+                    if task.exception() is None:
+                        winner = candidate
+                        break
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        if winner is None:
+            return candidates
+        return [winner] + [candidate for candidate in candidates if candidate is not winner]
+
+    async def _probe(self, url: str, headers: Dict[str, str], session: aiohttp.ClientSession) -> float:
+        started = time.monotonic()
+        try:
+            async with session.get(
+                url,
+                timeout=aiohttp.ClientTimeout(total=self.probe_timeout),
+                headers={**headers, 'Range': 'bytes=0-0'},
+            ) as response:
+                if response.status not in (200, 206):
+                    raise RuntimeError(f'probe returned status {response.status}')
+                await response.content.readany()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.record_failure(url)
+            raise
+        ttfb = time.monotonic() - started
+        self.record_success(url, ttfb=ttfb)
+        return ttfb
@@ -1,37 +1,111 @@
 import asyncio
-from typing import List, Callable, Any, TypeVar
+import inspect
+from typing import Any, AsyncIterable, Callable, Iterable, List, Optional, TypeVar, Union
 from utils.logger import setup_logger
 
 logger = setup_logger('QueueManager')
 
 T = TypeVar('T')
 
+_DONE = object()
+
 
 class QueueManager:
     def __init__(self, max_workers: int = 5):
         self.max_workers = max_workers
         self.semaphore = asyncio.Semaphore(max_workers)
 
+    async def borrow_slots(self, count: int) -> int:
+        # Only idle capacity is lent out: a slot with queued waiters stays with the queue.
+        borrowed = 0
+        while borrowed < count and not self.semaphore.locked():
+            await self.semaphore.acquire()
+            borrowed += 1
+        return borrowed
+
+    def release_slots(self, count: int):
+        for _ in range(count):
+            self.semaphore.release()
+
+    async def run_stream(
+        self,
+        download_func: Callable,
+        items: Union[Iterable[Any], AsyncIterable[Any]],
+        on_result: Optional[Callable[[Any], Any]] = None,
+        queue_size: Optional[int] = None,
+    ) -> int:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size or self.max_workers * 2)
+        processed = 0
+
+        async def _feed():
+            try:
+                if hasattr(items, '__aiter__'):
+                    async for item in items:
+                        await queue.put(item)
+                else:
+                    for item in items:
+                        await queue.put(item)
+            finally:
+                for _ in range(self.max_workers):
+                    await queue.put(_DONE)
+
+        async def _work():
+            nonlocal processed
+            while True:
+                item = await queue.get()
+                if item is _DONE:
+                    return
+
+                async with self.semaphore:
+                    try:
+                        result = await download_func(item)
+                    except Exception as e:
+                        logger.error(f"Download failed for item: {e}")
+                        result = {'status': 'error', 'error': str(e), 'item': item}
+
+                processed += 1
+                if on_result is not None:
+                    outcome = on_result(result)
+                    if inspect.isawaitable(outcome):
+                        await outcome
+
+        workers = [asyncio.ensure_future(_work()) for _ in range(self.max_workers)]
+        feeder = asyncio.ensure_future(_feed())
+        try:
+            await asyncio.gather(feeder, *workers)
+        except BaseException:
+            for task in [feeder, *workers]:
+                task.cancel()
+            raise
+        return processed
+
     async def process_tasks(self, tasks: List[Callable], *args, **kwargs) -> List[Any]:
-        async def _task_wrapper(task):
-            async with self.semaphore:
-                try:
-                    return await task(*args, **kwargs)
-                except Exception as e:
-                    logger.error(f"Task failed: {e}")
-                    return None
-
-        results = await asyncio.gather(*[_task_wrapper(task) for task in tasks], return_exceptions=True)
-        return results
+        async def _run_task(task):
+            try:
+                return await task(*args, **kwargs)
+            except Exception as e:
+                logger.error(f"Task failed: {e}")
+                return None
+
+        return await self._collect(_run_task, tasks)
 
     async def download_batch(self, download_func: Callable, items: List[Any]) -> List[Any]:
-        async def _download_wrapper(item):
-            async with self.semaphore:
-                try:
-                    return await download_func(item)
-                except Exception as e:
-                    logger.error(f"Download failed for item: {e}")
-                    return {'status': 'error', 'error': str(e), 'item': item}
-
-        results = await asyncio.gather(*[_download_wrapper(item) for item in items], return_exceptions=False)
+        return await self._collect(download_func, items)
+
+    async def _collect(self, func: Callable, items: List[Any]) -> List[Any]:
+        results: List[Any] = [None] * len(items)
+
+        async def _indexed(entry):
+            index, item = entry
+            try:
+                return index, await func(item)
+            except Exception as e:
+                logger.error(f"Download failed for item: {e}")
+                return index, {'status': 'error', 'error': str(e), 'item': item}
+
+        def _store(entry):
+            index, result = entry
+            results[index] = result
+
+        await self.run_stream(_indexed, enumerate(items), on_result=_store)
         return results
@@ -1,21 +1,124 @@
 import asyncio
 import time
+from typing import Any, Dict, Optional
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float = 1):
+        self.base_rate = rate
+        self.rate = rate
+        self.burst = max(1.0, float(burst))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        if self.rate > 0:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def set_scale(self, scale: float):
+        # Settle what accrued at the old rate before switching.
+        self._refill(time.monotonic())
+        self.rate = self.base_rate * scale
+
+    def reserve(self) -> float:
+        # Take a token now, going into debt if the bucket is empty; the debt is how long the
+        # caller has to wait. Reserving is synchronous, so waiters never sleep under a lock
+        # and are served in arrival order.
+        if self.rate <= 0:
+            return 0.0
+        self._refill(time.monotonic())
+        self.tokens -= 1
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    async def acquire(self):
+        wait_time = self.reserve()
+        if wait_time > 0:
+            await asyncio.sleep(wait_time)
+
+
+# Endpoints outside Douyin's API. They only have their own bucket, never draw on the
+# run-wide API budget, and ignore risk-control scaling and pauses (CDN hosts have breakers).
+NON_API_ENDPOINTS = frozenset({'cdn'})
 
 
 class RateLimiter:
-    def __init__(self, max_per_second: float = 2):
+    def __init__(
+        self,
+        max_per_second: float = 2,
+        burst: float = 1,
+        endpoints: Optional[Dict[str, Dict[str, Any]]] = None,
+    ):
         self.max_per_second = max_per_second
-        self.min_interval = 1.0 / max_per_second
-        self.last_request = 0
-        self._lock = asyncio.Lock()
+        self.burst = burst
+        self.endpoints = endpoints or {}
+        self.scale = 1.0
+        self.paused_until = 0.0
+        # rate/burst are the budget for all API calls together; an endpoint entry can only
+        # cap that endpoint further.
+        self._api = TokenBucket(max_per_second, burst)
+        self._buckets: Dict[str, TokenBucket] = {}
 
-    async def acquire(self):
-        async with self._lock:
-            current = time.time()
-            time_since_last = current - self.last_request
+    @classmethod
+    def from_config(cls, settings: Optional[Dict[str, Any]]) -> 'RateLimiter':
+        settings = settings or {}
+        return cls(
+            max_per_second=float(settings.get('rate', 2)),
+            burst=float(settings.get('burst', 1)),
+            endpoints=settings.get('endpoints') or {},
+        )
+
+    @staticmethod
+    def is_api(endpoint: str) -> bool:
+        return endpoint not in NON_API_ENDPOINTS
+
+    def bucket(self, endpoint: str = 'default') -> TokenBucket:
+        # The bucket an endpoint is paced by: its own if configured (or outside the API),
+        # otherwise the shared API budget.
+        bucket = self._buckets.get(endpoint)
+        if bucket is not None:
+            return bucket
+        settings = self.endpoints.get(endpoint)
+        if settings is None and self.is_api(endpoint):
+            return self._api
+        settings = settings or {}
+        bucket = TokenBucket(
+            float(settings.get('rate', self.max_per_second)),
+            float(settings.get('burst', self.burst)),
+        )
+        if self.scale != 1.0 and self.is_api(endpoint):
+            bucket.set_scale(self.scale)
+        self._buckets[endpoint] = bucket
+        return bucket
+
+    def set_scale(self, scale: float):
+        self.scale = scale
+        self._api.set_scale(scale)
+        for endpoint, bucket in self._buckets.items():
+            if self.is_api(endpoint):
+                bucket.set_scale(scale)
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
 
-            if time_since_last < self.min_interval:
-                wait_time = self.min_interval - time_since_last
-                await asyncio.sleep(wait_time)
+    async def _wait_pause(self):
+        while True:
+            delay = self.paused_until - time.monotonic()
+            if delay <= 0:
+                return
+            await asyncio.sleep(delay)
 
-            self.last_request = time.time()
+    async def acquire(self, endpoint: str = 'default'):
+        if not self.is_api(endpoint):
+            await self.bucket(endpoint).acquire()
+            return
+        await self._wait_pause()
+        bucket = self.bucket(endpoint)
+        wait_time = bucket.reserve()
+        if bucket is not self._api:
+            # A capped endpoint still spends from the shared budget; both debts run concurrently.
+            wait_time = max(wait_time, self._api.reserve())
+        if wait_time > 0:
+            await asyncio.sleep(wait_time)
+        # A pause that started while this caller slept for its token still applies.
+        await self._wait_pause()
@@ -1,29 +1,92 @@
 import asyncio
-from typing import Callable, Any, TypeVar
+import random
+from typing import Callable, Any, Dict, Optional, TypeVar
 from utils.logger import setup_logger
 
 logger = setup_logger('RetryHandler')
 
 T = TypeVar('T')
 
+RETRYABLE = 'retryable'
+PERMANENT = 'permanent'
+AUTH = 'auth'
+
+
+class RetryError(Exception):
+    def __init__(self, message: str, status: Optional[int] = None, error_class: Optional[str] = None):
+        super().__init__(message)
+        self.status = status
+        self.error_class = error_class
+
+
+def classify_error(error: BaseException) -> str:
+    error_class = getattr(error, 'error_class', None)
+    if error_class:
+        return error_class
+    status = getattr(error, 'status', None)
+    if status is None:
+        # Timeouts, resets, stalled reads: transient by nature.
+        return RETRYABLE
+    if status in (401, 403):
+        return AUTH
+    if 400 <= status < 500 and status not in (408, 429):
+        return PERMANENT
+    return RETRYABLE
+
 
 class RetryHandler:
-    def __init__(self, max_retries: int = 3):
+    def __init__(
+        self,
+        max_retries: int = 3,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        budget_ratio: float = 0.1,
+        budget_min: int = 10,
+    ):
         self.max_retries = max_retries
-        self.retry_delays = [1, 2, 5]
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # Retries stay under budget_min + budget_ratio * calls for the whole run, so a bad
+        # edge can't turn every download into max_retries requests.
+        self.budget_ratio = budget_ratio
+        self.budget_min = budget_min
+        self.calls = 0
+        self.retries = 0
+        self.budget_denied = 0
+        self.failures: Dict[str, int] = {RETRYABLE: 0, PERMANENT: 0, AUTH: 0}
+
+    def _budget_allows(self) -> bool:
+        return self.retries < self.budget_min + self.budget_ratio * self.calls
+
+    def _next_delay(self, previous: float) -> float:
+        # Decorrelated jitter: workers that failed together don't retry together.
+        return min(self.max_delay, random.uniform(self.base_delay, previous * 3))
 
     async def execute_with_retry(self, func: Callable[..., T], *args, **kwargs) -> T:
-        last_error = None
+        self.calls += 1
+        delay = self.base_delay
 
         for attempt in range(self.max_retries):
             try:
                 return await func(*args, **kwargs)
             except Exception as e:
-                last_error = e
-                if attempt < self.max_retries - 1:
-                    delay = self.retry_delays[min(attempt, len(self.retry_delays) - 1)]
-                    logger.warning(f"Attempt {attempt + 1} failed: {e}, retrying in {delay}s...")
-                    await asyncio.sleep(delay)
-
-        logger.error(f"All {self.max_retries} attempts failed: {last_error}")
-        raise last_error
+                error_class = classify_error(e)
+                self.failures[error_class] = self.failures.get(error_class, 0) + 1
+
+                if error_class != RETRYABLE:
+                    logger.warning(f"Attempt {attempt + 1} failed ({error_class}): {e}, not retrying")
+                    raise
+                if attempt >= self.max_retries - 1:
+                    logger.error(f"All {self.max_retries} attempts failed: {e}")
+                    raise
+                if not self._budget_allows():
+                    self.budget_denied += 1
+                    logger.warning(f"Attempt {attempt + 1} failed: {e}, retry budget exhausted")
+                    raise
+
+                self.retries += 1
+                delay = self._next_delay(delay)
+                logger.warning(f"Attempt {attempt + 1} failed: {e}, retrying in {delay:.1f}s...")
+                await asyncio.sleep(delay)
+
+        raise RuntimeError('max_retries must be at least 1')
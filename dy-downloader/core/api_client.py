@@ -1,21 +1,90 @@
 from __future__ import annotations
 
+import json
+
 import aiohttp
 from typing import Any, Dict, Optional, Tuple
 from urllib.parse import urlencode
 
+from control.circuit_breaker import CircuitBreakers
+from control.adaptive_controller import (
+    API_ERROR,
+    AdaptiveController,
+    CAPTCHA,
+    EMPTY,
+    FORBIDDEN,
+    HTTP_ERROR,
+    NETWORK_ERROR,
+    OK,
+    THROTTLED,
+)
 from utils.logger import setup_logger
-from utils.xbogus import XBogus
+from utils.xbogus import Signer, get_signer
 
 logger = setup_logger('APIClient')
 
+CAPTCHA_MARKERS = ('captcha', 'verify_check', 'verifycenter', '验证码')
+
+
+def classify_response(status: int, body: bytes) -> Tuple[str, Optional[Dict[str, Any]]]:
+    if status == 429:
+        return THROTTLED, None
+    if status == 403:
+        return FORBIDDEN, None
+    if status != 200:
+        return HTTP_ERROR, None
+    if not body.strip():
+        return EMPTY, None
+    try:
+        data = json.loads(body)
+    except ValueError:
+        # Risk control answers API calls with an HTML verify page.
+        text = body[:4096].decode('utf-8', 'ignore').lower()
+        if any(marker in text for marker in CAPTCHA_MARKERS):
+            return CAPTCHA, None
+        return API_ERROR, None
+    if not isinstance(data, dict):
+        return API_ERROR, None
+    if data.get('status_code', 0) != 0:
+        message = str(data.get('status_msg') or '').lower()
+        if any(marker in message for marker in CAPTCHA_MARKERS):
+            return CAPTCHA, data
+        return API_ERROR, data
+    return OK, data
+
+
+class CircuitOpenResponse(dict):
+    # Returned instead of a response when the endpoint's breaker refuses the request. Empty,
+    # so it is falsy like any failed request, but callers that page through results can tell
+    # "the endpoint is shedding load for retry_after seconds" from "there is nothing more".
+    def __init__(self, endpoint: str, retry_after: float):
+        super().__init__()
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
 
 class DouyinAPIClient:
     BASE_URL = 'https://www.douyin.com'
+    API_POOL_LIMIT = 16
+    CDN_POOL_LIMIT = 64
+    CDN_POOL_LIMIT_PER_HOST = 16
+    DNS_CACHE_TTL = 600
+    KEEPALIVE_TIMEOUT = 60
 
-    def __init__(self, cookies: Dict[str, str]):
+    def __init__(
+        self,
+        cookies: Dict[str, str],
+        cdn_pool_limit: Optional[int] = None,
+        controller: Optional[AdaptiveController] = None,
+        circuit_breakers: Optional[CircuitBreakers] = None,
+        signer: Optional[Signer] = None,
+    ):
         self.cookies = cookies or {}
+        self.controller = controller
+        self.circuit_breakers = circuit_breakers or CircuitBreakers()
+        self.cdn_pool_limit = cdn_pool_limit or self.CDN_POOL_LIMIT
         self._session: Optional[aiohttp.ClientSession] = None
+        self._download_session: Optional[aiohttp.ClientSession] = None
         self.headers = {
             'User-Agent': (
                 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) '
@@ -27,7 +96,7 @@ class DouyinAPIClient:
             'Accept-Language': 'zh-CN,zh;q=0.9,en-US;q=0.8,en;q=0.7',
             'Connection': 'keep-alive',
         }
-        self._signer = XBogus(self.headers['User-Agent'])
+        self._signer = signer or get_signer()
 
     async def __aenter__(self) -> 'DouyinAPIClient':
         await self._ensure_session()
@@ -36,24 +105,50 @@ class DouyinAPIClient:
     async def __aexit__(self, exc_type, exc, tb):
         await self.close()
 
+    def _build_connector(self, limit: int, limit_per_host: int) -> aiohttp.TCPConnector:
+        return aiohttp.TCPConnector(
+            limit=limit,
+            limit_per_host=limit_per_host,
+            ttl_dns_cache=self.DNS_CACHE_TTL,
+            keepalive_timeout=self.KEEPALIVE_TIMEOUT,
+        )
+
     async def _ensure_session(self):
+        # API hosts: few connections, kept warm for the signed JSON endpoints.
         if self._session is None or self._session.closed:
             self._session = aiohttp.ClientSession(
                 headers=self.headers,
                 cookies=self.cookies,
+                connector=self._build_connector(self.API_POOL_LIMIT, self.API_POOL_LIMIT),
                 timeout=aiohttp.ClientTimeout(total=30),
                 raise_for_status=False,
             )
 
+    async def _ensure_download_session(self):
+        # CDN hosts: a separate, larger pool so media transfers never starve API calls.
+        if self._download_session is None or self._download_session.closed:
+            self._download_session = aiohttp.ClientSession(
+                headers={**self.headers, 'Accept': '*/*'},
+                cookies=self.cookies,
+                connector=self._build_connector(self.cdn_pool_limit, self.CDN_POOL_LIMIT_PER_HOST),
+                raise_for_status=False,
+            )
+
     async def close(self):
-        if self._session and not self._session.closed:
-            await self._session.close()
+        for session in (self._session, self._download_session):
+            if session and not session.closed:
+                await session.close()
 
     async def get_session(self) -> aiohttp.ClientSession:
         await self._ensure_session()
         assert self._session is not None
         return self._session
 
+    async def get_download_session(self) -> aiohttp.ClientSession:
+        await self._ensure_download_session()
+        assert self._download_session is not None
+        return self._download_session
+
     def _default_query(self) -> Dict[str, Any]:
         return {
             'device_platform': 'webapp',
@@ -84,34 +179,61 @@ class DouyinAPIClient:
         }
 
     def sign_url(self, url: str) -> Tuple[str, str]:
-        signed_url, _xbogus, ua = self._signer.build(url)
-        return signed_url, ua
+        ua = self.headers['User-Agent']
+        return self._signer.sign(url, ua), ua
 
     def build_signed_path(self, path: str, params: Dict[str, Any]) -> Tuple[str, str]:
         query = urlencode(params)
         url = f"{self.BASE_URL}{path}?{query}"
         return self.sign_url(url)
 
-    async def get_video_detail(self, aweme_id: str) -> Optional[Dict[str, Any]]:
-        params = self._default_query()
-        params.update({
-            'aweme_id': aweme_id,
-            'aid': '1128',
-        })
+    async def _get_json(
+        self, endpoint: str, path: str, params: Dict[str, Any], target: str
+    ) -> Optional[Dict[str, Any]]:
+        breaker = self.circuit_breakers.get(f'api:{endpoint}')
+        if not breaker.allow():
+            logger.warning(f"Skipping {endpoint} request for {target}: circuit open")
+            return CircuitOpenResponse(endpoint, breaker.retry_after())
 
         await self._ensure_session()
-        signed_url, ua = self.build_signed_path('/aweme/v1/web/aweme/detail/', params)
+        signed_url, ua = self.build_signed_path(path, params)
 
         try:
             async with self._session.get(signed_url, headers={**self.headers, 'User-Agent': ua}) as response:
-                if response.status == 200:
-                    data = await response.json(content_type=None)
-                    return data.get('aweme_detail')
-                logger.error(f"Video detail request failed: {aweme_id}, status={response.status}")
+                status = response.status
+                body = await response.read()
         except Exception as e:
-            logger.error(f"Failed to get video detail: {aweme_id}, error: {e}")
+            logger.error(f"Request to {endpoint} failed: {target}, error: {e}")
+            self._report(endpoint, NETWORK_ERROR)
+            return None
+
+        kind, data = classify_response(status, body)
+        self._report(endpoint, kind)
+        if kind == OK:
+            return data
+        logger.error(f"Request to {endpoint} failed: {target}, status={status}, {kind}")
+        # A non-zero status_code can still carry usable fields; callers decide.
+        return data if kind == API_ERROR else None
 
-        return None
+    def _report(self, endpoint: str, kind: str):
+        # A non-zero status_code is an answer about the item (private, deleted), not an outage.
+        breaker = self.circuit_breakers.get(f'api:{endpoint}')
+        if kind in (OK, API_ERROR):
+            breaker.record_success()
+        else:
+            breaker.record_failure()
+        if self.controller is not None:
+            self.controller.record(endpoint, kind)
+
+    async def get_video_detail(self, aweme_id: str) -> Optional[Dict[str, Any]]:
+        params = self._default_query()
+        params.update({
+            'aweme_id': aweme_id,
+            'aid': '1128',
+        })
+
+        data = await self._get_json('detail', '/aweme/v1/web/aweme/detail/', params, aweme_id)
+        return data.get('aweme_detail') if data else None
 
     async def get_user_post(self, sec_uid: str, max_cursor: int = 0, count: int = 20) -> Dict[str, Any]:
         params = self._default_query()
@@ -128,36 +250,16 @@ class DouyinAPIClient:
             'publish_video_strategy_type': '2',
         })
 
-        await self._ensure_session()
-        signed_url, ua = self.build_signed_path('/aweme/v1/web/aweme/post/', params)
-
-        try:
-            async with self._session.get(signed_url, headers={**self.headers, 'User-Agent': ua}) as response:
-                if response.status == 200:
-                    return await response.json(content_type=None)
-                logger.error(f"User post request failed: {sec_uid}, status={response.status}")
-        except Exception as e:
-            logger.error(f"Failed to get user post: {sec_uid}, error: {e}")
-
-        return {}
+        data = await self._get_json('post', '/aweme/v1/web/aweme/post/', params, sec_uid)
+        # Keep the circuit-open marker: pagination must not read it as the end of the list.
+        return data if data is not None else {}
 
     async def get_user_info(self, sec_uid: str) -> Optional[Dict[str, Any]]:
         params = self._default_query()
         params.update({'sec_user_id': sec_uid})
 
-        await self._ensure_session()
-        signed_url, ua = self.build_signed_path('/aweme/v1/web/user/profile/other/', params)
-
-        try:
-            async with self._session.get(signed_url, headers={**self.headers, 'User-Agent': ua}) as response:
-                if response.status == 200:
-                    data = await response.json(content_type=None)
-                    return data.get('user')
-                logger.error(f"User info request failed: {sec_uid}, status={response.status}")
-        except Exception as e:
-            logger.error(f"Failed to get user info: {sec_uid}, error: {e}")
-
-        return None
+        data = await self._get_json('profile', '/aweme/v1/web/user/profile/other/', params, sec_uid)
+        return data.get('user') if data else None
 
     async def resolve_short_url(self, short_url: str) -> Optional[str]:
         try:
@@ -1,13 +1,21 @@
+import asyncio
 import json
+import time
 from abc import ABC, abstractmethod
+from datetime import datetime
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
 from urllib.parse import urlparse
 
 from config import ConfigLoader
-from storage import Database, FileManager, MetadataHandler
+from storage import Database, FileManager, MediaStore, MetadataHandler
+from storage.media_store import place_file
 from auth import CookieManager
-from control import QueueManager, RateLimiter, RetryHandler
+from control import AwemeRegistry, CircuitBreakers, MirrorSelector, QueueManager, RateLimiter, RetryHandler
+from control.aweme_registry import AwemeOutputs
+from control.mirror_selector import Candidate
+from control.circuit_breaker import CIRCUIT_OPEN, CLOSED
+from control.retry_handler import AUTH, PERMANENT, RETRYABLE, RetryError, classify_error
 from core.api_client import DouyinAPIClient
 from utils.logger import setup_logger
 from utils.validators import sanitize_filename
@@ -21,9 +29,15 @@ class DownloadResult:
         self.success = 0
         self.failed = 0
         self.skipped = 0
+        # Listings that stopped before their last page (failed fetch, endpoint circuit open):
+        # total undercounts by an unknown number of posts.
+        self.incomplete = 0
 
     def __str__(self):
-        return f"Total: {self.total}, Success: {self.success}, Failed: {self.failed}, Skipped: {self.skipped}"
+        text = f"Total: {self.total}, Success: {self.success}, Failed: {self.failed}, Skipped: {self.skipped}"
+        if self.incomplete:
+            text += f", Incomplete listings: {self.incomplete}"
+        return text
 
 
 class BaseDownloader(ABC):
@@ -37,6 +51,9 @@ class BaseDownloader(ABC):
         rate_limiter: Optional[RateLimiter] = None,
         retry_handler: Optional[RetryHandler] = None,
         queue_manager: Optional[QueueManager] = None,
+        mirror_selector: Optional[MirrorSelector] = None,
+        aweme_registry: Optional[AwemeRegistry] = None,
+        circuit_breakers: Optional[CircuitBreakers] = None,
     ):
         self.config = config
         self.api_client = api_client
@@ -47,7 +64,11 @@ class BaseDownloader(ABC):
         self.retry_handler = retry_handler or RetryHandler()
         thread_count = int(self.config.get('thread', 5) or 5)
         self.queue_manager = queue_manager or QueueManager(max_workers=thread_count)
+        self.mirror_selector = mirror_selector or MirrorSelector()
+        self.aweme_registry = aweme_registry or AwemeRegistry()
+        self.circuit_breakers = circuit_breakers or CircuitBreakers()
         self.metadata_handler = MetadataHandler()
+        self._time_bounds_cache: Optional[Tuple[Optional[int], Optional[int]]] = None
 
     def _download_headers(self, user_agent: Optional[str] = None) -> Dict[str, str]:
         headers = {
@@ -68,40 +89,59 @@ class BaseDownloader(ABC):
             return not await self.database.is_downloaded(aweme_id)
         return True
 
+    async def _prune_downloaded(
+        self, aweme_list: List[Dict[str, Any]], author_id: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        if not self.database or not aweme_list:
+            return aweme_list
+        downloaded = await self.database.filter_downloaded(
+            (aweme.get('aweme_id') for aweme in aweme_list), author_id=author_id
+        )
+        # Posts this run is already handling get linked into this link's folder, not skipped.
+        downloaded = {aweme_id for aweme_id in downloaded if aweme_id not in self.aweme_registry}
+        if not downloaded:
+            return aweme_list
+        return [aweme for aweme in aweme_list if aweme.get('aweme_id') not in downloaded]
+
+    def _time_bounds(self) -> Tuple[Optional[int], Optional[int]]:
+        if self._time_bounds_cache is None:
+            start_time = self.config.get('start_time')
+            end_time = self.config.get('end_time')
+            self._time_bounds_cache = (
+                int(datetime.strptime(start_time, '%Y-%m-%d').timestamp()) if start_time else None,
+                int(datetime.strptime(end_time, '%Y-%m-%d').timestamp()) if end_time else None,
+            )
+        return self._time_bounds_cache
+
+    @staticmethod
+    def _is_pinned(aweme: Dict[str, Any]) -> bool:
+        return bool(aweme.get('is_top'))
+
     def _filter_by_time(self, aweme_list: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        start_time = self.config.get('start_time')
-        end_time = self.config.get('end_time')
+        start_ts, end_ts = self._time_bounds()
 
-        if not start_time and not end_time:
+        if start_ts is None and end_ts is None:
             return aweme_list
 
         filtered: List[Dict[str, Any]] = []
         for aweme in aweme_list:
             create_time = aweme.get('create_time', 0)
-
-            if start_time:
-                from datetime import datetime
-                start_ts = int(datetime.strptime(start_time, '%Y-%m-%d').timestamp())
-                if create_time < start_ts:
-                    continue
-
-            if end_time:
-                from datetime import datetime
-                end_ts = int(datetime.strptime(end_time, '%Y-%m-%d').timestamp())
-                if create_time > end_ts:
-                    continue
-
+            if start_ts is not None and create_time < start_ts:
+                continue
+            if end_ts is not None and create_time > end_ts:
+                continue
             filtered.append(aweme)
 
         return filtered
 
-    def _limit_count(self, aweme_list: List[Dict[str, Any]], mode: str) -> List[Dict[str, Any]]:
-        number_config = self.config.get('number', {})
-        limit = number_config.get(mode, 0)
-
-        if limit > 0:
-            return aweme_list[:limit]
-        return aweme_list
+    def _aweme_save_dir(self, aweme_id: str, desc: str, author_name: str, mode: Optional[str]) -> Path:
+        return self.file_manager.get_save_path(
+            author_name=author_name,
+            mode=mode,
+            aweme_title=desc,
+            aweme_id=aweme_id,
+            folderstyle=self.config.get('folderstyle', True)
+        )
 
     async def _download_aweme_assets(
         self,
@@ -114,93 +154,156 @@ class BaseDownloader(ABC):
             logger.error('Missing aweme_id in aweme data')
             return False
 
+        outputs = await self._claim_aweme(aweme_id)
+        if outputs is not None:
+            return await self._reuse_aweme_outputs(outputs, author_name, mode)
+
+        try:
+            outputs = await self._fetch_aweme_outputs(aweme_data, author_name, mode)
+            return outputs is not None
+        finally:
+            self.aweme_registry.finish(aweme_id, outputs)
+
+    async def _claim_aweme(self, aweme_id: str) -> Optional[AwemeOutputs]:
+        # The same aweme can arrive through several links in one run. Returns the outputs of
+        # the schedule that got it first, or None once the caller owns it and must report
+        # back through aweme_registry.finish(). Call only while holding a download slot:
+        # then every owner already has one, and waiters parked on slots can't starve it.
+        while True:
+            pending = self.aweme_registry.claim(aweme_id)
+            if pending is None:
+                return None
+            outputs = await asyncio.shield(pending)
+            if outputs is not None:
+                return outputs
+
+    async def _reuse_aweme_outputs(
+        self,
+        outputs: AwemeOutputs,
+        author_name: str,
+        mode: Optional[str],
+    ) -> bool:
+        aweme_id = outputs.aweme_id
+        save_dir = self._aweme_save_dir(aweme_id, outputs.desc, author_name, mode)
+        try:
+            for src in outputs.files:
+                await asyncio.to_thread(place_file, src, save_dir / src.name)
+        except OSError as e:
+            logger.error(f"Failed to reuse outputs of {aweme_id} from {outputs.save_dir}: {e}")
+            return False
+
+        self.aweme_registry.reused += 1
+        logger.info(f"Reused {len(outputs.files)} file(s) of {aweme_id} from {outputs.save_dir}")
+        return True
+
+    async def _fetch_aweme_outputs(
+        self,
+        aweme_data: Dict[str, Any],
+        author_name: str,
+        mode: Optional[str] = None,
+    ) -> Optional[AwemeOutputs]:
+        aweme_id = aweme_data.get('aweme_id')
         desc = aweme_data.get('desc', 'no_title')
         safe_title = sanitize_filename(desc)
+        save_dir = self._aweme_save_dir(aweme_id, desc, author_name, mode)
+        files: List[Path] = []
 
-        save_dir = self.file_manager.get_save_path(
-            author_name=author_name,
-            mode=mode,
-            aweme_title=desc,
-            aweme_id=aweme_id,
-            folderstyle=self.config.get('folderstyle', True)
-        )
-
-        session = await self.api_client.get_session()
+        session = await self.api_client.get_download_session()
 
         media_type = self._detect_media_type(aweme_data)
         if media_type == 'video':
-            video_info = self._build_no_watermark_url(aweme_data)
-            if not video_info:
+            video_candidates = self._build_video_candidates(aweme_data)
+            if not video_candidates:
                 logger.error(f'No playable video URL found for aweme {aweme_id}')
-                return False
+                return None
 
-            video_url, video_headers = video_info
             video_path = save_dir / f"{safe_title}_{aweme_id}.mp4"
-            if not await self._download_with_retry(video_url, video_path, session, headers=video_headers):
-                return False
+            video = aweme_data.get('video', {})
+            if not await self._download_asset(
+                video_candidates,
+                video_path,
+                session,
+                store_key=MediaStore.make_key('video', video.get('play_addr', {}).get('uri') or video.get('vid')),
+                segments=int(self.config.get('segments', 1) or 1),
+                race=True,
+            ):
+                return None
+            files.append(video_path)
 
             if self.config.get('cover'):
-                cover_url = self._extract_first_url(aweme_data.get('video', {}).get('cover'))
-                if cover_url:
+                cover = video.get('cover')
+                cover_urls = self._extract_urls(cover)
+                if cover_urls:
                     cover_path = save_dir / f"{safe_title}_{aweme_id}_cover.jpg"
-                    await self._download_with_retry(
-                        cover_url,
+                    if await self._download_asset(
+                        self._mirror_candidates(cover_urls),
                         cover_path,
                         session,
-                        headers=self._download_headers(),
+                        store_key=MediaStore.make_key('cover', self._extract_uri(cover)),
+                        url_addressable=True,
                         optional=True,
-                    )
+                    ):
+                        files.append(cover_path)
 
             if self.config.get('music'):
-                music_url = self._extract_first_url(aweme_data.get('music', {}).get('play_url'))
-                if music_url:
+                music = aweme_data.get('music') or {}
+                music_urls = self._extract_urls(music.get('play_url'))
+                if music_urls:
                     music_path = save_dir / f"{safe_title}_{aweme_id}_music.mp3"
-                    await self._download_with_retry(
-                        music_url,
+                    music_id = music.get('id_str') or music.get('id') or music.get('mid')
+                    if await self._download_asset(
+                        self._mirror_candidates(music_urls),
                         music_path,
                         session,
-                        headers=self._download_headers(),
+                        store_key=MediaStore.make_key('music', str(music_id) if music_id else None),
+                        url_addressable=True,
                         optional=True,
-                    )
+                    ):
+                        files.append(music_path)
 
         elif media_type == 'gallery':
-            image_urls = self._collect_image_urls(aweme_data)
-            if not image_urls:
+            images = self._collect_images(aweme_data)
+            if not images:
                 logger.error(f'No images found for aweme {aweme_id}')
-                return False
+                return None
 
-            for index, image_url in enumerate(image_urls, start=1):
-                suffix = Path(urlparse(image_url).path).suffix or '.jpg'
+            for index, (image_urls, image_uri) in enumerate(images, start=1):
+                suffix = Path(urlparse(image_urls[0]).path).suffix or '.jpg'
                 image_path = save_dir / f"{safe_title}_{aweme_id}_{index}{suffix}"
-                success = await self._download_with_retry(
-                    image_url,
+                success = await self._download_asset(
+                    self._mirror_candidates(image_urls),
                     image_path,
                     session,
-                    headers=self._download_headers(),
+                    store_key=MediaStore.make_key('image', image_uri),
+                    url_addressable=True,
                 )
                 if not success:
                     logger.error(f'Failed downloading image {index} for aweme {aweme_id}')
-                    return False
+                    return None
+                files.append(image_path)
         else:
             logger.error(f"Unsupported media type for aweme {aweme_id}: {media_type}")
-            return False
+            return None
 
         if self.config.get('avatar'):
             author = aweme_data.get('author', {})
-            avatar_url = self._extract_first_url(author.get('avatar_larger'))
-            if avatar_url:
+            avatar_urls = self._extract_urls(author.get('avatar_larger'))
+            if avatar_urls:
                 avatar_path = save_dir / 'avatar.jpg'
-                await self._download_with_retry(
-                    avatar_url,
+                if await self._download_asset(
+                    self._mirror_candidates(avatar_urls),
                     avatar_path,
                     session,
-                    headers=self._download_headers(),
+                    store_key=MediaStore.make_key('avatar', self._extract_uri(author.get('avatar_larger'))),
+                    url_addressable=True,
                     optional=True,
-                )
+                ):
+                    files.append(avatar_path)
 
         if self.config.get('json'):
             json_path = save_dir / f"{safe_title}_{aweme_id}_data.json"
             await self.metadata_handler.save_metadata(aweme_data, json_path)
+            files.append(json_path)
 
         if self.database:
             author = aweme_data.get('author', {})
@@ -217,22 +320,116 @@ class BaseDownloader(ABC):
             })
 
         logger.info(f"Downloaded {media_type}: {desc} ({aweme_id})")
-        return True
+        return AwemeOutputs(aweme_id, desc, author_name, save_dir, files)
+
+    async def _download_asset(
+        self,
+        candidates: List[Candidate],
+        save_path: Path,
+        session,
+        *,
+        store_key: Optional[str] = None,
+        optional: bool = False,
+        segments: int = 1,
+        url_addressable: bool = False,
+        race: bool = False,
+    ) -> bool:
+        candidates = self.mirror_selector.rank(candidates)
+        primary_url, primary_headers = candidates[0]
+
+        async def _fetch(target: Path) -> bool:
+            ranked = candidates
+            if race:
+                ranked = await self._race_mirrors(candidates, session)
+            return await self._download_with_retry(
+                ranked,
+                target,
+                session,
+                optional=optional,
+                segments=segments,
+            )
+
+        verify = bool(self.config.get('verify_existing', True))
+        if await self.file_manager.is_complete(save_path, primary_url, session, headers=primary_headers, verify=verify):
+            logger.debug(f"Skipping complete file {save_path.name}")
+            return True
+
+        if not self.config.get('dedupe', True):
+            return await _fetch(save_path)
+        return await self.file_manager.media_store.materialize(
+            store_key,
+            save_path,
+            _fetch,
+            url=primary_url if url_addressable else None,
+        )
+
+    async def _race_mirrors(self, candidates: List[Candidate], session) -> List[Candidate]:
+        # Only hosts with a closed breaker are probed: an open host must stay untouched, and a
+        # half-open one gets its single probe from _download_with_retry. The rest keep their
+        # place at the back, where _download_with_retry still skips or probes them.
+        healthy = [
+            candidate for candidate in candidates
+            if self.circuit_breakers.get(f'cdn:{urlparse(candidate[0]).netloc}').state == CLOSED
+        ]
+        if len(healthy) < 2:
+            return candidates
+        ranked = await self.mirror_selector.race(
+            healthy,
+            session,
+            acquire=lambda: self.rate_limiter.acquire('cdn'),
+        )
+        return ranked + [candidate for candidate in candidates if candidate not in healthy]
 
     async def _download_with_retry(
         self,
-        url: str,
+        candidates: List[Candidate],
         save_path: Path,
         session,
         *,
-        headers: Optional[Dict[str, str]] = None,
         optional: bool = False,
+        segments: int = 1,
     ) -> bool:
         async def _task():
-            success = await self.file_manager.download_file(url, save_path, session, headers=headers)
-            if not success:
-                raise RuntimeError(f'Download failed for {url}')
-            return True
+            failures: List[BaseException] = []
+            skipped = 0
+            for url, headers in candidates:
+                breaker = self.circuit_breakers.get(f'cdn:{urlparse(url).netloc}')
+                if not breaker.allow():
+                    # Host is known bad right now: go straight to the next mirror.
+                    skipped += 1
+                    continue
+                await self.rate_limiter.acquire('cdn')
+                started = time.monotonic()
+                seen = len(failures)
+                success = await self.file_manager.download_file(
+                    url,
+                    save_path,
+                    session,
+                    headers=headers,
+                    segments=segments,
+                    queue_manager=self.queue_manager,
+                    failures=failures,
+                )
+                # A 404 means the host answered; only outages count against it.
+                new_failures = failures[seen:]
+                if success or (new_failures and all(classify_error(e) == PERMANENT for e in new_failures)):
+                    breaker.record_success()
+                else:
+                    breaker.record_failure()
+                if success:
+                    self.mirror_selector.record_success(
+                        url,
+                        size=self.file_manager.get_file_size(save_path),
+                        elapsed=time.monotonic() - started,
+                    )
+                    return True
+                self.mirror_selector.record_failure(url)
+            if skipped == len(candidates):
+                raise RetryError(f'All hosts for {candidates[0][0]} have open circuits', error_class=CIRCUIT_OPEN)
+            # Worth another round if any mirror failed transiently (or gave no reason).
+            classes = {classify_error(error) for error in failures} or {RETRYABLE}
+            error_class = next(c for c in (RETRYABLE, AUTH, PERMANENT) if c in classes)
+            raise RetryError(f'Download failed for {candidates[0][0]}', error_class=error_class)
 
         try:
             await self.retry_handler.execute_with_retry(_task)
@@ -247,13 +444,18 @@ class BaseDownloader(ABC):
             return 'gallery'
         return 'video'
 
-    def _build_no_watermark_url(self, aweme_data: Dict[str, Any]) -> Optional[Tuple[str, Dict[str, str]]]:
+    def _build_no_watermark_url(self, aweme_data: Dict[str, Any]) -> Optional[Candidate]:
+        candidates = self._build_video_candidates(aweme_data)
+        return candidates[0] if candidates else None
+
+    def _build_video_candidates(self, aweme_data: Dict[str, Any]) -> List[Candidate]:
         video = aweme_data.get('video', {})
         play_addr = video.get('play_addr', {})
         url_candidates = [c for c in (play_addr.get('url_list') or []) if c]
         url_candidates.sort(key=lambda u: 0 if 'watermark=0' in u else 1)
 
-        fallback_candidate: Optional[Tuple[str, Dict[str, str]]] = None
+        douyin_candidates: List[Candidate] = []
+        cdn_candidates: List[Candidate] = []
 
         for candidate in url_candidates:
             parsed = urlparse(candidate)
@@ -262,14 +464,15 @@ class BaseDownloader(ABC):
             if parsed.netloc.endswith('douyin.com'):
                 if 'X-Bogus=' not in candidate:
                     signed_url, ua = self.api_client.sign_url(candidate)
-                    headers = self._download_headers(user_agent=ua)
-                    return signed_url, headers
-                return candidate, headers
+                    douyin_candidates.append((signed_url, self._download_headers(user_agent=ua)))
+                else:
+                    douyin_candidates.append((candidate, headers))
+            else:
+                cdn_candidates.append((candidate, headers))
 
-            fallback_candidate = (candidate, headers)
-
-        if fallback_candidate:
-            return fallback_candidate
+        candidates = douyin_candidates + cdn_candidates
+        if candidates:
+            return candidates
 
         uri = play_addr.get('uri') or video.get('vid') or video.get('download_addr', {}).get('uri')
         if uri:
@@ -282,28 +485,38 @@ class BaseDownloader(ABC):
                 'source': 'PackSourceEnum_PUBLISH',
             }
             signed_url, ua = self.api_client.build_signed_path('/aweme/v1/play/', params)
-            return signed_url, self._download_headers(user_agent=ua)
+            return [(signed_url, self._download_headers(user_agent=ua))]
 
-        return None
+        return []
 
-    def _collect_image_urls(self, aweme_data: Dict[str, Any]) -> List[str]:
-        image_urls: List[str] = []
+    def _mirror_candidates(self, urls: List[str]) -> List[Candidate]:
+        headers = self._download_headers()
+        return [(url, headers) for url in urls]
+
+    def _collect_images(self, aweme_data: Dict[str, Any]) -> List[Tuple[List[str], Optional[str]]]:
+        collected: List[Tuple[List[str], Optional[str]]] = []
         image_post = aweme_data.get('image_post_info', {})
         images = image_post.get('images') or aweme_data.get('images') or []
         for item in images:
             url_list = item.get('url_list') if isinstance(item, dict) else None
             if url_list:
-                image_urls.append(url_list[0])
-        return image_urls
+                collected.append((url_list, item.get('uri')))
+        return collected
 
     @staticmethod
-    def _extract_first_url(source: Any) -> Optional[str]:
+    def _extract_uri(source: Any) -> Optional[str]:
         if isinstance(source, dict):
-            url_list = source.get('url_list')
-            if isinstance(url_list, list) and url_list:
-                return url_list[0]
-        elif isinstance(source, list) and source:
-            return source[0]
-        elif isinstance(source, str):
-            return source
+            return source.get('uri') or None
         return None
+
+    @staticmethod
+    def _extract_urls(source: Any) -> List[str]:
+        if isinstance(source, dict):
+            url_list = source.get('url_list')
+            if isinstance(url_list, list):
+                return [url for url in url_list if url]
+        elif isinstance(source, list):
+            return [url for url in source if url]
+        elif isinstance(source, str) and source:
+            return [source]
+        return []
@@ -5,7 +5,7 @@ from core.user_downloader import UserDownloader
 from config import ConfigLoader
 from storage import Database, FileManager
 from auth import CookieManager
-from control import QueueManager, RateLimiter, RetryHandler
+from control import AwemeRegistry, CircuitBreakers, MirrorSelector, QueueManager, RateLimiter, RetryHandler
 from core.api_client import DouyinAPIClient
 from utils.logger import setup_logger
 
@@ -24,6 +24,9 @@ class DownloaderFactory:
         rate_limiter: Optional[RateLimiter] = None,
         retry_handler: Optional[RetryHandler] = None,
         queue_manager: Optional[QueueManager] = None,
+        mirror_selector: Optional[MirrorSelector] = None,
+        aweme_registry: Optional[AwemeRegistry] = None,
+        circuit_breakers: Optional[CircuitBreakers] = None,
     ) -> Optional[BaseDownloader]:
 
         common_args = {
@@ -35,6 +38,9 @@ class DownloaderFactory:
             'rate_limiter': rate_limiter,
             'retry_handler': retry_handler,
             'queue_manager': queue_manager,
+            'mirror_selector': mirror_selector,
+            'aweme_registry': aweme_registry,
+            'circuit_breakers': circuit_breakers,
         }
 
         if url_type == 'video':
@@ -1,10 +1,29 @@
-from typing import Any, Dict
+import asyncio
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional, Set, Tuple
 
+from core.api_client import CircuitOpenResponse
 from core.downloader_base import BaseDownloader, DownloadResult
 from utils.logger import setup_logger
 
 logger = setup_logger('UserDownloader')
 
+PAGE_SIZE = 20
+
+# Parallel listing only pays off once an account spans more than a handful of pages.
+PARALLEL_LISTING_MIN_POSTS = 200
+# Nothing on the platform predates its launch; the floor when no time bound is known.
+DOUYIN_EPOCH = 1472688000
+# How long a listing waits for the post endpoint's circuit to close before giving up on the window.
+CIRCUIT_MAX_WAIT = 120
+
+# (cursor to start listing at, oldest create_time that belongs to the window)
+Window = Tuple[int, Optional[int]]
+# (window index, posts, cursor of the window's next page, last page of the window)
+Page = Tuple[int, List[Dict[str, Any]], int, bool]
+
+_WINDOW_DONE = object()
+
 
 class UserDownloader(BaseDownloader):
     async def download(self, parsed_url: Dict[str, Any]) -> DownloadResult:
@@ -15,91 +34,375 @@ class UserDownloader(BaseDownloader):
             logger.error("No sec_uid found in parsed URL")
             return result
 
+        await self.rate_limiter.acquire('profile')
         user_info = await self.api_client.get_user_info(sec_uid)
         if not user_info:
             logger.error(f"Failed to get user info: {sec_uid}")
             return result
 
         modes = self.config.get('mode', ['post'])
-
+        jobs = []
         for mode in modes:
             if mode == 'post':
-                mode_result = await self._download_user_post(sec_uid, user_info)
-                result.total += mode_result.total
-                result.success += mode_result.success
-                result.failed += mode_result.failed
-                result.skipped += mode_result.skipped
+                jobs.append(self._download_user_post(sec_uid, user_info))
 
-        return result
+        # Modes share the downloader's rate limiter and download slots, so running them
+        # together overlaps one mode's listing with another's downloads.
+        for mode_result in await asyncio.gather(*jobs):
+            result.total += mode_result.total
+            result.success += mode_result.success
+            result.failed += mode_result.failed
+            result.skipped += mode_result.skipped
+            result.incomplete += mode_result.incomplete
 
-    async def _download_user_post(self, sec_uid: str, user_info: Dict[str, Any]) -> DownloadResult:
-        result = DownloadResult()
-        aweme_list = []
-        max_cursor = 0
-        has_more = True
+        return result
 
-        increase_enabled = self.config.get('increase', {}).get('post', False)
-        latest_time = None
+    def _parallel_listing(self, user_info: Dict[str, Any]) -> bool:
+        count = int(self.config.get('listing_windows', 1) or 1)
+        number_limit = self.config.get('number', {}).get('post', 0)
+        # A number limit wants the newest posts first, which only a sequential walk guarantees.
+        return (
+            count > 1
+            and number_limit <= 0
+            and (user_info.get('aweme_count') or 0) >= PARALLEL_LISTING_MIN_POSTS
+        )
 
-        if increase_enabled and self.database:
-            latest_time = await self.database.get_latest_aweme_time(user_info.get('uid'))
+    def _plan_windows(self, start_cursor: int, top: int, latest_time: Optional[int]) -> List[Window]:
+        count = int(self.config.get('listing_windows', 1) or 1)
+        start_ts, _ = self._time_bounds()
+        known_floor = max((t for t in (start_ts, latest_time) if t is not None), default=None)
+        floor = known_floor if known_floor is not None else DOUYIN_EPOCH
+        if count <= 1 or top <= floor:
+            return [(start_cursor, None)]
 
-        while has_more:
-            await self.rate_limiter.acquire()
+        # Window i lists [bounds[i + 1], bounds[i]); the newest one keeps the real start
+        # cursor so pinned posts and the end_time jump still come from it.
+        span = (top - floor) / count
+        bounds = [int(top - span * i) for i in range(count)] + [floor]
+        windows: List[Window] = [(start_cursor, bounds[1])]
+        for i in range(1, count):
+            lower = bounds[i + 1] if i < count - 1 else known_floor
+            windows.append((bounds[i] * 1000, lower))
+        return windows
 
+    async def _fetch_post_page(self, sec_uid: str, max_cursor: int) -> Dict[str, Any]:
+        # The post breaker is shared by every link in the run: an open circuit means the
+        # endpoint is shedding load, not that this listing ended. Wait for it to half-open
+        # and ask for the same cursor again.
+        waited = 0.0
+        while True:
+            await self.rate_limiter.acquire('post')
             data = await self.api_client.get_user_post(sec_uid, max_cursor)
-            if not data:
-                break
-
-            aweme_items = data.get('aweme_list', [])
-            if not aweme_items:
-                break
+            if not isinstance(data, CircuitOpenResponse) or waited >= CIRCUIT_MAX_WAIT:
+                return data
+            delay = min(max(data.retry_after, 0.1), CIRCUIT_MAX_WAIT - waited)
+            logger.info(f"Post listing of {sec_uid} waiting {delay:.0f}s for the circuit to close")
+            await asyncio.sleep(delay)
+            waited += delay
 
-            if increase_enabled and latest_time:
-                new_items = [a for a in aweme_items if a.get('create_time', 0) > latest_time]
-                aweme_list.extend(new_items)
-                if len(new_items) < len(aweme_items):
-                    break
+    async def _sequential_pages(
+        self,
+        sec_uid: str,
+        max_cursor: int,
+        end_cursor: Optional[int],
+        first_page: Optional[Dict[str, Any]] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        while True:
+            if first_page is not None:
+                data, first_page = first_page, None
             else:
-                aweme_list.extend(aweme_items)
+                data = await self._fetch_post_page(sec_uid, max_cursor)
+            if not data:
+                return
+            yield data
+            if not data.get('aweme_list') or not data.get('has_more', False):
+                return
 
-            has_more = data.get('has_more', False)
             max_cursor = data.get('max_cursor', 0)
+            if end_cursor is not None and max_cursor > end_cursor:
+                max_cursor = end_cursor
+
+    async def _walk_window(
+        self,
+        sec_uid: str,
+        index: int,
+        window: Window,
+        latest_time: Optional[int],
+        first_page: Optional[Dict[str, Any]] = None,
+        on_incomplete: Optional[Callable[[int], None]] = None,
+    ) -> AsyncIterator[Page]:
+        top_cursor, lower = window
+        yielded = 0
+
+        number_limit = self.config.get('number', {}).get('post', 0)
+
+        start_ts, end_ts = self._time_bounds()
+        # max_cursor is a millisecond timestamp: the first page past the pinned posts
+        # can start right at end_time instead of paging down to it.
+        end_cursor = (end_ts + 1) * 1000 if end_ts is not None else None
+
+        source = self._sequential_pages(sec_uid, top_cursor, end_cursor, first_page)
+        try:
+            async for data in source:
+                has_more = data.get('has_more', False)
+                aweme_items = data.get('aweme_list', [])
+                if not aweme_items:
+                    if not has_more:
+                        yield index, [], top_cursor, True
+                    return
+
+                kept: List[Dict[str, Any]] = []
+                reached_end = False
+                for aweme in aweme_items:
+                    create_time = aweme.get('create_time', 0)
+                    if self._is_pinned(aweme):
+                        # Pinned posts sit on top regardless of age, so they never end the walk.
+                        if not latest_time or create_time > latest_time:
+                            kept.append(aweme)
+                        continue
+                    if latest_time and create_time <= latest_time:
+                        reached_end = True
+                        continue
+                    if lower is not None and create_time < lower:
+                        # Belongs to the next window (or predates the crawl).
+                        reached_end = True
+                        continue
+                    # Newest first: one post older than the window means every later page is too.
+                    if start_ts is not None and create_time < start_ts:
+                        reached_end = True
+                    kept.append(aweme)
+
+                page = self._filter_by_time(kept)
+                if number_limit > 0:
+                    page = page[:number_limit - yielded]
+                yielded += len(page)
+                limit_reached = number_limit > 0 and yielded >= number_limit
 
-            number_limit = self.config.get('number', {}).get('post', 0)
-            if number_limit > 0 and len(aweme_list) >= number_limit:
-                aweme_list = aweme_list[:number_limit]
-                break
+                final = not has_more or reached_end or limit_reached
+                max_cursor = data.get('max_cursor', 0)
+                if end_cursor is not None and max_cursor > end_cursor:
+                    max_cursor = end_cursor
+                yield index, page, max_cursor, final
+                if final:
+                    return
+            # The pages ran out before a last page: a fetch failed or the circuit stayed open.
+            logger.warning(f"Listing window {index} of {sec_uid} stopped early")
+            if on_incomplete is not None:
+                on_incomplete(index)
+        finally:
+            await source.aclose()
 
-        aweme_list = self._filter_by_time(aweme_list)
-        aweme_list = self._limit_count(aweme_list, 'post')
+    async def _merge_windows(
+        self,
+        sec_uid: str,
+        windows: List[Window],
+        latest_time: Optional[int],
+        first_page: Optional[Dict[str, Any]],
+        on_incomplete: Optional[Callable[[int], None]] = None,
+    ) -> AsyncIterator[Page]:
+        # Pages are handed on as soon as any window lists them; per-window order is all
+        # the checkpoint needs, and nothing waits behind a slow window.
+        queue: asyncio.Queue = asyncio.Queue(maxsize=len(windows) * 2)
 
-        result.total = len(aweme_list)
+        async def _produce(index: int, window: Window):
+            try:
+                replay = first_page if index == 0 else None
+                async for page in self._walk_window(sec_uid, index, window, latest_time, replay, on_incomplete):
+                    await queue.put(page)
+            except Exception as e:
+                logger.error(f"Listing window {index} of {sec_uid} failed: {e}")
+                if on_incomplete is not None:
+                    on_incomplete(index)
+            finally:
+                await queue.put(_WINDOW_DONE)
 
+        tasks = [asyncio.ensure_future(_produce(i, window)) for i, window in enumerate(windows)]
+        remaining = len(tasks)
+        try:
+            while remaining:
+                page = await queue.get()
+                if page is _WINDOW_DONE:
+                    remaining -= 1
+                    continue
+                yield page
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _iter_user_post_pages(
+        self,
+        sec_uid: str,
+        start_cursor: int = 0,
+        latest_time: Optional[int] = None,
+        parallel: bool = False,
+        on_plan: Optional[Callable[[List[Window]], None]] = None,
+        on_incomplete: Optional[Callable[[int], None]] = None,
+        plan: Optional[List[Window]] = None,
+    ) -> AsyncIterator[Page]:
+        windows: List[Window] = [(start_cursor, None)]
+        first_page = None
+        if plan:
+            # Resuming an interrupted parallel crawl: its unfinished windows, each from its own cursor.
+            windows = plan
+        elif parallel:
+            top_cursor = start_cursor
+            if not top_cursor:
+                # The first page is needed anyway (pinned posts live there); its cursor is
+                # where the rest of the history really starts, so no window is spent on
+                # the empty stretch between the newest post and now.
+                first_page = await self._fetch_post_page(sec_uid, 0)
+                if first_page and first_page.get('aweme_list') and first_page.get('has_more', False):
+                    top_cursor = first_page.get('max_cursor', 0)
+            _, end_ts = self._time_bounds()
+            if end_ts is not None:
+                top_cursor = min(top_cursor, (end_ts + 1) * 1000) if top_cursor else (end_ts + 1) * 1000
+            if top_cursor:
+                windows = self._plan_windows(start_cursor, top_cursor // 1000, latest_time)
+        if on_plan is not None:
+            on_plan(windows)
+
+        if len(windows) > 1:
+            source = self._merge_windows(sec_uid, windows, latest_time, first_page, on_incomplete)
+        else:
+            source = self._walk_window(sec_uid, 0, windows[0], latest_time, first_page, on_incomplete)
+
+        # A pinned post shows up again at its real position, and window edges may overlap.
+        seen: Set[str] = set()
+        try:
+            async for index, page, next_cursor, final in source:
+                page = [aweme for aweme in page if aweme.get('aweme_id') not in seen]
+                seen.update(aweme.get('aweme_id') for aweme in page)
+                yield index, page, next_cursor, final
+        finally:
+            await source.aclose()
+
+    async def _load_checkpoint(self, sec_uid: str, mode: str) -> Optional[Dict[str, Any]]:
+        if not self.database:
+            return None
+        if self.config.get('full_refresh'):
+            await self.database.clear_checkpoint(sec_uid, mode)
+            return None
+        checkpoint = await self.database.get_checkpoint(sec_uid, mode)
+        # A checkpoint without has_more marks a crawl that reached the end: start over from the top.
+        if checkpoint and checkpoint['has_more'] and checkpoint['max_cursor']:
+            return checkpoint
+        return None
+
+    async def _download_user_post(self, sec_uid: str, user_info: Dict[str, Any]) -> DownloadResult:
+        result = DownloadResult()
         author_name = user_info.get('nickname', 'unknown')
+        author_id = user_info.get('uid')
+
+        latest_time = None
+        checkpoint = await self._load_checkpoint(sec_uid, 'post')
+        if checkpoint:
+            # Keep the increment floor of the interrupted crawl; the posts it already
+            # downloaded would otherwise end the resumed walk on its first page.
+            latest_time = checkpoint['latest_time']
+            logger.info(f"Resuming posts of {author_name} from checkpoint cursor {checkpoint['max_cursor']}")
+        elif self.config.get('increase', {}).get('post', False) and self.database:
+            latest_time = await self.database.get_latest_aweme_time(author_id)
+
+        start_cursor = checkpoint['max_cursor'] if checkpoint else 0
+        saved_plan = None
+        if checkpoint and checkpoint.get('windows'):
+            saved_plan = [(cursor, lower) for cursor, lower, finished in checkpoint['windows'] if not finished]
 
-        async def _process_aweme(item: Dict[str, Any]):
-            aweme_id = item.get('aweme_id')
-            if not await self._should_download(aweme_id):
-                return {'status': 'skipped', 'aweme_id': aweme_id}
+        # Per window: the cursor to resume it from, its lower bound, and its pages in listing
+        # order as [posts still in flight, next cursor, last page, any failed, window index].
+        resume_cursors: List[int] = [start_cursor]
+        lowers: List[Optional[int]] = [None]
+        pending: List[Deque[List[Any]]] = [deque()]
+        done = [False]
+        stalled = [False]
+        state = {'saved': (start_cursor, None)}
 
-            success = await self._download_aweme_assets(item, author_name, mode='post')
+        def _on_plan(windows: List[Window]):
+            if len(windows) > 1:
+                logger.info(f"Listing posts of {author_name} in {len(windows)} parallel time windows")
+            resume_cursors[:] = [window[0] for window in windows]
+            lowers[:] = [window[1] for window in windows]
+            pending[:] = [deque() for _ in windows]
+            done[:] = [False] * len(windows)
+            stalled[:] = [False] * len(windows)
+
+        def _on_incomplete(index: int):
+            # The window never reached its last page, so done[index] stays False and the
+            # checkpoint keeps pointing into it; the run reports the gap instead of a clean finish.
+            result.incomplete += 1
+
+        async def _advance_checkpoint(index: int):
+            # Only pages whose posts all finished move a window forward, so a crash never skips in-flight work.
+            pages = pending[index]
+            while pages and not stalled[index] and pages[0][0] == 0:
+                page_state = pages.popleft()
+                if page_state[3]:
+                    # Keep the checkpoint in front of failed posts so the next run retries them.
+                    stalled[index] = True
+                    break
+                resume_cursors[index] = page_state[1]
+                done[index] = page_state[2]
+
+            # A parallel crawl saves its whole plan so a resume lists only the unfinished windows,
+            # each from its own cursor. max_cursor alone (the newest unfinished window) is what a
+            # sequential crawl resumes from.
+            cursor = next((resume_cursors[i] for i in range(len(done)) if not done[i]), None)
+            windowed = len(done) > 1 or saved_plan
+            plan = [[resume_cursors[i], lowers[i], done[i]] for i in range(len(done))] if windowed else None
+            if self.database and cursor and (cursor, plan) != state['saved']:
+                state['saved'] = (cursor, plan)
+                await self.database.save_checkpoint(sec_uid, 'post', cursor, True, latest_time, plan)
+
+        async def _scheduled() -> AsyncIterator[Tuple[List[Any], Dict[str, Any]]]:
+            async for index, page, next_cursor, final in self._iter_user_post_pages(
+                sec_uid,
+                start_cursor,
+                latest_time,
+                self._parallel_listing(user_info),
+                _on_plan,
+                _on_incomplete,
+                saved_plan,
+            ):
+                result.total += len(page)
+                # One lookup per page; known posts never take a worker slot.
+                fresh = await self._prune_downloaded(page, author_id)
+                result.skipped += len(page) - len(fresh)
+                page_state = [len(fresh), next_cursor, final, False, index]
+                pending[index].append(page_state)
+                await _advance_checkpoint(index)
+                for aweme in fresh:
+                    yield page_state, aweme
+
+        async def _process_aweme(item: Tuple[List[Any], Dict[str, Any]]):
+            page_state, aweme = item
+            success = await self._download_aweme_assets(aweme, author_name, mode='post')
             return {
                 'status': 'success' if success else 'failed',
-                'aweme_id': aweme_id,
+                'aweme_id': aweme.get('aweme_id'),
+                'page': page_state,
             }
 
-        download_results = await self.queue_manager.download_batch(_process_aweme, aweme_list)
-
-        for entry in download_results:
-            status = entry.get('status') if isinstance(entry, dict) else None
+        async def _tally(entry: Dict[str, Any]):
+            status = entry.get('status')
             if status == 'success':
                 result.success += 1
-            elif status == 'failed':
-                result.failed += 1
-            elif status == 'skipped':
-                result.skipped += 1
             else:
                 result.failed += 1
 
+            page_state = entry['page'] if 'page' in entry else entry['item'][0]
+            page_state[0] -= 1
+            page_state[3] = page_state[3] or status != 'success'
+            await _advance_checkpoint(page_state[4])
+
+        # Room for a full page beyond the workers' backlog, so the next page is fetched while this one downloads.
+        await self.queue_manager.run_stream(
+            _process_aweme,
+            _scheduled(),
+            on_result=_tally,
+            queue_size=PAGE_SIZE + self.queue_manager.max_workers,
+        )
+
+        if self.database and all(done):
+            # Walked to the end cleanly: the next run starts from the newest post again.
+            await self.database.clear_checkpoint(sec_uid, 'post')
         return result
@@ -1,4 +1,4 @@
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 from core.downloader_base import BaseDownloader, DownloadResult
 from utils.logger import setup_logger
@@ -17,28 +17,44 @@ class VideoDownloader(BaseDownloader):
 
         result.total = 1
 
-        if not await self._should_download(aweme_id):
-            logger.info(f"Video {aweme_id} already downloaded, skipping")
-            result.skipped += 1
-            return result
-
-        await self.rate_limiter.acquire()
-
-        aweme_data = await self.api_client.get_video_detail(aweme_id)
-        if not aweme_data:
-            logger.error(f"Failed to get video detail: {aweme_id}")
-            result.failed += 1
-            return result
+        # Same download slots as every other link in the run. The slot is taken before the
+        # claim so whoever owns an aweme always holds one and cannot be starved by waiters.
+        async with self.queue_manager.semaphore:
+            success = await self._download_claimed(aweme_id, result)
 
-        success = await self._download_aweme(aweme_data)
-        if success:
-            result.success += 1
-        else:
-            result.failed += 1
+        if success is not None:
+            if success:
+                result.success += 1
+            else:
+                result.failed += 1
 
         return result
 
-    async def _download_aweme(self, aweme_data: Dict[str, Any]) -> bool:
-        author = aweme_data.get('author', {})
-        author_name = author.get('nickname', 'unknown')
-        return await self._download_aweme_assets(aweme_data, author_name)
+    async def _download_claimed(self, aweme_id: str, result: DownloadResult) -> Optional[bool]:
+        # None means skipped (already counted); claimed before the detail call so a duplicate
+        # link costs no API request either.
+        outputs = await self._claim_aweme(aweme_id)
+        if outputs is not None:
+            return await self._reuse_aweme_outputs(outputs, outputs.author_name, None)
+
+        try:
+            if not await self._should_download(aweme_id):
+                logger.info(f"Video {aweme_id} already downloaded, skipping")
+                result.skipped += 1
+                return None
+
+            await self.rate_limiter.acquire('detail')
+
+            aweme_data = await self.api_client.get_video_detail(aweme_id)
+            if not aweme_data:
+                logger.error(f"Failed to get video detail: {aweme_id}")
+                return False
+
+            outputs = await self._fetch_aweme_outputs(aweme_data, self._author_name(aweme_data))
+            return outputs is not None
+        finally:
+            self.aweme_registry.finish(aweme_id, outputs)
+
+    @staticmethod
+    def _author_name(aweme_data: Dict[str, Any]) -> str:
+        return aweme_data.get('author', {}).get('nickname', 'unknown')
@@ -1,5 +1,7 @@
 from .database import Database
 from .file_manager import FileManager
+from .media_store import MediaStore
 from .metadata_handler import MetadataHandler
+from .write_sink import WriteSink
 
-__all__ = ['Database', 'FileManager', 'MetadataHandler']
+__all__ = ['Database', 'FileManager', 'MediaStore', 'MetadataHandler', 'WriteSink']
@@ -1,115 +1,448 @@
+import asyncio
+import json
+import zlib
 import aiosqlite
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
 from datetime import datetime
 
+from storage.aweme_index import AwemeIndex
+from utils.helpers import format_size
+from utils.logger import setup_logger
+
+logger = setup_logger('Database')
+
+INSERT_AWEME_SQL = '''
+    INSERT OR REPLACE INTO aweme
+    (aweme_id, aweme_type, title, author_id, author_name, create_time, download_time, file_path, metadata)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+INSERT_HISTORY_SQL = '''
+    INSERT INTO download_history
+    (url, url_type, download_time, total_count, success_count, config)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+
+INSERT_METADATA_SQL = '''
+    INSERT OR REPLACE INTO aweme_metadata (aweme_id, codec, data) VALUES (?, ?, ?)
+'''
+
+METADATA_CODEC = 'zlib'
+METADATA_LEVEL = 6
+
+# Stays well under SQLite's bound-parameter limit (999 on older builds).
+IN_CLAUSE_CHUNK = 500
+
+
+def _compress(metadata: str) -> bytes:
+    return zlib.compress(metadata.encode('utf-8'), METADATA_LEVEL)
+
+
+def _decompress(codec: str, data: bytes) -> str:
+    if codec != METADATA_CODEC:
+        raise ValueError(f"Unsupported metadata codec: {codec}")
+    return zlib.decompress(data).decode('utf-8')
+
 
 class Database:
-    def __init__(self, db_path: str = 'dy_downloader.db'):
+    def __init__(
+        self,
+        db_path: str = 'dy_downloader.db',
+        batch_size: int = 200,
+        flush_interval: float = 0.0,
+        id_index: str = 'off',
+    ):
         self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # 'off': always ask SQLite; 'lazy': load each author's ids on first use; 'full': load all at startup.
+        self.id_index = id_index if id_index in ('lazy', 'full') else 'off'
+        self._index: Optional[AwemeIndex] = AwemeIndex() if self.id_index != 'off' else None
+        self._index_complete = False
+        self._indexed_authors: Set[str] = set()
         self._initialized = False
+        self._write_db: Optional[aiosqlite.Connection] = None
+        self._read_db: Optional[aiosqlite.Connection] = None
+        self._write_queue: Optional[asyncio.Queue] = None
+        self._writer_task: Optional[asyncio.Task] = None
+        self._init_lock = asyncio.Lock()
 
     async def initialize(self):
-        if self._initialized:
+        async with self._init_lock:
+            if self._initialized:
+                return
+
+            self._write_db = await aiosqlite.connect(self.db_path)
+            await self._write_db.execute('PRAGMA journal_mode=WAL')
+            await self._write_db.execute('PRAGMA synchronous=NORMAL')
+            await self._create_schema(self._write_db)
+
+            self._read_db = await aiosqlite.connect(self.db_path)
+            self._write_queue = asyncio.Queue()
+            self._writer_task = asyncio.ensure_future(self._writer_loop())
+            self._initialized = True
+
+            if self.id_index == 'full':
+                await self._load_index()
+
+    @staticmethod
+    async def _create_schema(db: aiosqlite.Connection):
+        await db.execute('''
+            CREATE TABLE IF NOT EXISTS aweme (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                aweme_id TEXT UNIQUE NOT NULL,
+                aweme_type TEXT NOT NULL,
+                title TEXT,
+                author_id TEXT,
+                author_name TEXT,
+                create_time INTEGER,
+                download_time INTEGER,
+                file_path TEXT,
+                metadata TEXT
+            )
+        ''')
+
+        await db.execute('''
+            CREATE TABLE IF NOT EXISTS download_history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                url TEXT NOT NULL,
+                url_type TEXT NOT NULL,
+                download_time INTEGER,
+                total_count INTEGER,
+                success_count INTEGER,
+                config TEXT
+            )
+        ''')
+
+        # Raw aweme JSON is 10-30 KB; keeping it compressed and out of the aweme table
+        # keeps the hot rows small enough to stay in the page cache.
+        await db.execute('''
+            CREATE TABLE IF NOT EXISTS aweme_metadata (
+                aweme_id TEXT PRIMARY KEY,
+                codec TEXT NOT NULL,
+                data BLOB NOT NULL
+            )
+        ''')
+
+        await db.execute('''
+            CREATE TABLE IF NOT EXISTS crawl_checkpoint (
+                sec_uid TEXT NOT NULL,
+                mode TEXT NOT NULL,
+                max_cursor INTEGER NOT NULL,
+                has_more INTEGER NOT NULL,
+                latest_time INTEGER,
+                updated_at INTEGER,
+                windows TEXT,
+                PRIMARY KEY (sec_uid, mode)
+            )
+        ''')
+        # Checkpoints written before parallel listing have no window plan.
+        cursor = await db.execute('PRAGMA table_info(crawl_checkpoint)')
+        columns = {row[1] for row in await cursor.fetchall()}
+        await cursor.close()
+        if 'windows' not in columns:
+            await db.execute('ALTER TABLE crawl_checkpoint ADD COLUMN windows TEXT')
+
+        await db.execute('CREATE INDEX IF NOT EXISTS idx_aweme_id ON aweme(aweme_id)')
+        await db.execute('CREATE INDEX IF NOT EXISTS idx_author_id ON aweme(author_id)')
+        await db.execute('CREATE INDEX IF NOT EXISTS idx_download_time ON aweme(download_time)')
+
+        await db.commit()
+
+    async def _ensure_initialized(self):
+        if not self._initialized:
+            await self.initialize()
+
+    async def _write(self, sql: str, params: Tuple[Any, ...]):
+        await self._write_all([(sql, params)])
+
+    async def _write_all(self, statements: List[Tuple[str, Tuple[Any, ...]]]):
+        await self._ensure_initialized()
+        if self._writer_task.done():
+            raise RuntimeError('Database writer is not running')
+        future = asyncio.get_running_loop().create_future()
+        # One queue entry per call, so its statements commit or fail together.
+        self._write_queue.put_nowait((statements, future))
+        # Resolves once the batch holding these rows is committed.
+        await future
+
+    async def _writer_loop(self):
+        try:
+            await self._write_batches()
+        finally:
+            # Whatever is still queued when the writer stops would otherwise wait forever.
+            while not self._write_queue.empty():
+                entry = self._write_queue.get_nowait()
+                if entry is not None and not entry[1].done():
+                    entry[1].set_exception(RuntimeError('Database writer stopped'))
+
+    async def _write_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            first = await self._write_queue.get()
+            if first is None:
+                return
+
+            batch = [first]
+            deadline = loop.time() + self.flush_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                # Whatever queued up during the previous commit goes out together;
+                # only linger for stragglers if a flush interval is configured.
+                if not self._write_queue.empty():
+                    entry = self._write_queue.get_nowait()
+                else:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        entry = await asyncio.wait_for(self._write_queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if entry is None:
+                    stop = True
+                    break
+                batch.append(entry)
+
+            try:
+                await self._commit_batch(batch)
+            except Exception as e:
+                # rollback() or the per-call retry failed too, e.g. a broken connection: fail
+                # this batch's callers but keep the writer alive for the next one.
+                logger.error(f"Database batch failed: {e}")
+                for _statements, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            if stop:
+                return
+
+    async def _commit_batch(self, batch: List[Tuple[List[Tuple[str, Tuple[Any, ...]]], asyncio.Future]]):
+        # Statements run in queue order; only consecutive runs of the same SQL share an
+        # executemany, so a later DELETE can never be applied before an earlier INSERT.
+        runs: List[Tuple[str, List[Tuple[Any, ...]]]] = []
+        for statements, _future in batch:
+            for sql, params in statements:
+                if runs and runs[-1][0] == sql:
+                    runs[-1][1].append(params)
+                else:
+                    runs.append((sql, [params]))
+
+        try:
+            for sql, rows in runs:
+                await self._write_db.executemany(sql, rows)
+            await self._write_db.commit()
+        except Exception as e:
+            await self._write_db.rollback()
+            if len(batch) > 1:
+                # Isolate the bad call so it doesn't fail everyone else's writes.
+                for entry in batch:
+                    await self._commit_batch([entry])
+                return
+            logger.error(f"Database write failed: {e}")
+            batch[0][1].set_exception(e)
             return
 
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS aweme (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    aweme_id TEXT UNIQUE NOT NULL,
-                    aweme_type TEXT NOT NULL,
-                    title TEXT,
-                    author_id TEXT,
-                    author_name TEXT,
-                    create_time INTEGER,
-                    download_time INTEGER,
-                    file_path TEXT,
-                    metadata TEXT
-                )
-            ''')
-
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS download_history (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    url TEXT NOT NULL,
-                    url_type TEXT NOT NULL,
-                    download_time INTEGER,
-                    total_count INTEGER,
-                    success_count INTEGER,
-                    config TEXT
-                )
-            ''')
-
-            await db.execute('CREATE INDEX IF NOT EXISTS idx_aweme_id ON aweme(aweme_id)')
-            await db.execute('CREATE INDEX IF NOT EXISTS idx_author_id ON aweme(author_id)')
-            await db.execute('CREATE INDEX IF NOT EXISTS idx_download_time ON aweme(download_time)')
-
-            await db.commit()
-
-        self._initialized = True
+        for _statements, future in batch:
+            if not future.done():
+                future.set_result(None)
+
+    async def _fetchone(self, sql: str, params: Tuple[Any, ...]):
+        await self._ensure_initialized()
+        cursor = await self._read_db.execute(sql, params)
+        try:
+            return await cursor.fetchone()
+        finally:
+            await cursor.close()
+
+    async def _fetchall(self, sql: str, params: Tuple[Any, ...]):
+        await self._ensure_initialized()
+        cursor = await self._read_db.execute(sql, params)
+        try:
+            return await cursor.fetchall()
+        finally:
+            await cursor.close()
+
+    async def _load_index(self, author_id: Optional[str] = None):
+        if author_id is None:
+            rows = await self._fetchall('SELECT aweme_id FROM aweme', ())
+        else:
+            rows = await self._fetchall('SELECT aweme_id FROM aweme WHERE author_id = ?', (author_id,))
+        self._index.update(row[0] for row in rows)
+
+        if author_id is None:
+            self._index_complete = True
+            memory = self._index.memory_bytes()
+            per_million = memory * 1_000_000 // max(len(self._index), 1)
+            logger.info(
+                f"Indexed {len(self._index)} downloaded id(s) in memory: "
+                f"{format_size(memory)} (~{format_size(per_million)} per million)"
+            )
+        else:
+            self._indexed_authors.add(author_id)
+
+    def _index_covers(self, author_id: Optional[str]) -> bool:
+        return self._index_complete or (author_id is not None and author_id in self._indexed_authors)
 
     async def is_downloaded(self, aweme_id: str) -> bool:
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute(
-                'SELECT id FROM aweme WHERE aweme_id = ?',
-                (aweme_id,)
+        if self._index is not None:
+            await self._ensure_initialized()
+            if aweme_id in self._index:
+                return True
+            if self._index_complete:
+                return False
+        result = await self._fetchone('SELECT id FROM aweme WHERE aweme_id = ?', (aweme_id,))
+        return result is not None
+
+    async def filter_downloaded(self, aweme_ids: Iterable[str], author_id: Optional[str] = None) -> Set[str]:
+        ids = list(dict.fromkeys(aweme_id for aweme_id in aweme_ids if aweme_id))
+        downloaded: Set[str] = set()
+
+        if self._index is not None:
+            await self._ensure_initialized()
+            if self.id_index == 'lazy' and author_id and not self._index_covers(author_id):
+                await self._load_index(author_id)
+            downloaded = {aweme_id for aweme_id in ids if aweme_id in self._index}
+            if self._index_covers(author_id):
+                return downloaded
+            # Misses may belong to an author that hasn't been loaded: confirm with SQLite.
+            ids = [aweme_id for aweme_id in ids if aweme_id not in downloaded]
+
+        for start in range(0, len(ids), IN_CLAUSE_CHUNK):
+            chunk = ids[start:start + IN_CLAUSE_CHUNK]
+            placeholders = ','.join('?' * len(chunk))
+            rows = await self._fetchall(
+                f'SELECT aweme_id FROM aweme WHERE aweme_id IN ({placeholders})',
+                tuple(chunk),
             )
-            result = await cursor.fetchone()
-            return result is not None
+            downloaded.update(row[0] for row in rows)
+        return downloaded
 
     async def add_aweme(self, aweme_data: Dict[str, Any]):
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute('''
-                INSERT OR REPLACE INTO aweme
-                (aweme_id, aweme_type, title, author_id, author_name, create_time, download_time, file_path, metadata)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                aweme_data.get('aweme_id'),
-                aweme_data.get('aweme_type'),
-                aweme_data.get('title'),
-                aweme_data.get('author_id'),
-                aweme_data.get('author_name'),
-                aweme_data.get('create_time'),
-                int(datetime.now().timestamp()),
-                aweme_data.get('file_path'),
-                aweme_data.get('metadata'),
-            ))
-            await db.commit()
+        aweme_id = aweme_data.get('aweme_id')
+        statements = [(INSERT_AWEME_SQL, (
+            aweme_id,
+            aweme_data.get('aweme_type'),
+            aweme_data.get('title'),
+            aweme_data.get('author_id'),
+            aweme_data.get('author_name'),
+            aweme_data.get('create_time'),
+            int(datetime.now().timestamp()),
+            aweme_data.get('file_path'),
+            None,
+        ))]
+        metadata = aweme_data.get('metadata')
+        if metadata:
+            statements.append((INSERT_METADATA_SQL, (aweme_id, METADATA_CODEC, _compress(metadata))))
+        await self._write_all(statements)
+        # Only once committed: a failed write must not mark the post downloaded for the run.
+        if self._index is not None:
+            self._index.add(aweme_id)
 
-    async def get_latest_aweme_time(self, author_id: str) -> Optional[int]:
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute(
-                'SELECT MAX(create_time) FROM aweme WHERE author_id = ?',
-                (author_id,)
+    async def get_metadata(self, aweme_id: str) -> Optional[str]:
+        result = await self._fetchone('SELECT codec, data FROM aweme_metadata WHERE aweme_id = ?', (aweme_id,))
+        if result:
+            return _decompress(result[0], result[1])
+        result = await self._fetchone('SELECT metadata FROM aweme WHERE aweme_id = ?', (aweme_id,))
+        return result[0] if result else None
+
+    async def migrate_metadata(self, chunk_size: int = 500) -> Dict[str, int]:
+        # Moves legacy inline metadata into aweme_metadata. Every step is idempotent,
+        # so an interrupted migration just picks up where it stopped.
+        stats = {'rows': 0, 'raw_bytes': 0, 'stored_bytes': 0}
+        while True:
+            rows = await self._fetchall(
+                'SELECT aweme_id, metadata FROM aweme WHERE metadata IS NOT NULL LIMIT ?',
+                (chunk_size,),
             )
-            result = await cursor.fetchone()
-            return result[0] if result and result[0] else None
+            if not rows:
+                return stats
+
+            inserts: List[Tuple[str, Tuple[Any, ...]]] = []
+            clears: List[Tuple[str, Tuple[Any, ...]]] = []
+            for aweme_id, metadata in rows:
+                data = _compress(metadata)
+                # Never clobber metadata written by a newer run.
+                inserts.append((
+                    'INSERT OR IGNORE INTO aweme_metadata (aweme_id, codec, data) VALUES (?, ?, ?)',
+                    (aweme_id, METADATA_CODEC, data),
+                ))
+                clears.append(('UPDATE aweme SET metadata = NULL WHERE aweme_id = ?', (aweme_id,)))
+                stats['rows'] += 1
+                stats['raw_bytes'] += len(metadata.encode('utf-8'))
+                stats['stored_bytes'] += len(data)
+            # All copies before all clears: two executemany runs, and no row is cleared before it is copied.
+            await self._write_all(inserts + clears)
+
+    async def vacuum(self):
+        await self._ensure_initialized()
+        await self._write_db.execute('VACUUM')
+
+    async def get_latest_aweme_time(self, author_id: str) -> Optional[int]:
+        result = await self._fetchone('SELECT MAX(create_time) FROM aweme WHERE author_id = ?', (author_id,))
+        return result[0] if result and result[0] else None
 
     async def add_history(self, history_data: Dict[str, Any]):
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute('''
-                INSERT INTO download_history
-                (url, url_type, download_time, total_count, success_count, config)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (
-                history_data.get('url'),
-                history_data.get('url_type'),
-                int(datetime.now().timestamp()),
-                history_data.get('total_count'),
-                history_data.get('success_count'),
-                history_data.get('config'),
-            ))
-            await db.commit()
+        await self._write(INSERT_HISTORY_SQL, (
+            history_data.get('url'),
+            history_data.get('url_type'),
+            int(datetime.now().timestamp()),
+            history_data.get('total_count'),
+            history_data.get('success_count'),
+            history_data.get('config'),
+        ))
+
+    async def get_checkpoint(self, sec_uid: str, mode: str) -> Optional[Dict[str, Any]]:
+        result = await self._fetchone(
+            'SELECT max_cursor, has_more, latest_time, windows FROM crawl_checkpoint WHERE sec_uid = ? AND mode = ?',
+            (sec_uid, mode),
+        )
+        if not result:
+            return None
+        return {
+            'max_cursor': result[0],
+            'has_more': bool(result[1]),
+            'latest_time': result[2],
+            'windows': json.loads(result[3]) if result[3] else None,
+        }
+
+    async def save_checkpoint(
+        self,
+        sec_uid: str,
+        mode: str,
+        max_cursor: int,
+        has_more: bool,
+        latest_time: Optional[int] = None,
+        windows: Optional[List[List[Any]]] = None,
+    ):
+        # windows: the parallel listing plan as [resume cursor, lower bound, done] per window.
+        await self._write('''
+            INSERT OR REPLACE INTO crawl_checkpoint
+            (sec_uid, mode, max_cursor, has_more, latest_time, updated_at, windows)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            sec_uid,
+            mode,
+            max_cursor,
+            int(has_more),
+            latest_time,
+            int(datetime.now().timestamp()),
+            json.dumps(windows) if windows else None,
+        ))
+
+    async def clear_checkpoint(self, sec_uid: str, mode: str):
+        await self._write('DELETE FROM crawl_checkpoint WHERE sec_uid = ? AND mode = ?', (sec_uid, mode))
 
     async def get_aweme_count_by_author(self, author_id: str) -> int:
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute(
-                'SELECT COUNT(*) FROM aweme WHERE author_id = ?',
-                (author_id,)
-            )
-            result = await cursor.fetchone()
-            return result[0] if result else 0
+        result = await self._fetchone('SELECT COUNT(*) FROM aweme WHERE author_id = ?', (author_id,))
+        return result[0] if result else 0
 
     async def close(self):
-        pass
+        if not self._initialized:
+            return
+
+        await self._write_queue.put(None)
+        await self._writer_task
+        await self._read_db.close()
+        await self._write_db.close()
+        self._initialized = False
@@ -1,17 +1,31 @@
+import asyncio
+import json
+import os
 import aiofiles
 import aiohttp
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Any, Dict, List, Optional, Tuple
+from storage.media_store import MediaStore
+from storage.write_sink import WriteSink, default_write_sink
 from utils.validators import sanitize_filename
 from utils.logger import setup_logger
 
 logger = setup_logger('FileManager')
 
+SEGMENT_MIN_SIZE = 1024 * 1024
+# A read that sees no bytes for this long is a stalled edge: fail so the caller moves to another mirror.
+STALL_TIMEOUT = 30
+
 
 class FileManager:
-    def __init__(self, base_path: str = './Downloaded'):
+    def __init__(self, base_path: str = './Downloaded', write_sink: Optional[WriteSink] = None):
         self.base_path = Path(base_path)
         self.base_path.mkdir(parents=True, exist_ok=True)
+        self.write_sink = write_sink or default_write_sink()
+        self.media_store = MediaStore(self.base_path / '.store')
+        self.skipped_files = 0
+        self.skipped_bytes = 0
+        self.head_checks = 0
 
     def get_save_path(self, author_name: str, mode: str = None, aweme_title: str = None,
                      aweme_id: str = None, folderstyle: bool = True) -> Path:
@@ -35,6 +49,9 @@ class FileManager:
         save_path: Path,
         session: aiohttp.ClientSession = None,
         headers: Optional[Dict[str, str]] = None,
+        segments: int = 1,
+        queue_manager=None,
+        failures: Optional[List[BaseException]] = None,
     ) -> bool:
         should_close = False
         if session is None:
@@ -48,26 +65,320 @@ class FileManager:
             should_close = True
 
         try:
-            async with session.get(
-                url,
-                timeout=aiohttp.ClientTimeout(total=300),
-                headers=headers,
-            ) as response:
-                if response.status == 200:
-                    async with aiofiles.open(save_path, 'wb') as f:
-                        async for chunk in response.content.iter_chunked(8192):
-                            await f.write(chunk)
-                    return True
-                else:
-                    logger.error(f"Download failed: {url}, status: {response.status}")
-                    return False
+            if segments > 1:
+                return await self._download_segmented(url, save_path, session, headers, segments, queue_manager)
+            return await self._download_stream(url, save_path, session, headers)
         except Exception as e:
             logger.error(f"Download error: {url}, error: {e}")
+            # The caller's retry policy tells a 404 from a reset connection by the exception.
+            if failures is not None:
+                failures.append(e)
             return False
         finally:
             if should_close:
                 await session.close()
 
+    async def _download_stream(
+        self,
+        url: str,
+        save_path: Path,
+        session: aiohttp.ClientSession,
+        headers: Optional[Dict[str, str]],
+    ) -> bool:
+        part_path = self.part_path(save_path)
+        state = self._load_part_state(save_path)
+        validator = self._resume_validator(state) if state.get('segments') is None else None
+
+        offset = part_path.stat().st_size if validator and part_path.exists() else 0
+        total_size = state.get('total_size')
+        if offset and total_size and offset >= total_size:
+            return self._finalize_part(save_path, total_size)
+
+        request_headers = dict(headers or {})
+        if offset:
+            request_headers['Range'] = f'bytes={offset}-'
+            request_headers['If-Range'] = validator
+
+        async with session.get(
+            url,
+            timeout=aiohttp.ClientTimeout(total=300, sock_read=STALL_TIMEOUT),
+            headers=request_headers,
+        ) as response:
+            restart = response.status == 416 and offset > 0
+            if restart:
+                # The part no longer fits the resource. Start over within this attempt: a 416
+                # raised to the caller would be classified as permanent and never retried.
+                logger.info(f"Range not satisfiable for {save_path.name}, restarting from byte 0")
+                self.discard_part(save_path)
+            elif response.status == 206 and offset and self._parse_range_start(response) == offset:
+                total_size = self._parse_total_size(response.headers.get('Content-Range'))
+                logger.info(f"Resuming {save_path.name} from byte {offset}")
+            elif response.status == 200:
+                offset = 0
+                total_size = response.content_length
+            else:
+                raise self._status_error(response)
+
+            if not restart:
+                self._save_part_state(save_path, self._new_part_state(url, response, total_size))
+                await self._write_response(response, part_path, append=offset > 0)
+
+        if restart:
+            # No part left, so this request carries no Range and cannot 416 again.
+            return await self._download_stream(url, save_path, session, headers)
+        return self._finalize_part(save_path, total_size)
+
+    async def _download_segmented(
+        self,
+        url: str,
+        save_path: Path,
+        session: aiohttp.ClientSession,
+        headers: Optional[Dict[str, str]],
+        segments: int,
+        queue_manager=None,
+    ) -> bool:
+        part_path = self.part_path(save_path)
+        state = self._load_part_state(save_path)
+        validator = self._resume_validator(state) if state.get('segments') and part_path.exists() else None
+
+        probe_headers = {**(headers or {}), 'Range': 'bytes=0-0'}
+        if validator:
+            probe_headers['If-Range'] = validator
+
+        async with session.get(
+            url,
+            timeout=aiohttp.ClientTimeout(total=300, sock_read=STALL_TIMEOUT),
+            headers=probe_headers,
+        ) as response:
+            if response.status == 200:
+                # Range ignored (or the resource changed): the probe already carries the whole body.
+                self._save_part_state(save_path, self._new_part_state(url, response, response.content_length))
+                await self._write_response(response, part_path)
+                return self._finalize_part(save_path, response.content_length)
+            if response.status != 206:
+                raise self._status_error(response)
+            total_size = self._parse_total_size(response.headers.get('Content-Range'))
+            new_state = self._new_part_state(url, response, total_size)
+
+        if not total_size:
+            return await self._download_stream(url, save_path, session, headers)
+
+        if validator and state.get('total_size') == total_size:
+            new_state['segments'] = state['segments']
+            logger.info(f"Resuming {save_path.name} with {sum(1 for s in state['segments'] if s[2])} segment(s) done")
+        else:
+            ranges = self._split_ranges(total_size, segments)
+            if len(ranges) == 1:
+                return await self._download_stream(url, save_path, session, headers)
+            async with aiofiles.open(part_path, 'wb') as f:
+                await f.truncate(total_size)
+            new_state['segments'] = [[start, end, False] for start, end in ranges]
+
+        self._save_part_state(save_path, new_state)
+        segment_headers = dict(headers or {})
+        resume_validator = self._resume_validator(new_state)
+        if resume_validator:
+            segment_headers['If-Range'] = resume_validator
+
+        pending = [segment for segment in new_state['segments'] if not segment[2]]
+        extra_connections = max(0, len(pending) - 1)
+        if queue_manager is not None:
+            extra_connections = await queue_manager.borrow_slots(extra_connections)
+
+        failures: List[Exception] = []
+
+        async def _worker():
+            while pending and not failures:
+                segment = pending.pop(0)
+                try:
+                    await self._download_range(url, part_path, session, segment_headers, segment[0], segment[1])
+                except Exception as e:
+                    failures.append(e)
+                    continue
+                segment[2] = True
+                self._save_part_state(save_path, new_state)
+
+        try:
+            await asyncio.gather(*[_worker() for _ in range(extra_connections + 1)])
+        finally:
+            if queue_manager is not None:
+                queue_manager.release_slots(extra_connections)
+
+        if failures:
+            raise failures[0]
+        return self._finalize_part(save_path, total_size)
+
+    async def _download_range(
+        self,
+        url: str,
+        part_path: Path,
+        session: aiohttp.ClientSession,
+        headers: Optional[Dict[str, str]],
+        start: int,
+        end: int,
+    ):
+        range_headers = {**(headers or {}), 'Range': f'bytes={start}-{end}'}
+        async with session.get(
+            url,
+            timeout=aiohttp.ClientTimeout(total=300, sock_read=STALL_TIMEOUT),
+            headers=range_headers,
+        ) as response:
+            if response.status != 206:
+                raise self._status_error(response)
+            if self._parse_range_start(response) != start:
+                raise RuntimeError(f'range {start}-{end} started at the wrong offset')
+
+            async with self.write_sink.open(part_path, offset=start) as writer:
+                async for chunk in response.content.iter_any():
+                    await writer.write(chunk)
+
+        if writer.bytes_written != end - start + 1:
+            raise RuntimeError(f'range {start}-{end} incomplete: {writer.bytes_written} bytes')
+
+    async def _write_response(self, response: aiohttp.ClientResponse, save_path: Path, append: bool = False):
+        offset = save_path.stat().st_size if append else 0
+        async with self.write_sink.open(save_path, offset=offset, truncate=not append) as writer:
+            async for chunk in response.content.iter_any():
+                await writer.write(chunk)
+
+    @staticmethod
+    def _status_error(response: aiohttp.ClientResponse) -> aiohttp.ClientResponseError:
+        return aiohttp.ClientResponseError(
+            response.request_info,
+            response.history,
+            status=response.status,
+            message=f'unexpected status {response.status}',
+        )
+
+    @staticmethod
+    def part_path(save_path: Path) -> Path:
+        return save_path.with_name(f"{save_path.name}.part")
+
+    @staticmethod
+    def _sidecar_path(save_path: Path) -> Path:
+        return save_path.with_name(f"{save_path.name}.part.json")
+
+    def _load_part_state(self, save_path: Path) -> Dict[str, Any]:
+        sidecar = self._sidecar_path(save_path)
+        if not sidecar.exists():
+            return {}
+        try:
+            with open(sidecar, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            return state if isinstance(state, dict) else {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable sidecar {sidecar.name}: {e}")
+            return {}
+
+    def _save_part_state(self, save_path: Path, state: Dict[str, Any]):
+        sidecar = self._sidecar_path(save_path)
+        tmp_path = sidecar.with_name(f"{sidecar.name}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, sidecar)
+
+    @staticmethod
+    def _new_part_state(url: str, response: aiohttp.ClientResponse, total_size: Optional[int]) -> Dict[str, Any]:
+        return {
+            'url': url,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'total_size': total_size,
+        }
+
+    @staticmethod
+    def _resume_validator(state: Dict[str, Any]) -> Optional[str]:
+        etag = state.get('etag')
+        # Weak validators are not allowed in If-Range.
+        if etag and not etag.startswith('W/'):
+            return etag
+        return state.get('last_modified')
+
+    def _finalize_part(self, save_path: Path, total_size: Optional[int]) -> bool:
+        part_path = self.part_path(save_path)
+        size = part_path.stat().st_size
+        if total_size is not None and size != total_size:
+            logger.error(f"Size mismatch for {save_path.name}: expected {total_size}, got {size}")
+            self.discard_part(save_path)
+            return False
+        os.replace(part_path, save_path)
+        self._sidecar_path(save_path).unlink(missing_ok=True)
+        return True
+
+    def discard_part(self, save_path: Path):
+        self.part_path(save_path).unlink(missing_ok=True)
+        self._sidecar_path(save_path).unlink(missing_ok=True)
+
+    @staticmethod
+    def _parse_range_start(response: aiohttp.ClientResponse) -> Optional[int]:
+        # Content-Range: bytes 100-199/12345
+        content_range = response.headers.get('Content-Range', '')
+        try:
+            return int(content_range.split(' ', 1)[1].split('-', 1)[0])
+        except (IndexError, ValueError):
+            return None
+
+    @staticmethod
+    def _parse_total_size(content_range: Optional[str]) -> Optional[int]:
+        # Content-Range: bytes 0-0/12345
+        if not content_range or '/' not in content_range:
+            return None
+        total = content_range.rsplit('/', 1)[1].strip()
+        return int(total) if total.isdigit() else None
+
+    @staticmethod
+    def _split_ranges(total_size: int, segments: int) -> List[Tuple[int, int]]:
+        segments = max(1, min(segments, total_size // SEGMENT_MIN_SIZE))
+        segment_size = -(-total_size // segments)
+        return [
+            (start, min(start + segment_size, total_size) - 1)
+            for start in range(0, total_size, segment_size)
+        ]
+
+    async def is_complete(
+        self,
+        save_path: Path,
+        url: Optional[str] = None,
+        session: Optional[aiohttp.ClientSession] = None,
+        headers: Optional[Dict[str, str]] = None,
+        verify: bool = True,
+    ) -> bool:
+        if not self.file_exists(save_path):
+            return False
+
+        size = save_path.stat().st_size
+        expected = self._load_part_state(save_path).get('total_size')
+        if expected is None and verify and url and session is not None:
+            self.head_checks += 1
+            expected = await self._head_content_length(url, session, headers)
+        if expected is not None and expected != size:
+            logger.info(f"Existing {save_path.name} is incomplete ({size}/{expected} bytes), downloading again")
+            return False
+
+        self.skipped_files += 1
+        self.skipped_bytes += size
+        return True
+
+    @staticmethod
+    async def _head_content_length(
+        url: str,
+        session: aiohttp.ClientSession,
+        headers: Optional[Dict[str, str]],
+    ) -> Optional[int]:
+        try:
+            async with session.head(
+                url,
+                timeout=aiohttp.ClientTimeout(total=30),
+                headers=headers,
+                allow_redirects=True,
+            ) as response:
+                if response.status == 200:
+                    return response.content_length
+        except Exception as e:
+            logger.debug(f"HEAD failed for {url}: {e}")
+        # No usable answer: trust the existing file, it was only renamed into place once complete.
+        return None
+
     def file_exists(self, file_path: Path) -> bool:
         return file_path.exists() and file_path.stat().st_size > 0
 
@@ -0,0 +1,186 @@
+import asyncio
+import hashlib
+import os
+import shutil
+from collections import OrderedDict
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+from urllib.parse import urlparse
+
+from utils.logger import setup_logger
+
+logger = setup_logger('MediaStore')
+
+FICLONE = 0x40049409
+HASH_CHUNK_SIZE = 1024 * 1024
+DEFAULT_CACHE_SIZE = 4096
+
+
+def _reflink(src: Path, dst: Path):
+    import fcntl
+
+    with open(src, 'rb') as source, open(dst, 'wb') as target:
+        try:
+            fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+        except OSError:
+            target.close()
+            dst.unlink(missing_ok=True)
+            raise
+
+
+def _hash_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def place_file(src: Path, dest: Path):
+    # Hardlink, else reflink, else copy; dest appears atomically either way.
+    if dest.exists() and os.path.samefile(src, dest):
+        return
+    tmp_path = dest.with_name(f"{dest.name}.link")
+    tmp_path.unlink(missing_ok=True)
+    try:
+        os.link(src, tmp_path)
+    except FileNotFoundError:
+        raise
+    except OSError:
+        try:
+            _reflink(src, tmp_path)
+        except (OSError, ImportError):
+            shutil.copyfile(src, tmp_path)
+    os.replace(tmp_path, dest)
+
+
+class MediaStore:
+    def __init__(self, root: Path, cache_size: int = DEFAULT_CACHE_SIZE):
+        self.root = Path(root)
+        self.cache_size = cache_size
+        self._cache: 'OrderedDict[str, Path]' = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.bytes_saved = 0
+
+    @staticmethod
+    def make_key(kind: str, stable_id: Optional[str]) -> Optional[str]:
+        if not stable_id:
+            return None
+        return hashlib.sha256(f"{kind}:{stable_id}".encode('utf-8')).hexdigest()
+
+    @classmethod
+    def make_url_key(cls, url: Optional[str]) -> Optional[str]:
+        # Static CDN objects: the path names the object, host and query (mirror, signature, expiry) don't.
+        if not url:
+            return None
+        path = urlparse(url).path
+        return cls.make_key('url', path) if path.strip('/') else None
+
+    def blob_path(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    async def materialize(
+        self,
+        key: Optional[str],
+        dest: Path,
+        fetch: Callable[[Path], Awaitable[bool]],
+        url: Optional[str] = None,
+    ) -> bool:
+        url_key = self.make_url_key(url)
+        keys = [k for k in (key, url_key) if k]
+        if not keys:
+            return await self._fetch_and_adopt(dest, fetch, key, url_key)
+
+        while True:
+            if self._place_known(keys, dest):
+                return True
+            pending = self._inflight.get(keys[0])
+            if pending is None:
+                break
+            await pending
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[keys[0]] = future
+        try:
+            return await self._fetch_and_adopt(dest, fetch, key, url_key)
+        finally:
+            del self._inflight[keys[0]]
+            future.set_result(None)
+
+    def _place_known(self, keys: List[str], dest: Path) -> bool:
+        for key in keys:
+            blob = self._lookup(key)
+            if blob is None:
+                continue
+            try:
+                self._place(blob, dest)
+            except FileNotFoundError:
+                self._cache.pop(key, None)
+                continue
+            self.hits += 1
+            self.bytes_saved += dest.stat().st_size
+            for other in keys:
+                if other != key:
+                    self._adopt(dest, self.blob_path(other))
+            return True
+        return False
+
+    def _lookup(self, key: str) -> Optional[Path]:
+        blob = self._cache.get(key)
+        if blob is not None:
+            self._cache.move_to_end(key)
+            return blob
+        blob = self.blob_path(key)
+        if blob.exists():
+            self._remember(key, blob)
+            return blob
+        return None
+
+    def _remember(self, key: str, blob: Path):
+        self._cache[key] = blob
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def _fetch_and_adopt(
+        self,
+        dest: Path,
+        fetch: Callable[[Path], Awaitable[bool]],
+        key: Optional[str],
+        url_key: Optional[str],
+    ) -> bool:
+        if not await fetch(dest):
+            return False
+
+        if key is None:
+            # No stable id: the bytes are already transferred, but identical content still shares one inode.
+            key = await asyncio.to_thread(_hash_file, dest)
+            blob = self.blob_path(key)
+            if blob.exists():
+                self._place(blob, dest)
+
+        for k in (key, url_key):
+            if k:
+                self._adopt(dest, self.blob_path(k))
+        return True
+
+    def _adopt(self, src: Path, blob: Path):
+        if blob.exists():
+            self._remember(blob.name, blob)
+            return
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = blob.with_name(f"{blob.name}.tmp")
+        try:
+            try:
+                os.link(src, tmp_path)
+            except OSError:
+                _reflink(src, tmp_path)
+            os.replace(tmp_path, blob)
+            self._remember(blob.name, blob)
+        except (OSError, ImportError) as e:
+            # Never copy into the store: on filesystems without links it would double disk usage.
+            logger.debug(f"Media store disabled for {src.name}: {e}")
+
+    def _place(self, blob: Path, dest: Path):
+        place_file(blob, dest)
@@ -0,0 +1,153 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from utils.logger import setup_logger
+
+logger = setup_logger('WriteSink')
+
+DEFAULT_BUFFER_SIZE = 4 * 1024 * 1024
+DEFAULT_MEMORY_BUDGET = 64 * 1024 * 1024
+
+_seek_lock = threading.Lock()
+
+
+def _pwrite_all(fd: int, data: bytearray, offset: int):
+    view = memoryview(data)
+    if hasattr(os, 'pwrite'):
+        while view:
+            written = os.pwrite(fd, view, offset)
+            view = view[written:]
+            offset += written
+        return
+
+    # No pwrite on Windows: serialize seek+write across writer threads.
+    with _seek_lock:
+        os.lseek(fd, offset, os.SEEK_SET)
+        while view:
+            written = os.write(fd, view)
+            view = view[written:]
+
+
+class WriteSink:
+    def __init__(
+        self,
+        buffer_size: int = DEFAULT_BUFFER_SIZE,
+        memory_budget: int = DEFAULT_MEMORY_BUDGET,
+        max_writers: int = 2,
+    ):
+        self.buffer_size = buffer_size
+        self.memory_budget = max(memory_budget, buffer_size)
+        self._executor = ThreadPoolExecutor(max_workers=max_writers, thread_name_prefix='write-sink')
+        self._budget: Optional[asyncio.Semaphore] = None
+        self._budget_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def open(self, path: Path, offset: int = 0, truncate: bool = False) -> 'SinkWriter':
+        return SinkWriter(self, path, offset, truncate)
+
+    def _get_budget(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._budget is None or self._budget_loop is not loop:
+            self._budget = asyncio.Semaphore(self.memory_budget // self.buffer_size)
+            self._budget_loop = loop
+        return self._budget
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    async def _reserve(self):
+        # Readers block here once the budget is spent: a buffer counts from its first byte
+        # until its write finishes, so filling and queued buffers share the same limit.
+        await self._get_budget().acquire()
+
+    def _release(self):
+        self._get_budget().release()
+
+    def _submit(self, fd: int, data: bytearray, offset: int) -> asyncio.Future:
+        # The buffer's reservation travels with it and is returned once it is on disk.
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, _pwrite_all, fd, data, offset)
+        future.add_done_callback(lambda _: self._release())
+        return future
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+
+class SinkWriter:
+    def __init__(self, sink: WriteSink, path: Path, offset: int, truncate: bool):
+        self._sink = sink
+        self._path = path
+        self._offset = offset
+        self._truncate = truncate
+        self._fd: Optional[int] = None
+        self._buffer = bytearray()
+        self._reserved = False
+        self._inflight: Optional[asyncio.Future] = None
+        self.bytes_written = 0
+
+    async def __aenter__(self) -> 'SinkWriter':
+        flags = os.O_WRONLY | os.O_CREAT | getattr(os, 'O_BINARY', 0)
+        if self._truncate:
+            flags |= os.O_TRUNC
+        self._fd = await self._sink._run(os.open, str(self._path), flags, 0o644)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        try:
+            # Flush on error too: a contiguous prefix is what stream resume relies on.
+            await self.flush()
+        finally:
+            cancelled = await self._settle()
+            if self._reserved:
+                self._reserved = False
+                self._sink._release()
+            await self._sink._run(os.close, self._fd)
+            if cancelled:
+                raise asyncio.CancelledError()
+
+    async def _settle(self) -> bool:
+        # The pwrite keeps running in its thread even when this task is cancelled; closing the
+        # fd under it could land the bytes in whatever file reuses that fd number.
+        cancelled = False
+        while self._inflight is not None and not self._inflight.done():
+            try:
+                await asyncio.shield(self._inflight)
+            except asyncio.CancelledError:
+                cancelled = True
+        return cancelled
+
+    async def write(self, chunk: bytes):
+        if not self._reserved:
+            await self._sink._reserve()
+            self._reserved = True
+        self._buffer += chunk
+        if len(self._buffer) >= self._sink.buffer_size:
+            await self.flush()
+
+    async def flush(self):
+        if not self._buffer:
+            return
+        # One buffer in flight per file keeps writes ordered, so a crash never leaves holes.
+        # Shielded: cancelling the wait must not mark a still-running write as done.
+        if self._inflight is not None:
+            await asyncio.shield(self._inflight)
+        data, self._buffer = self._buffer, bytearray()
+        self._reserved = False
+        self._inflight = self._sink._submit(self._fd, data, self._offset)
+        self._offset += len(data)
+        self.bytes_written += len(data)
+
+
+_default_sink: Optional[WriteSink] = None
+
+
+def default_write_sink() -> WriteSink:
+    global _default_sink
+    if _default_sink is None:
+        _default_sink = WriteSink()
+    return _default_sink
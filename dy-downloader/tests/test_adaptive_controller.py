@@ -0,0 +1,120 @@
+import time
+
+import pytest
+
+from control import AdaptiveController, RateLimiter
+from core.api_client import DouyinAPIClient, classify_response
+
+
+class _FakeResponse:
+    def __init__(self, status, body):
+        self.status = status
+        self._body = body
+
+    async def read(self):
+        return self._body
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class _FakeSession:
+    closed = False
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+
+    def get(self, url, **kwargs):
+        return _FakeResponse(*self.responses.pop(0))
+
+
+def test_classify_response():
+    assert classify_response(429, b'')[0] == 'throttled'
+    assert classify_response(403, b'{}')[0] == 'forbidden'
+    assert classify_response(500, b'{}')[0] == 'http_error'
+    assert classify_response(200, b'  ')[0] == 'empty'
+    assert classify_response(200, '<html>请完成验证码</html>'.encode())[0] == 'captcha'
+    assert classify_response(200, b'<html>maintenance</html>')[0] == 'api_error'
+    assert classify_response(200, b'{"status_code": 8, "status_msg": "x"}') == (
+        'api_error', {'status_code': 8, 'status_msg': 'x'}
+    )
+    assert classify_response(200, b'{"status_code": 0, "user": {}}') == ('ok', {'status_code': 0, 'user': {}})
+
+
+def test_controller_increases_additively_and_halves_once_per_cooldown():
+    limiter = RateLimiter(max_per_second=2)
+    controller = AdaptiveController(limiter, max_scale=1.2, increase=0.1, cooldown=60)
+
+    for _ in range(5):
+        controller.record('detail', 'ok')
+    assert limiter.scale == pytest.approx(1.2)
+    assert limiter.bucket('detail').rate == pytest.approx(2.4)
+
+    controller.record('detail', 'throttled')
+    controller.record('post', 'captcha')
+    assert controller.backoffs == 1
+    assert limiter.scale == pytest.approx(0.6)
+    assert limiter.paused_until > time.monotonic() + 50
+
+    # No additive increase while cooling down.
+    controller.record('detail', 'ok')
+    assert limiter.scale == pytest.approx(0.6)
+    assert controller.counts == {'ok': 6, 'throttled': 1, 'captcha': 1}
+
+
+def test_controller_respects_min_scale():
+    limiter = RateLimiter(max_per_second=2)
+    controller = AdaptiveController(limiter, min_scale=0.3, cooldown=0)
+
+    for _ in range(5):
+        controller.record('post', 'empty')
+
+    assert limiter.scale == pytest.approx(0.3)
+
+
+@pytest.mark.asyncio
+async def test_pause_holds_every_api_endpoint_but_not_cdn():
+    limiter = RateLimiter(max_per_second=1000, endpoints={'post': {'rate': 1000}})
+    limiter.pause(0.05)
+
+    started = time.monotonic()
+    await limiter.acquire('cdn')
+    assert time.monotonic() - started < 0.03
+
+    await limiter.acquire('post')
+    await limiter.acquire('detail')
+    assert time.monotonic() - started >= 0.04
+
+
+def test_risk_control_scales_api_buckets_only():
+    limiter = RateLimiter(max_per_second=2, endpoints={'post': {'rate': 4}, 'cdn': {'rate': 20}})
+    controller = AdaptiveController(limiter, cooldown=60)
+    limiter.bucket('post')
+    limiter.bucket('cdn')
+
+    controller.record('detail', 'empty')
+
+    assert limiter.bucket('detail').rate == pytest.approx(1)
+    assert limiter.bucket('post').rate == pytest.approx(2)
+    assert limiter.bucket('cdn').rate == 20
+
+
+@pytest.mark.asyncio
+async def test_api_client_reports_classified_responses():
+    limiter = RateLimiter(max_per_second=1000)
+    controller = AdaptiveController(limiter, cooldown=0)
+    client = DouyinAPIClient({}, controller=controller)
+    client._session = _FakeSession([
+        (200, b'{"status_code": 0, "user": {"nickname": "a"}}'),
+        (429, b''),
+        (200, b'{"status_code": 2053, "has_more": 0}'),
+    ])
+
+    assert await client.get_user_info('sec') == {'nickname': 'a'}
+    assert await client.get_video_detail('1') is None
+    assert await client.get_user_post('sec') == {'status_code': 2053, 'has_more': 0}
+    assert controller.counts == {'ok': 1, 'throttled': 1, 'api_error': 1}
+    assert controller.backoffs == 1
@@ -0,0 +1,32 @@
+from storage.aweme_index import MERGE_THRESHOLD, AwemeIndex
+
+
+def test_aweme_index_membership_across_merges():
+    index = AwemeIndex()
+    ids = [str(7300000000000000000 + i * 7) for i in range(MERGE_THRESHOLD + 10)]
+
+    index.update(ids)
+    index.add(ids[0])
+    index.add('abc_123')
+
+    assert len(index) == len(ids) + 1
+    assert all(aweme_id in index for aweme_id in ids)
+    assert str(7300000000000000001) not in index
+    assert 'abc_123' in index
+    assert '' not in index
+
+
+def test_aweme_index_keeps_non_canonical_ids_distinct():
+    index = AwemeIndex()
+    index.update(['123', '99999999999999999999'])
+
+    assert '0123' not in index
+    assert '123' in index
+    assert '99999999999999999999' in index
+
+
+def test_aweme_index_is_compact():
+    index = AwemeIndex()
+    index.update(str(7000000000000000000 + i) for i in range(MERGE_THRESHOLD * 4))
+
+    assert index.memory_bytes() < len(index) * 16
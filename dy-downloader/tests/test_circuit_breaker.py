@@ -0,0 +1,164 @@
+import time
+
+import pytest
+
+from auth import CookieManager
+from config import ConfigLoader
+from control import CircuitBreakers, QueueManager, RateLimiter, RetryHandler
+from control.circuit_breaker import CLOSED, HALF_OPEN, HALF_OPEN_POLL, OPEN, CircuitBreaker
+from core.api_client import CircuitOpenResponse, DouyinAPIClient
+from core.video_downloader import VideoDownloader
+from storage import FileManager
+
+
+def test_breaker_opens_probes_and_closes():
+    breaker = CircuitBreaker('cdn:a', failure_threshold=2, reset_timeout=0.02)
+
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+    time.sleep(0.03)
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    # Only one probe at a time.
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+    assert (breaker.times_opened, breaker.rejected) == (1, 2)
+
+
+def test_retry_after_counts_down_open_circuit():
+    breaker = CircuitBreaker('api:post', failure_threshold=1, reset_timeout=10)
+    assert breaker.retry_after() == 0
+
+    breaker.record_failure()
+    assert 9 < breaker.retry_after() <= 10
+
+    breaker.opened_at -= 10
+    assert breaker.retry_after() == 0
+    assert breaker.allow()
+    # Someone else holds the probe: look again shortly rather than after a full timeout.
+    assert breaker.retry_after() == HALF_OPEN_POLL
+
+
+def test_failed_probe_reopens():
+    breaker = CircuitBreaker('api:detail', failure_threshold=1, reset_timeout=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+
+    assert breaker.allow()
+    breaker.record_failure()
+
+    assert breaker.state == OPEN
+    assert breaker.times_opened == 2
+
+
+@pytest.mark.asyncio
+async def test_api_client_skips_open_endpoint():
+    breakers = CircuitBreakers(failure_threshold=1, reset_timeout=60)
+    breakers.get('api:detail').record_failure()
+    breakers.get('api:post').record_failure()
+    client = DouyinAPIClient({}, circuit_breakers=breakers)
+
+    # No session is ever opened: the request is refused before signing.
+    assert await client.get_video_detail('1') is None
+    refused = await client.get_user_post('sec')
+    assert isinstance(refused, CircuitOpenResponse) and not refused
+    assert client._session is None
+    assert breakers.snapshot() == {
+        'api:detail': {'state': OPEN, 'opened': 1, 'rejected': 1},
+        'api:post': {'state': OPEN, 'opened': 1, 'rejected': 1},
+    }
+
+
+@pytest.mark.asyncio
+async def test_download_reroutes_around_open_cdn_host(tmp_path):
+    breakers = CircuitBreakers(failure_threshold=1, reset_timeout=60)
+    breakers.get('cdn:bad.example.com').record_failure()
+    file_manager = FileManager(str(tmp_path))
+    api_client = DouyinAPIClient({})
+    downloader = VideoDownloader(
+        ConfigLoader(),
+        api_client,
+        file_manager,
+        CookieManager(str(tmp_path / '.cookies.json')),
+        rate_limiter=RateLimiter(max_per_second=1000),
+        retry_handler=RetryHandler(max_retries=1),
+        queue_manager=QueueManager(max_workers=1),
+        circuit_breakers=breakers,
+    )
+    requested = []
+
+    async def _fake_download(url, save_path, session, **kwargs):
+        requested.append(url)
+        save_path.write_bytes(b'ok')
+        return True
+
+    file_manager.download_file = _fake_download
+    candidates = [('https://bad.example.com/v.mp4', {}), ('https://good.example.com/v.mp4', {})]
+
+    assert await downloader._download_with_retry(candidates, tmp_path / 'v.mp4', None)
+    assert requested == ['https://good.example.com/v.mp4']
+
+    requested.clear()
+    assert not await downloader._download_with_retry(candidates[:1], tmp_path / 'w.mp4', None)
+    assert requested == []
+    assert downloader.retry_handler.failures['circuit_open'] == 1
+
+    await api_client.close()
+
+
+@pytest.mark.asyncio
+async def test_mirror_race_skips_open_hosts_and_takes_cdn_tokens(tmp_path):
+    breakers = CircuitBreakers(failure_threshold=1, reset_timeout=60)
+    breakers.get('cdn:bad.example.com').record_failure()
+    api_client = DouyinAPIClient({})
+    downloader = VideoDownloader(
+        ConfigLoader(),
+        api_client,
+        FileManager(str(tmp_path)),
+        CookieManager(str(tmp_path / '.cookies.json')),
+        rate_limiter=RateLimiter(max_per_second=1000),
+        circuit_breakers=breakers,
+    )
+    probed = []
+    acquired = []
+
+    async def _fake_probe(url, headers, session):
+        probed.append(url)
+        return 0.01
+
+    original_acquire = downloader.rate_limiter.acquire
+
+    async def _counting_acquire(endpoint='default'):
+        acquired.append(endpoint)
+        await original_acquire(endpoint)
+
+    downloader.mirror_selector._probe = _fake_probe
+    downloader.rate_limiter.acquire = _counting_acquire
+    candidates = [
+        ('https://bad.example.com/v.mp4', {}),
+        ('https://a.example.com/v.mp4', {}),
+        ('https://b.example.com/v.mp4', {}),
+    ]
+
+    ranked = await downloader._race_mirrors(candidates, None)
+
+    assert 'https://bad.example.com/v.mp4' not in probed
+    assert probed[0] == 'https://a.example.com/v.mp4'
+    assert acquired == ['cdn'] * len(probed)
+    assert ranked[0][0] == 'https://a.example.com/v.mp4'
+    assert ranked[-1][0] == 'https://bad.example.com/v.mp4'
+    assert breakers.snapshot()['cdn:bad.example.com']['rejected'] == 0
+
+    # One healthy host left: nothing to race, nothing probed.
+    probed.clear()
+    assert await downloader._race_mirrors(candidates[:2], None) == candidates[:2]
+    assert probed == []
+
+    await api_client.close()
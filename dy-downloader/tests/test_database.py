@@ -36,3 +36,257 @@ async def test_database_aweme_lifecycle(tmp_path):
         'success_count': 1,
         'config': json.dumps({'path': './Downloaded/'}, ensure_ascii=False),
     })
+
+    await database.close()
+
+
+@pytest.mark.asyncio
+async def test_database_group_commits_concurrent_writes(tmp_path):
+    import asyncio
+    import sqlite3
+
+    db_path = tmp_path / "test.db"
+    database = Database(str(db_path), batch_size=50)
+
+    await asyncio.gather(*[
+        database.add_aweme({
+            'aweme_id': str(i),
+            'aweme_type': 'video',
+            'author_id': 'author',
+            'create_time': 1700000000 + i,
+        })
+        for i in range(120)
+    ])
+
+    # Every write is committed and visible to the read connection once its await returns.
+    assert await database.get_aweme_count_by_author('author') == 120
+    assert await database.is_downloaded('119') is True
+
+    await database.close()
+
+    conn = sqlite3.connect(db_path)
+    try:
+        assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        assert conn.execute('SELECT COUNT(*) FROM aweme').fetchone()[0] == 120
+    finally:
+        conn.close()
+
+
+@pytest.mark.asyncio
+async def test_database_filter_downloaded(tmp_path):
+    database = Database(str(tmp_path / "test.db"))
+
+    for aweme_id in ('1', '3'):
+        await database.add_aweme({'aweme_id': aweme_id, 'aweme_type': 'video'})
+
+    assert await database.filter_downloaded(['1', '2', '3', '', None]) == {'1', '3'}
+    assert await database.filter_downloaded([]) == set()
+
+    await database.close()
+
+
+@pytest.mark.asyncio
+async def test_database_lazy_id_index_per_author(tmp_path):
+    db_path = str(tmp_path / "test.db")
+    seed = Database(db_path)
+    await seed.add_aweme({'aweme_id': '1', 'aweme_type': 'video', 'author_id': 'a'})
+    await seed.add_aweme({'aweme_id': '2', 'aweme_type': 'video', 'author_id': 'b'})
+    await seed.close()
+
+    database = Database(db_path, id_index='lazy')
+
+    assert await database.filter_downloaded(['1', '2', '3'], author_id='a') == {'1'}
+    assert await database.filter_downloaded(['1', '2', '3']) == {'1', '2'}
+
+    await database.add_aweme({'aweme_id': '3', 'aweme_type': 'video', 'author_id': 'a'})
+    assert await database.filter_downloaded(['3'], author_id='a') == {'3'}
+    assert await database.is_downloaded('3') is True
+
+    await database.close()
+
+
+@pytest.mark.asyncio
+async def test_database_full_id_index(tmp_path):
+    db_path = str(tmp_path / "test.db")
+    seed = Database(db_path)
+    await seed.add_aweme({'aweme_id': '1', 'aweme_type': 'video', 'author_id': 'a'})
+    await seed.close()
+
+    database = Database(db_path, id_index='full')
+    await database.initialize()
+
+    assert await database.is_downloaded('1') is True
+    assert await database.is_downloaded('2') is False
+    assert await database.filter_downloaded(['1', '2']) == {'1'}
+
+    await database.close()
+
+
+@pytest.mark.asyncio
+async def test_database_stores_metadata_compressed(tmp_path):
+    database = Database(str(tmp_path / "test.db"))
+    metadata = json.dumps({'desc': 'x' * 5000, 'aweme_id': '1'})
+
+    await database.add_aweme({'aweme_id': '1', 'aweme_type': 'video', 'metadata': metadata})
+
+    assert await database.get_metadata('1') == metadata
+    assert await database.get_metadata('missing') is None
+    row = await database._fetchone('SELECT metadata FROM aweme WHERE aweme_id = ?', ('1',))
+    assert row[0] is None
+    row = await database._fetchone('SELECT length(data) FROM aweme_metadata WHERE aweme_id = ?', ('1',))
+    assert row[0] < len(metadata) // 10
+
+    await database.close()
+
+
+@pytest.mark.asyncio
+async def test_database_migrates_inline_metadata(tmp_path):
+    import sqlite3
+
+    db_path = tmp_path / "test.db"
+    database = Database(str(db_path))
+    await database.initialize()
+    await database.close()
+
+    legacy = json.dumps({'desc': 'legacy ' * 500})
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        'INSERT INTO aweme (aweme_id, aweme_type, metadata) VALUES (?, ?, ?)',
+        [(str(i), 'video', legacy) for i in range(5)],
+    )
+    conn.commit()
+    conn.close()
+
+    database = Database(str(db_path))
+    stats = await database.migrate_metadata(chunk_size=2)
+    assert stats['rows'] == 5
+    assert stats['stored_bytes'] < stats['raw_bytes']
+    assert await database.get_metadata('3') == legacy
+    assert (await database.migrate_metadata())['rows'] == 0
+    await database.vacuum()
+    await database.close()
+
+
+@pytest.mark.asyncio
+async def test_database_batch_keeps_queue_order(tmp_path):
+    import asyncio
+
+    database = Database(str(tmp_path / "test.db"))
+    await database.initialize()
+
+    # All three land in one batch; grouping by SQL would run the DELETE last.
+    await asyncio.gather(
+        database.save_checkpoint('sec', 'post', 1, True),
+        database.clear_checkpoint('sec', 'post'),
+        database.save_checkpoint('sec', 'post', 2, False),
+    )
+
+    assert await database.get_checkpoint('sec', 'post') == {
+        'max_cursor': 2, 'has_more': False, 'latest_time': None, 'windows': None,
+    }
+    await database.close()
+
+
+@pytest.mark.asyncio
+async def test_database_failed_call_rolls_back_all_its_statements(tmp_path):
+    import asyncio
+
+    database = Database(str(tmp_path / "test.db"))
+    await database.initialize()
+
+    good = database.add_aweme({'aweme_id': '1', 'aweme_type': 'video', 'author_id': 'a'})
+    bad = database._write_all([
+        ('INSERT INTO crawl_checkpoint (sec_uid, mode, max_cursor, has_more) VALUES (?, ?, ?, ?)', ('sec', 'post', 1, 1)),
+        ('INSERT INTO missing_table VALUES (?)', (1,)),
+    ])
+    results = await asyncio.gather(good, bad, return_exceptions=True)
+
+    assert results[0] is None
+    assert isinstance(results[1], Exception)
+    assert await database.is_downloaded('1') is True
+    assert await database.get_checkpoint('sec', 'post') is None
+    await database.close()
+
+
+@pytest.mark.asyncio
+async def test_database_writer_survives_broken_connection(tmp_path):
+    database = Database(str(tmp_path / "test.db"))
+    await database.initialize()
+    write_db = database._write_db
+
+    async def _broken(*args, **kwargs):
+        raise RuntimeError('connection lost')
+
+    original = write_db.executemany, write_db.rollback
+    write_db.executemany = _broken
+    write_db.rollback = _broken
+
+    with pytest.raises(RuntimeError):
+        await database.add_aweme({'aweme_id': '1', 'aweme_type': 'video'})
+    assert not database._writer_task.done()
+
+    write_db.executemany, write_db.rollback = original
+    await database.add_aweme({'aweme_id': '2', 'aweme_type': 'video'})
+    assert await database.is_downloaded('2') is True
+    await database.close()
+
+
+@pytest.mark.asyncio
+async def test_database_write_fails_fast_once_writer_stopped(tmp_path):
+    import asyncio
+
+    database = Database(str(tmp_path / "test.db"))
+    await database.initialize()
+    database._writer_task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await database._writer_task
+
+    with pytest.raises(RuntimeError):
+        await asyncio.wait_for(database.add_history({'url': 'u', 'url_type': 'user'}), timeout=1)
+
+    await database._read_db.close()
+    await database._write_db.close()
+
+
+@pytest.mark.asyncio
+async def test_database_failed_write_is_not_indexed(tmp_path):
+    database = Database(str(tmp_path / "test.db"), id_index='full')
+    await database.initialize()
+
+    async def _fail(statements):
+        raise RuntimeError('disk full')
+
+    original = database._write_all
+    database._write_all = _fail
+    with pytest.raises(RuntimeError):
+        await database.add_aweme({'aweme_id': '1', 'aweme_type': 'video', 'author_id': 'a'})
+    database._write_all = original
+
+    assert await database.is_downloaded('1') is False
+    assert await database.filter_downloaded(['1']) == set()
+    await database.close()
+
+
+@pytest.mark.asyncio
+async def test_database_adds_window_plan_to_old_checkpoints(tmp_path):
+    import sqlite3
+
+    db_path = tmp_path / "test.db"
+    conn = sqlite3.connect(db_path)
+    conn.execute('''
+        CREATE TABLE crawl_checkpoint (
+            sec_uid TEXT NOT NULL, mode TEXT NOT NULL, max_cursor INTEGER NOT NULL,
+            has_more INTEGER NOT NULL, latest_time INTEGER, updated_at INTEGER,
+            PRIMARY KEY (sec_uid, mode)
+        )
+    ''')
+    conn.execute("INSERT INTO crawl_checkpoint VALUES ('sec', 'post', 10, 1, NULL, 0)")
+    conn.commit()
+    conn.close()
+
+    database = Database(str(db_path))
+    assert (await database.get_checkpoint('sec', 'post'))['windows'] is None
+
+    await database.save_checkpoint('sec', 'post', 20, True, None, [[20, 5, False], [5, None, True]])
+    assert (await database.get_checkpoint('sec', 'post'))['windows'] == [[20, 5, False], [5, None, True]]
+    await database.close()
@@ -0,0 +1,208 @@
+import json
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import storage.file_manager as file_manager_module
+from control import QueueManager
+from storage import FileManager
+
+PAYLOAD = bytes(range(256)) * 4096
+
+
+def _build_app(payload: bytes, accept_ranges: bool = True, etag: str = '"v1"'):
+    requests = []
+
+    async def _handler(request):
+        requests.append(request.headers.get('Range'))
+        range_header = request.headers.get('Range')
+        if_range = request.headers.get('If-Range')
+        if accept_ranges and range_header and if_range in (None, etag):
+            start, end = range_header.split('=', 1)[1].split('-')
+            start = int(start)
+            if start >= len(payload):
+                return web.Response(status=416, headers={'Content-Range': f'bytes */{len(payload)}'})
+            end = min(int(end), len(payload) - 1) if end else len(payload) - 1
+            return web.Response(
+                status=206,
+                body=payload[start:end + 1],
+                headers={'Content-Range': f'bytes {start}-{end}/{len(payload)}', 'ETag': etag},
+            )
+        return web.Response(body=payload, headers={'ETag': etag})
+
+    app = web.Application()
+    app.router.add_get('/video', _handler)
+    return app, requests
+
+
+@pytest.mark.asyncio
+async def test_segmented_download_fetches_ranges(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_manager_module, 'SEGMENT_MIN_SIZE', 64 * 1024)
+    app, requests = _build_app(PAYLOAD)
+
+    async with TestServer(app) as server, aiohttp.ClientSession() as session:
+        manager = FileManager(str(tmp_path))
+        target = tmp_path / 'video.mp4'
+        queue_manager = QueueManager(max_workers=4)
+
+        assert await manager.download_file(
+            str(server.make_url('/video')),
+            target,
+            session,
+            segments=4,
+            queue_manager=queue_manager,
+        )
+
+    assert target.read_bytes() == PAYLOAD
+    assert requests[0] == 'bytes=0-0'
+    assert len(requests) == 5
+    assert queue_manager.semaphore._value == 4
+
+
+@pytest.mark.asyncio
+async def test_segmented_download_falls_back_without_range_support(tmp_path):
+    app, requests = _build_app(PAYLOAD, accept_ranges=False)
+
+    async with TestServer(app) as server, aiohttp.ClientSession() as session:
+        manager = FileManager(str(tmp_path))
+        target = tmp_path / 'video.mp4'
+
+        assert await manager.download_file(str(server.make_url('/video')), target, session, segments=4)
+
+    assert target.read_bytes() == PAYLOAD
+    assert len(requests) == 1
+
+
+def test_split_ranges_respects_minimum_segment_size():
+    ranges = FileManager._split_ranges(10 * 1024 * 1024 + 1, 4)
+    assert len(ranges) == 4
+    assert ranges[0][0] == 0
+    assert ranges[-1][1] == 10 * 1024 * 1024
+    assert FileManager._split_ranges(512 * 1024, 4) == [(0, 512 * 1024 - 1)]
+
+
+@pytest.mark.asyncio
+async def test_stream_download_resumes_part_file(tmp_path):
+    app, requests = _build_app(PAYLOAD)
+    target = tmp_path / 'video.mp4'
+    (tmp_path / 'video.mp4.part').write_bytes(PAYLOAD[:1000])
+    (tmp_path / 'video.mp4.part.json').write_text(
+        json.dumps({'url': 'old', 'etag': '"v1"', 'total_size': len(PAYLOAD)})
+    )
+
+    async with TestServer(app) as server, aiohttp.ClientSession() as session:
+        manager = FileManager(str(tmp_path))
+        assert await manager.download_file(str(server.make_url('/video')), target, session)
+
+    assert requests == ['bytes=1000-']
+    assert target.read_bytes() == PAYLOAD
+    assert not (tmp_path / 'video.mp4.part').exists()
+    assert not (tmp_path / 'video.mp4.part.json').exists()
+
+
+@pytest.mark.asyncio
+async def test_stream_download_restarts_when_resource_changed(tmp_path):
+    app, requests = _build_app(PAYLOAD, etag='"v2"')
+    target = tmp_path / 'video.mp4'
+    (tmp_path / 'video.mp4.part').write_bytes(b'stale' * 100)
+    (tmp_path / 'video.mp4.part.json').write_text(json.dumps({'etag': '"v1"', 'total_size': len(PAYLOAD)}))
+
+    async with TestServer(app) as server, aiohttp.ClientSession() as session:
+        manager = FileManager(str(tmp_path))
+        assert await manager.download_file(str(server.make_url('/video')), target, session)
+
+    assert requests == ['bytes=500-']
+    assert target.read_bytes() == PAYLOAD
+
+
+@pytest.mark.asyncio
+async def test_stream_download_restarts_after_unsatisfiable_range(tmp_path):
+    app, requests = _build_app(PAYLOAD)
+    target = tmp_path / 'video.mp4'
+    # A part longer than the resource: the resume request can only get a 416.
+    (tmp_path / 'video.mp4.part').write_bytes(b'x' * (len(PAYLOAD) + 10))
+    (tmp_path / 'video.mp4.part.json').write_text(json.dumps({'etag': '"v1"'}))
+    failures = []
+
+    async with TestServer(app) as server, aiohttp.ClientSession() as session:
+        manager = FileManager(str(tmp_path))
+        assert await manager.download_file(str(server.make_url('/video')), target, session, failures=failures)
+
+    assert requests == [f'bytes={len(PAYLOAD) + 10}-', None]
+    assert target.read_bytes() == PAYLOAD
+    assert failures == []
+
+
+@pytest.mark.asyncio
+async def test_segmented_download_resumes_unfinished_segments(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_manager_module, 'SEGMENT_MIN_SIZE', 64 * 1024)
+    app, requests = _build_app(PAYLOAD)
+    target = tmp_path / 'video.mp4'
+    half = len(PAYLOAD) // 2
+    (tmp_path / 'video.mp4.part').write_bytes(PAYLOAD[:half] + bytes(len(PAYLOAD) - half))
+    (tmp_path / 'video.mp4.part.json').write_text(json.dumps({
+        'etag': '"v1"',
+        'total_size': len(PAYLOAD),
+        'segments': [[0, half - 1, True], [half, len(PAYLOAD) - 1, False]],
+    }))
+
+    async with TestServer(app) as server, aiohttp.ClientSession() as session:
+        manager = FileManager(str(tmp_path))
+        assert await manager.download_file(str(server.make_url('/video')), target, session, segments=2)
+
+    assert requests == ['bytes=0-0', f'bytes={half}-{len(PAYLOAD) - 1}']
+    assert target.read_bytes() == PAYLOAD
+
+
+@pytest.mark.asyncio
+async def test_failed_download_leaves_no_final_file(tmp_path):
+    async def _not_found(request):
+        return web.Response(body=b'short', headers={'ETag': '"v1"'}, status=404)
+
+    app = web.Application()
+    app.router.add_get('/video', _not_found)
+    target = tmp_path / 'video.mp4'
+
+    async with TestServer(app) as server, aiohttp.ClientSession() as session:
+        manager = FileManager(str(tmp_path))
+        failures = []
+        assert not await manager.download_file(str(server.make_url('/video')), target, session, failures=failures)
+
+    assert not target.exists()
+    assert [error.status for error in failures] == [404]
+
+
+@pytest.mark.asyncio
+async def test_is_complete_checks_size_with_head(tmp_path):
+    app, requests = _build_app(PAYLOAD)
+    target = tmp_path / 'video.mp4'
+
+    async with TestServer(app) as server, aiohttp.ClientSession() as session:
+        manager = FileManager(str(tmp_path))
+        url = str(server.make_url('/video'))
+
+        assert not await manager.is_complete(target, url, session)
+
+        target.write_bytes(PAYLOAD[:100])
+        assert not await manager.is_complete(target, url, session)
+
+        target.write_bytes(PAYLOAD)
+        assert await manager.is_complete(target, url, session)
+
+    assert manager.skipped_files == 1
+    assert manager.skipped_bytes == len(PAYLOAD)
+    # The missing file needs no HEAD; both existing ones are checked.
+    assert manager.head_checks == 2
+
+
+@pytest.mark.asyncio
+async def test_is_complete_without_verification_trusts_existing_file(tmp_path):
+    manager = FileManager(str(tmp_path))
+    target = tmp_path / 'avatar.jpg'
+    target.write_bytes(b'jpeg')
+
+    assert await manager.is_complete(target, 'https://example.invalid/a.jpg', None, verify=False)
+    assert manager.skipped_bytes == 4
+    assert manager.head_checks == 0
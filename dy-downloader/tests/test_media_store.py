@@ -0,0 +1,105 @@
+import asyncio
+import os
+
+import pytest
+
+from storage import MediaStore
+
+
+@pytest.mark.asyncio
+async def test_stable_key_fetches_once_and_links(tmp_path):
+    store = MediaStore(tmp_path / '.store')
+    calls = []
+
+    async def _fetch(target):
+        calls.append(target)
+        await asyncio.sleep(0)
+        target.write_bytes(b'avatar')
+        return True
+
+    key = MediaStore.make_key('avatar', 'tos-cn-avatar/abc')
+    first, second = tmp_path / 'a' / 'avatar.jpg', tmp_path / 'b' / 'avatar.jpg'
+    first.parent.mkdir()
+    second.parent.mkdir()
+
+    results = await asyncio.gather(
+        store.materialize(key, first, _fetch),
+        store.materialize(key, second, _fetch),
+    )
+
+    assert results == [True, True]
+    assert calls == [first]
+    assert second.read_bytes() == b'avatar'
+    assert os.path.samefile(first, second)
+    assert store.hits == 1
+    assert store.bytes_saved == len(b'avatar')
+
+
+@pytest.mark.asyncio
+async def test_content_hash_fallback_dedupes_disk(tmp_path):
+    store = MediaStore(tmp_path / '.store')
+
+    async def _fetch(target):
+        target.write_bytes(b'same bytes')
+        return True
+
+    first, second = tmp_path / 'one.jpg', tmp_path / 'two.jpg'
+    assert await store.materialize(None, first, _fetch)
+    assert await store.materialize(None, second, _fetch)
+
+    assert os.path.samefile(first, second)
+
+
+@pytest.mark.asyncio
+async def test_failed_fetch_lets_waiter_retry(tmp_path):
+    store = MediaStore(tmp_path / '.store')
+    attempts = []
+
+    async def _fetch(target):
+        attempts.append(target)
+        await asyncio.sleep(0)
+        if len(attempts) == 1:
+            return False
+        target.write_bytes(b'music')
+        return True
+
+    key = MediaStore.make_key('music', '123')
+    results = await asyncio.gather(
+        store.materialize(key, tmp_path / 'first.mp3', _fetch),
+        store.materialize(key, tmp_path / 'second.mp3', _fetch),
+    )
+
+    assert results == [False, True]
+    assert len(attempts) == 2
+
+
+@pytest.mark.asyncio
+async def test_url_key_survives_mirror_and_rerun(tmp_path):
+    calls = []
+
+    async def _fetch(target):
+        calls.append(target)
+        target.write_bytes(b'cover')
+        return True
+
+    store = MediaStore(tmp_path / '.store')
+    assert await store.materialize(
+        None, tmp_path / 'one.jpg', _fetch, url='https://p3.douyinpic.com/obj/tos-cn/cover.jpeg?x-expires=1'
+    )
+
+    rerun_store = MediaStore(tmp_path / '.store')
+    assert await rerun_store.materialize(
+        None, tmp_path / 'two.jpg', _fetch, url='https://p9.douyinpic.com/obj/tos-cn/cover.jpeg?x-expires=2'
+    )
+
+    assert len(calls) == 1
+    assert rerun_store.hits == 1
+    assert os.path.samefile(tmp_path / 'one.jpg', tmp_path / 'two.jpg')
+
+
+def test_lookup_cache_is_bounded(tmp_path):
+    store = MediaStore(tmp_path / '.store', cache_size=2)
+    for name in ('a', 'b', 'c'):
+        store._remember(name, tmp_path / name)
+
+    assert list(store._cache) == ['b', 'c']
@@ -0,0 +1,60 @@
+import asyncio
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from control import MirrorSelector
+
+
+def _app(delay: float = 0, status: int = 206):
+    async def _handler(request):
+        await asyncio.sleep(delay)
+        return web.Response(status=status, body=b'x')
+
+    app = web.Application()
+    app.router.add_get('/media', _handler)
+    return app
+
+
+@pytest.mark.asyncio
+async def test_race_prefers_faster_mirror():
+    selector = MirrorSelector(hedge_delay=0.05)
+
+    async with TestServer(_app(delay=1)) as slow, TestServer(_app()) as fast, aiohttp.ClientSession() as session:
+        slow_url, fast_url = str(slow.make_url('/media')), str(fast.make_url('/media'))
+        ranked = await selector.race([(slow_url, {}), (fast_url, {})], session)
+
+    assert ranked[0][0] == fast_url
+    assert selector.rank([(slow_url, {}), (fast_url, {})])[0][0] == fast_url
+
+
+@pytest.mark.asyncio
+async def test_race_fails_over_from_broken_mirror():
+    selector = MirrorSelector(hedge_delay=5)
+
+    async with TestServer(_app(status=503)) as broken, TestServer(_app()) as healthy, \
+            aiohttp.ClientSession() as session:
+        broken_url, healthy_url = str(broken.make_url('/media')), str(healthy.make_url('/media'))
+        ranked = await selector.race([(broken_url, {}), (healthy_url, {})], session)
+
+    assert [url for url, _ in ranked] == [healthy_url, broken_url]
+    assert selector.rank([(broken_url, {}), (healthy_url, {})])[0][0] == healthy_url
+
+
+def test_rank_uses_throughput_and_keeps_unknown_order():
+    selector = MirrorSelector()
+    selector.record_success('https://slow.example/a', ttfb=0.1, size=1024 * 1024, elapsed=10)
+    selector.record_success('https://fast.example/a', ttfb=0.1, size=1024 * 1024, elapsed=1)
+
+    ranked = selector.rank([
+        ('https://new1.example/a', {}),
+        ('https://slow.example/a', {}),
+        ('https://new2.example/a', {}),
+        ('https://fast.example/a', {}),
+    ])
+
+    assert [url.split('/')[2] for url, _ in ranked] == [
+        'fast.example', 'slow.example', 'new1.example', 'new2.example'
+    ]
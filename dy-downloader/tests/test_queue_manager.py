@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+from control import QueueManager
+
+
+@pytest.mark.asyncio
+async def test_run_stream_bounds_inflight_items():
+    manager = QueueManager(max_workers=3)
+    pulled = 0
+    active = 0
+    peak_active = 0
+    peak_backlog = 0
+    results = []
+
+    async def _items():
+        nonlocal pulled, peak_backlog
+        for i in range(200):
+            pulled += 1
+            peak_backlog = max(peak_backlog, pulled - len(results))
+            yield i
+
+    async def _work(item):
+        nonlocal active, peak_active
+        active += 1
+        peak_active = max(peak_active, active)
+        await asyncio.sleep(0)
+        active -= 1
+        return item * 2
+
+    processed = await manager.run_stream(_work, _items(), on_result=results.append, queue_size=4)
+
+    assert processed == 200
+    assert sorted(results) == [i * 2 for i in range(200)]
+    assert peak_active <= 3
+    # Items pulled ahead of completed results stay bounded by queue size + workers.
+    assert peak_backlog <= 4 + 3 + 1
+
+
+@pytest.mark.asyncio
+async def test_download_batch_keeps_order_and_reports_errors():
+    manager = QueueManager(max_workers=2)
+
+    async def _work(item):
+        await asyncio.sleep(0.01 * (3 - item))
+        if item == 1:
+            raise ValueError('boom')
+        return item
+
+    results = await manager.download_batch(_work, [0, 1, 2])
+
+    assert results[0] == 0
+    assert results[1]['status'] == 'error'
+    assert results[2] == 2
@@ -0,0 +1,89 @@
+import asyncio
+import time
+
+import pytest
+
+from config import ConfigLoader
+from control import RateLimiter
+
+
+@pytest.mark.asyncio
+async def test_burst_is_served_immediately_then_paced():
+    limiter = RateLimiter(max_per_second=20, burst=3)
+
+    started = time.monotonic()
+    for _ in range(3):
+        await limiter.acquire()
+    assert time.monotonic() - started < 0.03
+
+    await limiter.acquire()
+    await limiter.acquire()
+    assert time.monotonic() - started >= 0.09
+
+
+@pytest.mark.asyncio
+async def test_endpoints_do_not_wait_on_each_other():
+    limiter = RateLimiter(max_per_second=1000, endpoints={'post': {'rate': 2, 'burst': 1}})
+
+    await limiter.acquire('post')
+    slow = asyncio.ensure_future(limiter.acquire('post'))
+    await asyncio.sleep(0)
+
+    started = time.monotonic()
+    for _ in range(5):
+        await limiter.acquire('detail')
+    assert time.monotonic() - started < 0.05
+    assert not slow.done()
+
+    slow.cancel()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_waiters_sleep_in_parallel():
+    limiter = RateLimiter(max_per_second=50, burst=1)
+    finished = []
+
+    async def _acquire(index):
+        await limiter.acquire()
+        finished.append((index, time.monotonic()))
+
+    started = time.monotonic()
+    await asyncio.gather(*(_acquire(i) for i in range(5)))
+
+    assert [index for index, _ in finished] == [0, 1, 2, 3, 4]
+    assert 0.07 <= finished[-1][1] - started < 0.2
+
+
+def test_rate_limiter_from_config():
+    limiter = RateLimiter.from_config(ConfigLoader().get('rate_limit'))
+
+    # Every API endpoint shares the top-level budget by default: 2 req/s for the whole run.
+    assert limiter.bucket('detail') is limiter.bucket('post') is limiter.bucket('profile')
+    assert limiter.bucket('detail').rate == 2
+    assert limiter.bucket('cdn').rate == 20
+    assert RateLimiter.from_config({'endpoints': {'cdn': {'rate': 0}}}).bucket('cdn').reserve() == 0
+
+
+def test_top_level_rate_override_reaches_every_api_endpoint(tmp_path):
+    config_path = tmp_path / 'config.yml'
+    config_path.write_text('rate_limit:\n  rate: 0.5\n', encoding='utf-8')
+    limiter = RateLimiter.from_config(ConfigLoader(str(config_path)).get('rate_limit'))
+
+    for endpoint in ('detail', 'post', 'profile'):
+        assert limiter.bucket(endpoint).rate == 0.5
+    assert limiter.bucket('cdn').rate == 20
+
+
+@pytest.mark.asyncio
+async def test_capped_endpoint_still_spends_shared_api_budget():
+    limiter = RateLimiter(max_per_second=20, burst=1, endpoints={'detail': {'rate': 1000, 'burst': 10}})
+
+    started = time.monotonic()
+    for endpoint in ('detail', 'post', 'detail'):
+        await limiter.acquire(endpoint)
+    assert time.monotonic() - started >= 0.09
+
+    # The CDN bucket is outside the API budget.
+    started = time.monotonic()
+    await limiter.acquire('cdn')
+    assert time.monotonic() - started < 0.03
@@ -0,0 +1,78 @@
+import aiohttp
+import pytest
+
+from control import RetryHandler
+from control.retry_handler import AUTH, PERMANENT, RETRYABLE, RetryError, classify_error
+
+
+def _status_error(status):
+    return aiohttp.ClientResponseError(None, (), status=status)
+
+
+def test_classify_error():
+    assert classify_error(_status_error(404)) == PERMANENT
+    assert classify_error(_status_error(410)) == PERMANENT
+    assert classify_error(_status_error(403)) == AUTH
+    assert classify_error(_status_error(429)) == RETRYABLE
+    assert classify_error(_status_error(503)) == RETRYABLE
+    assert classify_error(TimeoutError()) == RETRYABLE
+    assert classify_error(RetryError('x', error_class=PERMANENT)) == PERMANENT
+
+
+@pytest.mark.asyncio
+async def test_permanent_errors_are_not_retried():
+    handler = RetryHandler(max_retries=3, base_delay=0.001)
+    calls = 0
+
+    async def _fail():
+        nonlocal calls
+        calls += 1
+        raise RetryError('gone', status=404)
+
+    with pytest.raises(RetryError):
+        await handler.execute_with_retry(_fail)
+
+    assert calls == 1
+    assert handler.retries == 0
+    assert handler.failures[PERMANENT] == 1
+
+
+@pytest.mark.asyncio
+async def test_retryable_errors_back_off_with_jitter():
+    handler = RetryHandler(max_retries=3, base_delay=0.001, max_delay=0.01)
+    calls = 0
+
+    async def _flaky():
+        nonlocal calls
+        calls += 1
+        if calls < 3:
+            raise ConnectionResetError('reset')
+        return 'ok'
+
+    assert await handler.execute_with_retry(_flaky) == 'ok'
+    assert handler.retries == 2
+    assert handler.failures[RETRYABLE] == 2
+
+    delays = [handler._next_delay(0.001) for _ in range(50)]
+    assert all(0.001 <= delay <= 0.01 for delay in delays)
+    assert len(set(delays)) > 1
+
+
+@pytest.mark.asyncio
+async def test_retry_budget_caps_extra_attempts():
+    handler = RetryHandler(max_retries=5, base_delay=0.0001, max_delay=0.0001, budget_ratio=0.1, budget_min=2)
+    attempts = 0
+
+    async def _always_fail():
+        nonlocal attempts
+        attempts += 1
+        raise ConnectionResetError('edge down')
+
+    for _ in range(20):
+        with pytest.raises(ConnectionResetError):
+            await handler.execute_with_retry(_always_fail)
+
+    # 20 calls at 10% plus a floor of 2 allow at most 4 retries over the run.
+    assert handler.retries <= 4
+    assert attempts == 20 + handler.retries
+    assert handler.budget_denied > 0
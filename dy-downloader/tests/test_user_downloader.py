@@ -0,0 +1,514 @@
+import asyncio
+
+import pytest
+
+from auth import CookieManager
+from config import ConfigLoader
+from control import AwemeRegistry, QueueManager, RateLimiter, RetryHandler
+from control.aweme_registry import AwemeOutputs
+from core.api_client import CircuitOpenResponse
+import core.user_downloader as user_downloader_module
+from core.user_downloader import UserDownloader
+from storage import Database, FileManager
+
+
+class _FakeAPIClient:
+    BASE_URL = 'https://www.douyin.com'
+
+    def __init__(self, pages, nickname='Author'):
+        self.pages = pages
+        self.nickname = nickname
+        self.headers = {'User-Agent': 'UnitTestAgent/1.0'}
+        self.cursors = []
+        self.events = []
+
+    async def get_user_info(self, sec_uid):
+        return {'uid': 'uid-1', 'nickname': self.nickname}
+
+    async def get_user_post(self, sec_uid, max_cursor=0, count=20):
+        self.cursors.append(max_cursor)
+        self.events.append(('page', max_cursor))
+        await asyncio.sleep(0.01)
+        return self.pages[max_cursor]
+
+
+def _build_downloader(tmp_path, pages, **config_overrides):
+    config = ConfigLoader()
+    config.update(path=str(tmp_path), **config_overrides)
+    api_client = _FakeAPIClient(pages)
+
+    downloader = UserDownloader(
+        config,
+        api_client,
+        FileManager(str(tmp_path)),
+        CookieManager(str(tmp_path / '.cookies.json')),
+        database=None,
+        rate_limiter=RateLimiter(max_per_second=1000),
+        retry_handler=RetryHandler(max_retries=1),
+        queue_manager=QueueManager(max_workers=2),
+    )
+
+    async def _fake_assets(aweme, author_name, mode=None):
+        api_client.events.append(('download', aweme['aweme_id']))
+        return aweme['aweme_id'] != 'bad'
+
+    downloader._download_aweme_assets = _fake_assets
+    return downloader, api_client
+
+
+def _page(ids, next_cursor, has_more=True):
+    return {
+        'aweme_list': [{'aweme_id': i, 'create_time': 1700000000} for i in ids],
+        'max_cursor': next_cursor,
+        'has_more': has_more,
+    }
+
+
+@pytest.mark.asyncio
+async def test_downloads_start_before_last_page(tmp_path):
+    pages = {
+        0: _page(['a', 'b'], 10),
+        10: _page(['c', 'bad'], 20),
+        20: _page(['e'], 0, has_more=False),
+    }
+    downloader, api_client = _build_downloader(tmp_path, pages)
+
+    result = await downloader.download({'sec_uid': 'sec'})
+
+    assert (result.total, result.success, result.failed) == (5, 4, 1)
+    assert api_client.cursors == [0, 10, 20]
+    first_download = api_client.events.index(('download', 'a'))
+    assert first_download < api_client.events.index(('page', 20))
+
+
+@pytest.mark.asyncio
+async def test_number_limit_stops_pagination(tmp_path):
+    pages = {
+        0: _page(['a', 'b'], 10),
+        10: _page(['c', 'd'], 20),
+        20: _page(['e'], 0, has_more=False),
+    }
+    downloader, api_client = _build_downloader(tmp_path, pages, number={'post': 3})
+
+    result = await downloader.download({'sec_uid': 'sec'})
+
+    assert result.total == 3
+    assert api_client.cursors == [0, 10]
+
+
+@pytest.mark.asyncio
+async def test_downloaded_posts_pruned_per_page(tmp_path):
+    pages = {
+        0: _page(['a', 'b', 'c'], 10),
+        10: _page(['d'], 0, has_more=False),
+    }
+    downloader, api_client = _build_downloader(tmp_path, pages)
+
+    class _FakeDatabase:
+        def __init__(self):
+            self.lookups = []
+
+        async def filter_downloaded(self, aweme_ids, author_id=None):
+            ids = list(aweme_ids)
+            self.lookups.append(ids)
+            return {'a', 'c'} & set(ids)
+
+        async def is_downloaded(self, aweme_id):
+            raise AssertionError('per-item lookup should not be used')
+
+        async def get_checkpoint(self, sec_uid, mode):
+            return None
+
+        async def save_checkpoint(self, *args):
+            pass
+
+        async def clear_checkpoint(self, sec_uid, mode):
+            pass
+
+    downloader.database = _FakeDatabase()
+
+    result = await downloader.download({'sec_uid': 'sec'})
+
+    assert (result.total, result.success, result.skipped) == (4, 2, 2)
+    assert downloader.database.lookups == [['a', 'b', 'c'], ['d']]
+    downloads = [event[1] for event in api_client.events if event[0] == 'download']
+    assert sorted(downloads) == ['b', 'd']
+
+
+@pytest.mark.asyncio
+async def test_checkpoint_resumes_interrupted_crawl(tmp_path):
+    pages = {
+        0: _page(['a', 'b'], 10),
+        10: _page(['c', 'bad'], 20),
+        20: _page(['e'], 30),
+        30: _page(['f'], 0, has_more=False),
+    }
+    database = Database(str(tmp_path / 'test.db'))
+    downloader, api_client = _build_downloader(tmp_path, pages)
+    downloader.database = database
+
+    original = api_client.get_user_post
+
+    async def _dies_at_last_page(sec_uid, max_cursor=0, count=20):
+        if max_cursor == 30:
+            return None
+        return await original(sec_uid, max_cursor, count)
+
+    api_client.get_user_post = _dies_at_last_page
+    await downloader.download({'sec_uid': 'sec'})
+
+    # The page holding the failed post pins the checkpoint in front of it.
+    checkpoint = await database.get_checkpoint('sec', 'post')
+    assert checkpoint['max_cursor'] == 10 and checkpoint['has_more']
+
+    api_client.get_user_post = original
+    api_client.cursors.clear()
+    await downloader.download({'sec_uid': 'sec'})
+    assert api_client.cursors == [10, 20, 30]
+
+    api_client.cursors.clear()
+    await downloader.download({'sec_uid': 'sec'})
+    # 'bad' still fails, so the checkpoint stays put for the next run.
+    assert api_client.cursors == [10, 20, 30]
+
+    downloader.config.update(full_refresh=True)
+    api_client.cursors.clear()
+    await downloader.download({'sec_uid': 'sec'})
+    assert api_client.cursors == [0, 10, 20, 30]
+
+    await database.close()
+
+
+@pytest.mark.asyncio
+async def test_checkpoint_cleared_after_clean_crawl(tmp_path):
+    pages = {
+        0: _page(['a', 'b'], 10),
+        10: _page(['c'], 0, has_more=False),
+    }
+    database = Database(str(tmp_path / 'test.db'))
+    await database.save_checkpoint('sec', 'post', 10, True)
+    downloader, api_client = _build_downloader(tmp_path, pages)
+    downloader.database = database
+
+    await downloader.download({'sec_uid': 'sec'})
+    assert api_client.cursors == [10]
+    assert await database.get_checkpoint('sec', 'post') is None
+
+    api_client.cursors.clear()
+    await downloader.download({'sec_uid': 'sec'})
+    assert api_client.cursors == [0, 10]
+
+    await database.close()
+
+
+def _ts(day):
+    from datetime import datetime
+
+    return int(datetime.strptime(day, '%Y-%m-%d').timestamp())
+
+
+def _timed_page(posts, next_cursor, has_more=True):
+    return {
+        'aweme_list': [
+            {'aweme_id': aweme_id, 'create_time': create_time, 'is_top': int(pinned)}
+            for aweme_id, create_time, pinned in posts
+        ],
+        'max_cursor': next_cursor,
+        'has_more': has_more,
+    }
+
+
+@pytest.mark.asyncio
+async def test_time_window_jumps_to_end_and_stops_at_start(tmp_path):
+    end_cursor = (_ts('2024-03-01') + 1) * 1000
+    pages = {
+        0: _timed_page([
+            ('pinned-old', _ts('2023-01-01'), True),
+            ('pinned-in', _ts('2024-02-10'), True),
+            ('new', _ts('2024-06-01'), False),
+        ], _ts('2024-06-01') * 1000),
+        end_cursor: _timed_page([
+            ('in-1', _ts('2024-02-20'), False),
+            ('in-2', _ts('2024-02-05'), False),
+        ], _ts('2024-02-05') * 1000),
+        _ts('2024-02-05') * 1000: _timed_page([
+            ('in-3', _ts('2024-02-02'), False),
+            ('pinned-in', _ts('2024-02-10'), False),
+            ('too-old', _ts('2024-01-20'), False),
+        ], 1),
+    }
+    downloader, api_client = _build_downloader(
+        tmp_path, pages, start_time='2024-02-01', end_time='2024-03-01'
+    )
+
+    result = await downloader.download({'sec_uid': 'sec'})
+
+    # Page 0 is still read for pinned posts, then the crawl jumps to end_time and stops below start_time.
+    assert api_client.cursors == [0, end_cursor, _ts('2024-02-05') * 1000]
+    downloads = sorted(event[1] for event in api_client.events if event[0] == 'download')
+    assert downloads == ['in-1', 'in-2', 'in-3', 'pinned-in']
+    assert result.total == 4
+
+
+@pytest.mark.asyncio
+async def test_old_pinned_post_does_not_end_increment_crawl(tmp_path):
+    pages = {
+        0: _timed_page([('pinned', 100, True), ('a', 300, False)], 10),
+        10: _timed_page([('b', 250, False), ('known', 200, False)], 20),
+    }
+    downloader, api_client = _build_downloader(tmp_path, pages)
+
+    pages_seen = []
+    async for _index, page, _cursor, _final in downloader._iter_user_post_pages('sec', latest_time=200):
+        pages_seen.append([aweme['aweme_id'] for aweme in page])
+
+    assert pages_seen == [['a'], ['b']]
+    assert api_client.cursors == [0, 10]
+
+
+class _TimelineAPIClient(_FakeAPIClient):
+    # Serves a newest-first timeline where max_cursor is a millisecond timestamp.
+    def __init__(self, create_times, page_size=20):
+        super().__init__({})
+        self.timeline = sorted(create_times, reverse=True)
+        self.page_size = page_size
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    async def get_user_info(self, sec_uid):
+        return {'uid': 'uid-1', 'nickname': 'Author', 'aweme_count': len(self.timeline)}
+
+    async def get_user_post(self, sec_uid, max_cursor=0, count=20):
+        self.cursors.append(max_cursor)
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        await asyncio.sleep(0.005)
+        self.in_flight -= 1
+
+        older = [t for t in self.timeline if not max_cursor or t * 1000 < max_cursor]
+        page = older[:self.page_size]
+        return {
+            'aweme_list': [{'aweme_id': str(t), 'create_time': t} for t in page],
+            'max_cursor': page[-1] * 1000 if page else 0,
+            'has_more': len(older) > len(page),
+        }
+
+
+async def _list_ids(downloader, sec_uid='sec'):
+    user_info = await downloader.api_client.get_user_info(sec_uid)
+    planned = []
+    ids = []
+    async for _index, page, _cursor, _final in downloader._iter_user_post_pages(
+        sec_uid, 0, None, downloader._parallel_listing(user_info), planned.extend
+    ):
+        ids.extend(aweme['aweme_id'] for aweme in page)
+    return planned, ids
+
+
+@pytest.mark.asyncio
+async def test_parallel_windows_list_same_posts(tmp_path):
+    import random
+
+    rng = random.Random(7)
+    create_times = rng.sample(range(1500000000, 1700000000), 500)
+    downloader, _ = _build_downloader(tmp_path, {}, listing_windows=1)
+    downloader.api_client = _TimelineAPIClient(create_times)
+    _, sequential = await _list_ids(downloader)
+
+    downloader, _ = _build_downloader(tmp_path, {}, listing_windows=4)
+    api_client = downloader.api_client = _TimelineAPIClient(create_times)
+    windows, parallel = await _list_ids(downloader)
+
+    assert len(windows) == 4
+    assert sorted(parallel) == sorted(sequential)
+    assert len(parallel) == len(set(parallel)) == 500
+    assert api_client.peak_in_flight > 1
+
+
+@pytest.mark.asyncio
+async def test_small_accounts_list_sequentially(tmp_path):
+    downloader, _ = _build_downloader(tmp_path, {}, listing_windows=4)
+    downloader.api_client = _TimelineAPIClient(range(1600000000, 1600000050))
+
+    windows, ids = await _list_ids(downloader)
+
+    assert windows == [(0, None)]
+    assert len(ids) == 50
+
+
+@pytest.mark.asyncio
+async def test_parallel_crawl_checkpoint_covers_failed_post(tmp_path):
+    create_times = list(range(1600000000, 1600000000 + 300 * 3600, 3600))
+    failing = str(create_times[40])
+    database = Database(str(tmp_path / 'test.db'))
+    downloader, _ = _build_downloader(tmp_path, {}, listing_windows=4)
+    downloader.api_client = _TimelineAPIClient(create_times)
+    downloader.database = database
+
+    async def _fake_assets(aweme, author_name, mode=None):
+        return aweme['aweme_id'] != failing
+
+    downloader._download_aweme_assets = _fake_assets
+
+    result = await downloader.download({'sec_uid': 'sec'})
+
+    assert (result.total, result.failed) == (300, 1)
+    checkpoint = await database.get_checkpoint('sec', 'post')
+    # Resuming walks down from the checkpoint, so it must sit above the failed post.
+    assert checkpoint['max_cursor'] > int(failing) * 1000
+
+    async def _all_succeed(aweme, author_name, mode=None):
+        return True
+
+    downloader._download_aweme_assets = _all_succeed
+    await downloader.download({'sec_uid': 'sec'})
+    assert await database.get_checkpoint('sec', 'post') is None
+
+    await database.close()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_links_share_slots_and_download_overlap_once(tmp_path):
+    config = ConfigLoader()
+    config.update(path=str(tmp_path))
+    file_manager = FileManager(str(tmp_path))
+    rate_limiter = RateLimiter(max_per_second=1000)
+    retry_handler = RetryHandler(max_retries=1)
+    # Fewer slots than either link has posts, shared by both links.
+    queue_manager = QueueManager(max_workers=2)
+    registry = AwemeRegistry()
+    fetched = []
+    in_flight = {'now': 0, 'peak': 0}
+
+    async def _fake_fetch(aweme, author_name, mode=None):
+        in_flight['now'] += 1
+        in_flight['peak'] = max(in_flight['peak'], in_flight['now'])
+        fetched.append(aweme['aweme_id'])
+        await asyncio.sleep(0.02)
+        in_flight['now'] -= 1
+        save_dir = tmp_path / author_name / aweme['aweme_id']
+        save_dir.mkdir(parents=True, exist_ok=True)
+        video = save_dir / f"{aweme['aweme_id']}.mp4"
+        video.write_bytes(aweme['aweme_id'].encode())
+        return AwemeOutputs(aweme['aweme_id'], 'no_title', author_name, save_dir, [video])
+
+    def _link(nickname, ids):
+        downloader = UserDownloader(
+            config,
+            _FakeAPIClient({0: _page(ids, 0, has_more=False)}, nickname=nickname),
+            file_manager,
+            CookieManager(str(tmp_path / '.cookies.json')),
+            database=None,
+            rate_limiter=rate_limiter,
+            retry_handler=retry_handler,
+            queue_manager=queue_manager,
+            aweme_registry=registry,
+        )
+        downloader._fetch_aweme_outputs = _fake_fetch
+        return downloader
+
+    links = [
+        _link('Alice', ['a1', 'shared-1', 'a2', 'shared-2', 'a3']),
+        _link('Bob', ['shared-2', 'b1', 'shared-1', 'b2']),
+    ]
+    results = [None, None]
+
+    async def _run_link(entry):
+        index, downloader = entry
+        results[index] = await downloader.download({'sec_uid': f'sec-{index}'})
+
+    link_manager = QueueManager(max_workers=2)
+    await asyncio.wait_for(link_manager.run_stream(_run_link, enumerate(links)), timeout=5)
+
+    assert [(r.total, r.success, r.failed) for r in results] == [(5, 5, 0), (4, 4, 0)]
+    assert sorted(fetched) == ['a1', 'a2', 'a3', 'b1', 'b2', 'shared-1', 'shared-2']
+    assert registry.reused == 2
+    assert in_flight['peak'] <= 2
+    assert queue_manager.semaphore._value == 2
+
+
+@pytest.mark.asyncio
+async def test_open_post_circuit_pauses_listing_instead_of_ending_it(tmp_path):
+    pages = {
+        0: _page(['a', 'b'], 10),
+        10: _page(['c'], 0, has_more=False),
+    }
+    downloader, api_client = _build_downloader(tmp_path, pages)
+    original = api_client.get_user_post
+    refusals = [CircuitOpenResponse('post', 0.01)] * 2
+
+    async def _shedding(sec_uid, max_cursor=0, count=20):
+        if max_cursor == 10 and refusals:
+            return refusals.pop()
+        return await original(sec_uid, max_cursor, count)
+
+    api_client.get_user_post = _shedding
+
+    result = await downloader.download({'sec_uid': 'sec'})
+
+    assert (result.total, result.success, result.incomplete) == (3, 3, 0)
+    assert api_client.cursors == [0, 10]
+
+
+@pytest.mark.asyncio
+async def test_listing_that_cannot_finish_is_reported_incomplete(tmp_path, monkeypatch):
+    monkeypatch.setattr(user_downloader_module, 'CIRCUIT_MAX_WAIT', 0.05)
+    pages = {
+        0: _page(['a', 'b'], 10),
+        10: _page(['c'], 0, has_more=False),
+    }
+    database = Database(str(tmp_path / 'test.db'))
+    downloader, api_client = _build_downloader(tmp_path, pages)
+    downloader.database = database
+    original = api_client.get_user_post
+
+    async def _stays_open(sec_uid, max_cursor=0, count=20):
+        if max_cursor == 10:
+            return CircuitOpenResponse('post', 0.01)
+        return await original(sec_uid, max_cursor, count)
+
+    api_client.get_user_post = _stays_open
+
+    result = await downloader.download({'sec_uid': 'sec'})
+
+    assert (result.total, result.success, result.incomplete) == (2, 2, 1)
+    assert 'Incomplete listings: 1' in str(result)
+    # The next run resumes at the page that never came back.
+    checkpoint = await database.get_checkpoint('sec', 'post')
+    assert checkpoint['max_cursor'] == 10 and checkpoint['has_more']
+
+    await database.close()
+
+
+@pytest.mark.asyncio
+async def test_parallel_crawl_resume_lists_only_unfinished_windows(tmp_path):
+    create_times = list(range(1480000000, 1700000000, 550000))
+    # A failed post interrupts the newest window; the three older windows finish.
+    failing = str(create_times[-30])
+    database = Database(str(tmp_path / 'test.db'))
+    downloader, _ = _build_downloader(tmp_path, {}, listing_windows=4)
+    api_client = downloader.api_client = _TimelineAPIClient(create_times)
+    downloader.database = database
+
+    async def _fake_assets(aweme, author_name, mode=None):
+        return aweme['aweme_id'] != failing
+
+    downloader._download_aweme_assets = _fake_assets
+    await downloader.download({'sec_uid': 'sec'})
+    first_run = len(api_client.cursors)
+
+    checkpoint = await database.get_checkpoint('sec', 'post')
+    assert [finished for _, _, finished in checkpoint['windows']] == [False, True, True, True]
+    resume_cursor, lower, _ = checkpoint['windows'][0]
+
+    for _ in range(2):
+        api_client.cursors.clear()
+        result = await downloader.download({'sec_uid': 'sec'})
+
+        # Only the unfinished window is listed again, from its own cursor down to its lower bound.
+        assert api_client.cursors[0] == resume_cursor
+        assert all(cursor > lower * 1000 for cursor in api_client.cursors)
+        assert len(api_client.cursors) * 3 < first_run
+        assert result.failed == 1
+
+    await database.close()
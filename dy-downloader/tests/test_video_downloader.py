@@ -1,14 +1,17 @@
+import asyncio
+
 import pytest
 
 from auth import CookieManager
 from config import ConfigLoader
-from control import QueueManager, RateLimiter, RetryHandler
+from control import AwemeRegistry, QueueManager, RateLimiter, RetryHandler
 from core.api_client import DouyinAPIClient
+from core.user_downloader import UserDownloader
 from core.video_downloader import VideoDownloader
 from storage import FileManager
 
 
-def _build_downloader(tmp_path):
+def _build_downloader(tmp_path, aweme_registry=None):
     config = ConfigLoader()
     config.update(path=str(tmp_path))
 
@@ -25,6 +28,7 @@ def _build_downloader(tmp_path):
         rate_limiter=RateLimiter(max_per_second=5),
         retry_handler=RetryHandler(max_retries=1),
         queue_manager=QueueManager(max_workers=1),
+        aweme_registry=aweme_registry,
     )
 
     return downloader, api_client
@@ -79,3 +83,125 @@ async def test_build_no_watermark_url_signs_with_headers(tmp_path, monkeypatch):
     assert headers['Referer'].startswith('https://www.douyin.com')
 
     await api_client.close()
+
+
+@pytest.mark.asyncio
+async def test_duplicate_aweme_across_links_downloads_once(tmp_path):
+    registry = AwemeRegistry()
+    first, first_client = _build_downloader(tmp_path / 'a', registry)
+    second, second_client = _build_downloader(tmp_path / 'b', registry)
+    detail_calls = []
+    asset_calls = []
+
+    aweme = {
+        'aweme_id': '42',
+        'desc': 'dup',
+        'author': {'nickname': 'creator'},
+        'video': {'play_addr': {'url_list': ['https://cdn.example.com/42.mp4']}},
+    }
+
+    async def _fake_detail(aweme_id):
+        detail_calls.append(aweme_id)
+        await asyncio.sleep(0.01)
+        return aweme
+
+    async def _fake_asset(self, candidates, path, session, **kwargs):
+        asset_calls.append(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b'video')
+        return True
+
+    async def _fake_session():
+        return None
+
+    for downloader, client in ((first, first_client), (second, second_client)):
+        client.get_video_detail = _fake_detail
+        client.get_download_session = _fake_session
+        downloader._download_asset = _fake_asset.__get__(downloader, VideoDownloader)
+        downloader.config.update(json=False, cover=False, music=False, avatar=False)
+
+    results = await asyncio.gather(
+        first.download({'aweme_id': '42'}),
+        second.download({'aweme_id': '42'}),
+    )
+
+    assert [result.success for result in results] == [1, 1]
+    assert detail_calls == ['42']
+    assert len(asset_calls) == 1
+    assert registry.reused == 1
+    settled = registry._entries['42'].result()
+    assert not hasattr(settled, 'aweme_data')
+    assert [path.name for path in settled.files] == ['dup_42.mp4']
+    assert len(list((tmp_path / 'a').rglob('*.mp4'))) == 1
+    assert len(list((tmp_path / 'b').rglob('*.mp4'))) == 1
+
+    await first_client.close()
+    await second_client.close()
+
+
+@pytest.mark.asyncio
+async def test_video_and_user_links_sharing_one_slot_do_not_deadlock(tmp_path):
+    registry = AwemeRegistry()
+    queue_manager = QueueManager(max_workers=1)
+    aweme = {
+        'aweme_id': '42',
+        'desc': 'dup',
+        'create_time': 1700000000,
+        'author': {'nickname': 'creator'},
+        'video': {'play_addr': {'url_list': ['https://cdn.example.com/42.mp4']}},
+    }
+    asset_calls = []
+
+    class _SharedAPIClient:
+        BASE_URL = 'https://www.douyin.com'
+        headers = {'User-Agent': 'UnitTestAgent/1.0'}
+
+        async def get_video_detail(self, aweme_id):
+            # Slower than the user listing, so the user link's worker is already parked on
+            # the claim when the video link wants its slot.
+            await asyncio.sleep(0.05)
+            return aweme
+
+        async def get_user_info(self, sec_uid):
+            return {'uid': 'uid-1', 'nickname': 'creator'}
+
+        async def get_user_post(self, sec_uid, max_cursor=0, count=20):
+            return {'aweme_list': [aweme], 'max_cursor': 0, 'has_more': False}
+
+        async def get_download_session(self):
+            return None
+
+    async def _fake_asset(self, candidates, path, session, **kwargs):
+        asset_calls.append(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b'video')
+        return True
+
+    api_client = _SharedAPIClient()
+    downloaders = []
+    for cls in (VideoDownloader, UserDownloader):
+        config = ConfigLoader()
+        config.update(path=str(tmp_path), json=False, cover=False, music=False, avatar=False)
+        downloader = cls(
+            config,
+            api_client,
+            FileManager(str(tmp_path)),
+            CookieManager(str(tmp_path / '.cookies.json')),
+            database=None,
+            rate_limiter=RateLimiter(max_per_second=1000),
+            retry_handler=RetryHandler(max_retries=1),
+            queue_manager=queue_manager,
+            aweme_registry=registry,
+        )
+        downloader._download_asset = _fake_asset.__get__(downloader, cls)
+        downloaders.append(downloader)
+
+    video, user = downloaders
+    results = await asyncio.wait_for(
+        asyncio.gather(video.download({'aweme_id': '42'}), user.download({'sec_uid': 'sec'})),
+        timeout=3,
+    )
+
+    assert [result.success for result in results] == [1, 1]
+    assert len(asset_calls) == 1
+    assert registry.reused == 1
@@ -0,0 +1,103 @@
+import asyncio
+import os
+import threading
+
+import pytest
+
+import storage.write_sink as write_sink
+
+from storage import WriteSink
+
+
+@pytest.mark.asyncio
+async def test_sink_coalesces_chunks_and_writes_at_offset(tmp_path):
+    sink = WriteSink(buffer_size=1024, memory_budget=2048)
+    target = tmp_path / 'out.bin'
+    target.write_bytes(b'x' * 100)
+
+    async with sink.open(target, offset=100) as writer:
+        for i in range(50):
+            await writer.write(bytes([i]) * 100)
+
+    data = target.read_bytes()
+    assert data[:100] == b'x' * 100
+    assert data[100:] == b''.join(bytes([i]) * 100 for i in range(50))
+    assert writer.bytes_written == 5000
+    sink.close()
+
+
+@pytest.mark.asyncio
+async def test_sink_truncates_and_releases_budget(tmp_path):
+    sink = WriteSink(buffer_size=1024, memory_budget=1024)
+    target = tmp_path / 'out.bin'
+    target.write_bytes(b'old' * 1000)
+
+    async with sink.open(target, truncate=True) as writer:
+        await writer.write(b'a' * 3000)
+
+    assert target.read_bytes() == b'a' * 3000
+    assert sink._get_budget()._value == 1
+    sink.close()
+
+
+@pytest.mark.asyncio
+async def test_filling_buffers_count_against_budget(tmp_path):
+    sink = WriteSink(buffer_size=1024, memory_budget=2048)
+    first = await sink.open(tmp_path / 'a.bin', truncate=True).__aenter__()
+    second = await sink.open(tmp_path / 'b.bin', truncate=True).__aenter__()
+    third = await sink.open(tmp_path / 'c.bin', truncate=True).__aenter__()
+
+    # Two half-full buffers already hold the whole budget, nothing is in flight yet.
+    await first.write(b'a' * 10)
+    await second.write(b'b' * 10)
+    blocked = asyncio.create_task(third.write(b'c' * 10))
+    await asyncio.sleep(0.05)
+    assert not blocked.done()
+
+    await first.__aexit__(None, None, None)
+    await asyncio.wait_for(blocked, timeout=1)
+    await second.__aexit__(None, None, None)
+    await third.__aexit__(None, None, None)
+
+    assert (tmp_path / 'c.bin').read_bytes() == b'c' * 10
+    assert sink._get_budget()._value == 2
+    sink.close()
+
+
+@pytest.mark.asyncio
+async def test_cancelled_writer_waits_for_pwrite_before_closing(tmp_path, monkeypatch):
+    started = threading.Event()
+    release = threading.Event()
+    seen = []
+    original = write_sink._pwrite_all
+
+    def _slow_pwrite(fd, data, offset):
+        started.set()
+        release.wait(2)
+        # Raises EBADF if the fd was closed underneath the write.
+        os.fstat(fd)
+        original(fd, data, offset)
+        seen.append(len(data))
+
+    monkeypatch.setattr(write_sink, '_pwrite_all', _slow_pwrite)
+    sink = WriteSink(buffer_size=1024, memory_budget=1024)
+    target = tmp_path / 'out.bin'
+
+    async def _write():
+        async with sink.open(target, truncate=True) as writer:
+            await writer.write(b'a' * 1024)
+
+    task = asyncio.create_task(_write())
+    while not started.is_set():
+        await asyncio.sleep(0.01)
+    # The task is now parked in __aexit__ waiting on the in-flight write.
+    task.cancel()
+    await asyncio.sleep(0.05)
+    assert not task.done()
+
+    release.set()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert seen == [1024]
+    assert target.read_bytes() == b'a' * 1024
+    sink.close()
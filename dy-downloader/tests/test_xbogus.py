@@ -1,4 +1,60 @@
-from utils.xbogus import generate_x_bogus
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+import utils.xbogus as xbogus_module
+from core.api_client import DouyinAPIClient
+from utils.xbogus import Signer, XBogus, generate_x_bogus, get_signer, register_signer
+
+CHROME_123 = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36"
+)
+SAFARI_17 = (
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 "
+    "(KHTML, like Gecko) Version/17.0 Safari/605.1.15"
+)
+
+# Produced by the original list-based implementation at the given timestamps.
+GOLDEN = [
+    (
+        "https://www.douyin.com/aweme/v1/web/aweme/detail/?aweme_id=7300000000000000001&aid=1128",
+        None,
+        1700000000,
+        "DFSzswVY8LvANxu0tmWx-e9WX7Je",
+    ),
+    (
+        "https://www.douyin.com/aweme/v1/web/aweme/post/?sec_user_id=MS4wLjABAAAA&max_cursor=0&count=20",
+        CHROME_123,
+        1712345678,
+        "DFSzswVYLGsANnTJt5wIKl9WX7nY",
+    ),
+    (
+        "https://www.douyin.com/aweme/v1/play/?video_id=v0200fg10000&ratio=1080p&watermark=0",
+        SAFARI_17,
+        0,
+        "DFSzswVY05JANGfTLa3g-e9WX7nS",
+    ),
+    # Inputs of 32 chars or fewer are read as hex by the reference signer.
+    ("d41d8cd98f00b204e9800998ecf8427e", None, 4102444800, "DFSzswVYvqTANxu02rQ3-e9WX7r1"),
+]
+
+CHROME_109 = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/109.0.0.0 Safari/537.36"
+)
+
+# Produced by the apiproxy Utils.get_xbogus implementation (query string, UA, form body).
+LEGACY_GOLDEN = [
+    ("aweme_id=7300000000000000001&device_platform=webapp&aid=6383", CHROME_109, "", 1700000000,
+     "DFSzswVOxEhAN9ILtmWx-VXAIQ2x"),
+    ("sec_user_id=MS4wLjABAAAA&count=35&max_cursor=0&aid=1128&version_name=23.5.0&device_platform=android"
+     "&os_version=2333", CHROME_109, "", 1712345678, "DFSzswVOhd2AN9ILt5wIKRXAIQRt"),
+    ("web_rid=123&aid=6383", SAFARI_17, "form=1", 0, "DFSzswVOwn8QuC4zLa3g-VXAIQ-Y"),
+    ("a=1&keyword=抖音", "short", "", 4102444800, "DFSzswVOtp0AN9bp2rQ3-VXAIQ2u"),
+]
 
 
 def test_generate_x_bogus_appends_parameter():
@@ -9,3 +65,77 @@ def test_generate_x_bogus_appends_parameter():
     assert "X-Bogus=" in signed_url
     assert isinstance(token, str) and len(token) > 10
     assert isinstance(ua, str) and "Mozilla" in ua
+
+
+@pytest.mark.parametrize("url, user_agent, timestamp, expected", GOLDEN)
+def test_x_bogus_matches_reference_output(monkeypatch, url, user_agent, timestamp, expected):
+    monkeypatch.setattr(time, "time", lambda: timestamp + 0.5)
+
+    signed_url, token, ua = XBogus(user_agent).build(url)
+
+    assert token == expected
+    assert signed_url == f"{url}&X-Bogus={expected}"
+    assert ua == (user_agent or XBogus().user_agent)
+
+
+def test_signer_is_stable_across_calls(monkeypatch):
+    monkeypatch.setattr(time, "time", lambda: 1700000000.0)
+    signer = XBogus(CHROME_123)
+    url = GOLDEN[1][0]
+
+    assert len({signer.build(url)[1] for _ in range(5)}) == 1
+
+
+@pytest.mark.parametrize("query, user_agent, form, timestamp, expected", LEGACY_GOLDEN)
+def test_legacy_variant_matches_reference_output(monkeypatch, query, user_agent, form, timestamp, expected):
+    monkeypatch.setattr(time, "time", lambda: timestamp + 0.5)
+
+    signer = get_signer("xbogus-legacy")
+
+    assert signer.token(query, user_agent, form) == expected
+    assert signer.sign(query, user_agent, form) == f"{query}&X-Bogus={expected}"
+
+
+def test_api_client_signs_through_registered_signer(monkeypatch):
+    class _StubSigner(Signer):
+        param = "a_bogus"
+
+        def token(self, url, user_agent, form=""):
+            return "stub"
+
+    monkeypatch.setattr(xbogus_module, "_SIGNERS", dict(xbogus_module._SIGNERS))
+    monkeypatch.setattr(xbogus_module, "_default_signer", "xbogus")
+    register_signer("stub", _StubSigner(), default=True)
+
+    client = DouyinAPIClient({})
+    signed_url, ua = client.sign_url("https://www.douyin.com/aweme/v1/web/aweme/detail/?aweme_id=1")
+
+    assert signed_url.endswith("&a_bogus=stub")
+    assert ua == client.headers["User-Agent"]
+
+
+def test_signer_requires_token():
+    class _Incomplete(Signer):
+        pass
+
+    with pytest.raises(TypeError):
+        _Incomplete()
+
+
+
+def test_legacy_client_signs_through_registered_signer(monkeypatch):
+    pytest.importorskip("requests")
+    # The legacy client lives at the repository root; appended so this tree's utils still wins.
+    monkeypatch.setattr(sys, "path", sys.path + [str(Path(__file__).resolve().parents[2])])
+    from apiproxy.common.utils import Utils, _xbogus
+
+    class _StubSigner(_xbogus.Signer):
+        def token(self, url, user_agent, form=""):
+            return "stub"
+
+    monkeypatch.setattr(_xbogus, "_SIGNERS", dict(_xbogus._SIGNERS))
+    # Registered after apiproxy was imported: the legacy client must still pick it up.
+    _xbogus.register_signer("xbogus-legacy", _StubSigner())
+
+    assert Utils().getXbogus("aweme_id=1") == "aweme_id=1&X-Bogus=stub"
+    assert Utils().get_xbogus("aweme_id=1", "ua", "") == "stub"
@@ -0,0 +1,74 @@
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+from typing import Optional, Sequence
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from storage.database import Database  # noqa: E402
+from utils.helpers import format_size  # noqa: E402
+
+
+DEFAULT_DB = Path("dy_downloader.db")
+
+
+def parse_args(argv: Sequence[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Compress inline aweme metadata of an existing database into the aweme_metadata table.",
+    )
+    parser.add_argument(
+        "--db",
+        type=Path,
+        default=DEFAULT_DB,
+        help=f"SQLite database to migrate (default: {DEFAULT_DB})",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=500,
+        help="Rows moved per transaction batch (default: 500)",
+    )
+    parser.add_argument(
+        "--no-vacuum",
+        action="store_true",
+        help="Skip VACUUM afterwards (the file keeps its size until the next VACUUM)",
+    )
+    return parser.parse_args(argv)
+
+
+async def migrate(args: argparse.Namespace) -> int:
+    if not args.db.exists():
+        print(f"[ERROR] Database not found: {args.db}", file=sys.stderr)
+        return 1
+
+    size_before = args.db.stat().st_size
+    database = Database(str(args.db))
+    try:
+        stats = await database.migrate_metadata(chunk_size=args.chunk_size)
+        if stats["rows"] and not args.no_vacuum:
+            print("[INFO] Running VACUUM to reclaim space...")
+            await database.vacuum()
+    finally:
+        await database.close()
+
+    if not stats["rows"]:
+        print("[INFO] Nothing to migrate: no inline metadata left.")
+        return 0
+
+    ratio = stats["stored_bytes"] / stats["raw_bytes"] if stats["raw_bytes"] else 0
+    print(
+        f"[INFO] Migrated {stats['rows']} row(s): "
+        f"{format_size(stats['raw_bytes'])} -> {format_size(stats['stored_bytes'])} ({ratio:.0%})"
+    )
+    print(f"[INFO] Database file: {format_size(size_before)} -> {format_size(args.db.stat().st_size)}")
+    return 0
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = parse_args(argv or sys.argv[1:])
+    return asyncio.run(migrate(args))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
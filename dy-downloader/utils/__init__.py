@@ -1,7 +1,7 @@
 from .logger import setup_logger
 from .validators import validate_url, sanitize_filename
 from .helpers import parse_timestamp, format_size
-from .xbogus import generate_x_bogus, XBogus
+from .xbogus import generate_x_bogus, get_signer, register_signer, Signer, XBogus
 
 __all__ = [
     'setup_logger',
@@ -11,4 +11,7 @@ __all__ = [
     'format_size',
     'generate_x_bogus',
     'XBogus',
+    'Signer',
+    'get_signer',
+    'register_signer',
 ]
@@ -19,180 +19,166 @@
 import base64
 import hashlib
 import time
-from typing import List, Optional, Tuple, Union
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+DEFAULT_USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36"
+)
+
+# fmt: off
+_HEX_VALUES = [
+    None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None,
+    None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None,
+    None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None,
+    0, 1, 2, 3, 4, 5, 6, 7, 8, 9, None, None, None, None, None, None, None, None, None, None, None,
+    None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None,
+    None, None, None, None, None, None, None, None, None, None, None, None, 10, 11, 12, 13, 14, 15
+]
+_CHARACTER = "Dkdpgh4ZKsQB80/Mfvw36XI1R25-WUAlEi7NLboqYTOPuzmFjJnryx9HVGcaStCe="
+# fmt: on
+
+# The X-Bogus alphabet is standard base64 with the characters permuted.
+_TO_XB = bytes.maketrans(
+    b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/",
+    _CHARACTER[:64].encode("ascii"),
+)
+
+
+def _hex_quirk_input(text: str) -> bytes:
+    # Longer strings are hashed as Latin-1 bytes; up to 32 chars they are read as lowercase
+    # hex, a quirk of the web signer kept so outputs (and failures) stay identical.
+    if len(text) > 32:
+        return text.encode("ISO-8859-1")
+    return bytes(
+        (_HEX_VALUES[ord(text[idx])] << 4) | _HEX_VALUES[ord(text[idx + 1])]
+        for idx in range(0, len(text), 2)
+    )
+
+
+def _utf8_input(text: str) -> bytes:
+    return text.encode("utf-8")
+
+
+def _double_md5(data: bytes) -> bytes:
+    return hashlib.md5(hashlib.md5(data).digest()).digest()
+
+
+def _rc4_keystream(key: bytes, length: int) -> bytes:
+    s = bytearray(range(256))
+    j = 0
+    for i in range(256):
+        j = (j + s[i] + key[i % len(key)]) & 255
+        s[i], s[j] = s[j], s[i]
+
+    stream = bytearray(length)
+    i = j = 0
+    for n in range(length):
+        i = (i + 1) & 255
+        j = (j + s[i]) & 255
+        s[i], s[j] = s[j], s[i]
+        stream[n] = s[(s[i] + s[j]) & 255]
+    return bytes(stream)
+
+
+def _rc4(key: bytes, data: bytes) -> bytes:
+    stream = _rc4_keystream(key, len(data))
+    return bytes(a ^ b for a, b in zip(data, stream))
+
+
+# Constant across calls: the 19-byte payload is always encrypted under the key 0xff.
+_PAYLOAD_STREAM = _rc4_keystream(b"\xff", 19)
+
+
+class Signer(ABC):
+    # Call sites only use sign(); anything that can produce a query parameter from the URL,
+    # user agent and form body (a faster X-Bogus, A-Bogus) can be registered in its place.
+    param = "X-Bogus"
+
+    @abstractmethod
+    def token(self, url: str, user_agent: str, form: str = "") -> str:
+        ...
+
+    def sign(self, url: str, user_agent: str, form: str = "") -> str:
+        return f"{url}&{self.param}={self.token(url, user_agent, form)}"
+
+
+class XBogusSigner(Signer):
+    def __init__(self, ua_key: bytes, version: int, canvas: int, hex_quirk: bool):
+        self.ua_key = ua_key
+        self.version = version
+        self.canvas = canvas.to_bytes(4, "big")
+        self._input = _hex_quirk_input if hex_quirk else _utf8_input
+        # Per-UA and per-form salts are pure functions of their input: compute each once.
+        self._ua_salt = lru_cache(maxsize=64)(self._compute_ua_salt)
+        self._form_salt = lru_cache(maxsize=64)(self._compute_form_salt)
+
+    def _compute_ua_salt(self, user_agent: str) -> bytes:
+        encoded = base64.b64encode(_rc4(self.ua_key, user_agent.encode("ISO-8859-1")))
+        if self._input is _hex_quirk_input:
+            encoded = _hex_quirk_input(encoded.decode("ISO-8859-1"))
+        return hashlib.md5(encoded).digest()[14:16]
+
+    def _compute_form_salt(self, form: str) -> bytes:
+        return _double_md5(self._input(form))[14:16]
+
+    def token(self, url: str, user_agent: str, form: str = "") -> str:
+        ua_salt = self._ua_salt(user_agent)
+        url_salt = _double_md5(self._input(url))[14:16]
+        timer = int(time.time())
+
+        payload = bytearray(19)
+        payload[0:4] = bytes((64, 0, 1, self.version))
+        payload[4:6] = url_salt
+        payload[6:8] = self._form_salt(form)
+        payload[8:10] = ua_salt
+        payload[10:14] = (timer & 0xFFFFFFFF).to_bytes(4, "big")
+        payload[14:18] = self.canvas
+        checksum = 0
+        for value in payload[:18]:
+            checksum ^= value
+        payload[18] = checksum
+
+        garbled = b"\x02\xff" + bytes(a ^ b for a, b in zip(payload, _PAYLOAD_STREAM))
+        return base64.b64encode(garbled).translate(_TO_XB).decode("ascii")
+
+
+# 'xbogus' is the web variant DouyinAPIClient has always sent; 'xbogus-legacy' is the one the
+# apiproxy Douyin client sends with its query strings.
+_SIGNERS: Dict[str, Signer] = {
+    "xbogus": XBogusSigner(b"\x00\x01\x0c", 12, 536919696, hex_quirk=True),
+    "xbogus-legacy": XBogusSigner(b"\x00\x01\x0e", 14, 1489154074, hex_quirk=False),
+}
+_default_signer = "xbogus"
+
+
+def register_signer(name: str, signer: Signer, default: bool = False):
+    global _default_signer
+    _SIGNERS[name] = signer
+    if default:
+        _default_signer = name
+
+
+def get_signer(name: Optional[str] = None) -> Signer:
+    return _SIGNERS[name or _default_signer]
 
 
 class XBogus:
     def __init__(self, user_agent: Optional[str] = None) -> None:
-        # fmt: off
-        self._array = [
-            None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None,
-            None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None,
-            None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None,
-            0, 1, 2, 3, 4, 5, 6, 7, 8, 9, None, None, None, None, None, None, None, None, None, None, None,
-            None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None,
-            None, None, None, None, None, None, None, None, None, None, None, None, 10, 11, 12, 13, 14, 15
-        ]
-        self._character = "Dkdpgh4ZKsQB80/Mfvw36XI1R25-WUAlEi7NLboqYTOPuzmFjJnryx9HVGcaStCe="
-        # fmt: on
-        self._ua_key = b"\x00\x01\x0c"
-        self._user_agent = (
-            user_agent
-            if user_agent
-            else (
-                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36"
-            )
-        )
+        self._user_agent = user_agent if user_agent else DEFAULT_USER_AGENT
 
     @property
     def user_agent(self) -> str:
         return self._user_agent
 
-    def _md5_str_to_array(self, md5_str: str) -> List[int]:
-        if isinstance(md5_str, str) and len(md5_str) > 32:
-            return [ord(char) for char in md5_str]
-
-        array: List[int] = []
-        idx = 0
-        while idx < len(md5_str):
-            array.append(
-                (self._array[ord(md5_str[idx])] << 4)
-                | self._array[ord(md5_str[idx + 1])]
-            )
-            idx += 2
-        return array
-
-    def _md5(self, input_data: Union[str, List[int]]) -> str:
-        if isinstance(input_data, str):
-            data = self._md5_str_to_array(input_data)
-        else:
-            data = input_data
-        md5_hash = hashlib.md5()
-        md5_hash.update(bytes(data))
-        return md5_hash.hexdigest()
-
-    def _md5_encrypt(self, url_path: str) -> List[int]:
-        hashed = self._md5(self._md5_str_to_array(self._md5(url_path)))
-        return self._md5_str_to_array(hashed)
-
-    def _encoding_conversion(
-        self, a, b, c, e, d, t, f, r, n, o, i, _, x, u, s, l, v, h, p
-    ) -> str:
-        payload = [a]
-        payload.append(int(i))
-        payload.extend([b, _, c, x, e, u, d, s, t, l, f, v, r, h, n, p, o])
-        return bytes(payload).decode("ISO-8859-1")
-
-    def _encoding_conversion2(self, a: int, b: int, c: str) -> str:
-        return chr(a) + chr(b) + c
-
     @staticmethod
     def _rc4_encrypt(key: bytes, data: bytes) -> bytearray:
-        s = list(range(256))
-        j = 0
-        encrypted = bytearray()
-
-        for i in range(256):
-            j = (j + s[i] + key[i % len(key)]) % 256
-            s[i], s[j] = s[j], s[i]
-
-        i = j = 0
-        for byte in data:
-            i = (i + 1) % 256
-            j = (j + s[i]) % 256
-            s[i], s[j] = s[j], s[i]
-            encrypted.append(byte ^ s[(s[i] + s[j]) % 256])
-
-        return encrypted
-
-    def _calculation(self, a1: int, a2: int, a3: int) -> str:
-        x3 = ((a1 & 255) << 16) | ((a2 & 255) << 8) | (a3 & 255)
-        return (
-            self._character[(x3 & 16515072) >> 18]
-            + self._character[(x3 & 258048) >> 12]
-            + self._character[(x3 & 4032) >> 6]
-            + self._character[x3 & 63]
-        )
+        return bytearray(_rc4(key, data))
 
     def build(self, url: str) -> Tuple[str, str, str]:
-        ua_md5_array = self._md5_str_to_array(
-            self._md5(
-                base64.b64encode(
-                    self._rc4_encrypt(
-                        self._ua_key, self._user_agent.encode("ISO-8859-1")
-                    )
-                ).decode("ISO-8859-1")
-            )
-        )
-
-        empty_md5_array = self._md5_str_to_array(
-            self._md5(self._md5_str_to_array("d41d8cd98f00b204e9800998ecf8427e"))
-        )
-        url_md5_array = self._md5_encrypt(url)
-
-        timer = int(time.time())
-        ct = 536919696
-
-        new_array = [
-            64,
-            0.00390625,
-            1,
-            12,
-            url_md5_array[14],
-            url_md5_array[15],
-            empty_md5_array[14],
-            empty_md5_array[15],
-            ua_md5_array[14],
-            ua_md5_array[15],
-            timer >> 24 & 255,
-            timer >> 16 & 255,
-            timer >> 8 & 255,
-            timer & 255,
-            ct >> 24 & 255,
-            ct >> 16 & 255,
-            ct >> 8 & 255,
-            ct & 255,
-        ]
-
-        xor_result = new_array[0]
-        for value in new_array[1:]:
-            if isinstance(value, float):
-                value = int(value)
-            xor_result ^= value
-        new_array.append(xor_result)
-
-        array3: list[int] = []
-        array4: list[int] = []
-        idx = 0
-        while idx < len(new_array):
-            value = new_array[idx]
-            array3.append(value)
-            if idx + 1 < len(new_array):
-                array4.append(new_array[idx + 1])
-            idx += 2
-
-        merged = array3 + array4
-
-        garbled = self._encoding_conversion2(
-            2,
-            255,
-            self._rc4_encrypt(
-                "ÿ".encode("ISO-8859-1"),
-                self._encoding_conversion(*merged).encode("ISO-8859-1"),
-            ).decode("ISO-8859-1"),
-        )
-
-        xb = ""
-        idx = 0
-        while idx < len(garbled):
-            xb += self._calculation(
-                ord(garbled[idx]),
-                ord(garbled[idx + 1]),
-                ord(garbled[idx + 2]),
-            )
-            idx += 3
-
+        xb = _SIGNERS["xbogus"].token(url, self._user_agent)
         signed_url = f"{url}&X-Bogus={xb}"
         return signed_url, xb, self._user_agent
 